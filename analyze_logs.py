@@ -0,0 +1,284 @@
+"""
+Offline analytics over a directory of Discussion Partner session logs.
+
+Reads every downloaded log (discussion_partner_log_*.json, and the newer
+.jsonl / .jsonl.gz exports or raw session_logs/*.jsonl files) with a process
+pool, then aggregates with pandas:
+
+  per student   chat turns, target-structure uptake, help requests,
+                Turn 1 and automatic scaffolding
+  per activity  chat turns, uptake, turns per debate/scenario, scaffolding
+
+Workers only return compact per-event rows (no message text), so thousands
+of sessions take seconds. A session found in more than one file (its raw log
+and an export of it) is counted once, from the file with the most events.
+Students are keyed by session id: names aren't unique and there is no login,
+so two students called "Ana" stay two students. Old .json downloads don't
+record a session id; each of those files is its own session.
+
+Usage:
+    python analyze_logs.py logs/
+    python analyze_logs.py logs/ --workers 8 --out results/
+"""
+
+import argparse
+import gzip
+import json
+import os
+import pathlib
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+LOG_PATTERNS = ("*.json", "*.jsonl", "*.jsonl.gz")
+FILES_PER_TASK = 64             # Files parsed per worker task (amortises process overhead)
+
+CHAT_STATES = ("debate_chat", "scenario1_chat", "scenario2_chat")
+HELP_ACTIONS = ("examples_request",)
+TURN1_SCAFFOLD_PREFIX = "scaffolding_turn1"
+AUTO_SCAFFOLD_PREFIX = "auto_scaffolding_triggered"
+
+# "Turn 3: I see your point but... [Target: True]"
+TURN_RE = re.compile(r"^Turn (\d+): ")
+TARGET_RE = re.compile(r"\[Target: (True|False)\]\s*$")
+
+INTERACTION_COLUMNS = ["file", "session", "student", "activity", "state", "role", "turn", "target"]
+AUTONOMY_COLUMNS = ["file", "session", "student", "activity", "state", "action"]
+FLAG_COLUMNS = ["help_requests", "turn1_scaffolds", "auto_scaffolds"]
+
+# Older logs don't record the state of autonomy events; the scenario shows in the action name
+ACTION_SUFFIX_STATES = {"_scenario1": "scenario1_chat", "_s1": "scenario1_chat",
+                        "_scenario2": "scenario2_chat", "_s2": "scenario2_chat"}
+
+# ============================================================================
+# PARSING (runs in worker processes)
+# ============================================================================
+
+def _read_log(path: str) -> Tuple[Optional[str], Optional[str], Iterator[Dict], Iterator[Dict]]:
+    """(session_id, student_name, interactions, autonomy events) from any of the log formats"""
+    if path.endswith(".json"):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return (data.get("session_id"), data.get("student_name"),
+                iter(data.get("interactions") or []), iter(data.get("autonomy_events") or []))
+
+    opener = gzip.open if path.endswith(".gz") else open
+    session, student, interactions, autonomy = None, None, [], []
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            kind = event.get("kind")
+            if kind == "interaction":
+                interactions.append(event)
+            elif kind == "autonomy":
+                autonomy.append(event)
+            elif kind in ("session", "export"):
+                session = event.get("session_id") or session
+                student = event.get("student_name") or student
+    return session, student, iter(interactions), iter(autonomy)
+
+
+def _autonomy_state(event: Dict) -> Optional[str]:
+    """The chat an autonomy event belongs to"""
+    if event.get("state"):
+        return event["state"]
+    action = event.get("action") or ""
+    for suffix, state in ACTION_SUFFIX_STATES.items():
+        if action.endswith(suffix):
+            return state
+    return "debate_chat" if event.get("activity") == "activity2" else None
+
+
+def parse_files(paths: List[str]) -> Tuple[Dict[str, list], Dict[str, list], List[str]]:
+    """Columnar interaction and autonomy rows for a batch of files, plus the files that failed"""
+    interactions = {column: [] for column in INTERACTION_COLUMNS}
+    autonomy = {column: [] for column in AUTONOMY_COLUMNS}
+    failed = []
+    for path in paths:
+        try:
+            session, student, events, actions = _read_log(path)
+        except (OSError, ValueError, AttributeError):
+            failed.append(path)
+            continue
+        session = session or path
+        student = student or "unknown"
+
+        for event in events:
+            content = event.get("content") or ""
+            turn = TURN_RE.match(content)
+            target = TARGET_RE.search(content)
+            interactions["file"].append(path)
+            interactions["session"].append(session)
+            interactions["student"].append(student)
+            interactions["activity"].append(event.get("activity"))
+            interactions["state"].append(event.get("state"))
+            interactions["role"].append(event.get("role"))
+            interactions["turn"].append(int(turn.group(1)) if turn else None)
+            interactions["target"].append(target.group(1) == "True" if target else None)
+
+        for action in actions:
+            autonomy["file"].append(path)
+            autonomy["session"].append(session)
+            autonomy["student"].append(student)
+            autonomy["activity"].append(action.get("activity"))
+            autonomy["state"].append(_autonomy_state(action))
+            autonomy["action"].append(action.get("action"))
+    return interactions, autonomy, failed
+
+
+def find_logs(root: str) -> List[str]:
+    """All log files under root, in a stable order"""
+    paths = set()
+    for pattern in LOG_PATTERNS:
+        paths.update(str(p) for p in pathlib.Path(root).rglob(pattern))
+    return sorted(paths)
+
+
+def drop_duplicate_sessions(interactions: pd.DataFrame,
+                            autonomy: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Keep one file per session - a raw log and its exports hold the same events"""
+    events = pd.concat([interactions[["session", "file"]], autonomy[["session", "file"]]])
+    counts = events.groupby(["session", "file"]).size().rename("events").reset_index()
+    best = counts.sort_values(["events", "file"], ascending=[False, True]).drop_duplicates("session")
+    keep = set(best["file"])
+    return (interactions[interactions["file"].isin(keep)].reset_index(drop=True),
+            autonomy[autonomy["file"].isin(keep)].reset_index(drop=True))
+
+
+def load_logs(paths: List[str], workers: Optional[int] = None) -> Tuple[pd.DataFrame, pd.DataFrame, List[str]]:
+    """Parse files in parallel; returns (interactions, autonomy events, failed files)"""
+    batches = [paths[i:i + FILES_PER_TASK] for i in range(0, len(paths), FILES_PER_TASK)]
+    interaction_parts = [pd.DataFrame(columns=INTERACTION_COLUMNS)]
+    autonomy_parts = [pd.DataFrame(columns=AUTONOMY_COLUMNS)]
+    failed = []
+
+    def collect(results):
+        for interactions, autonomy, bad in results:
+            interaction_parts.append(pd.DataFrame(interactions, columns=INTERACTION_COLUMNS))
+            autonomy_parts.append(pd.DataFrame(autonomy, columns=AUTONOMY_COLUMNS))
+            failed.extend(bad)
+
+    if len(batches) <= 1 or workers == 1:
+        collect(map(parse_files, batches))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            collect(pool.map(parse_files, batches))
+    interactions, autonomy = drop_duplicate_sessions(pd.concat(interaction_parts, ignore_index=True),
+                                                     pd.concat(autonomy_parts, ignore_index=True))
+    return interactions, autonomy, failed
+
+# ============================================================================
+# METRICS
+# ============================================================================
+
+def chat_turns(interactions: pd.DataFrame) -> pd.DataFrame:
+    """Student turns in the debate/role-play chats (the ones annotated with [Target: ...])"""
+    turns = interactions[(interactions["role"] == "user") & interactions["state"].isin(CHAT_STATES)
+                         & interactions["turn"].notna()].copy()
+    turns["target"] = turns["target"].astype(float)
+    # Turn numbers restart at 1 for every new debate/scenario
+    turns["new_chat"] = (turns["turn"] == 1).astype(int)
+    return turns
+
+
+def autonomy_flags(autonomy: pd.DataFrame) -> pd.DataFrame:
+    """One 0/1 column per kind of autonomy event"""
+    action = autonomy["action"].fillna("")
+    return autonomy.assign(
+        help_requests=action.isin(HELP_ACTIONS).astype(int),
+        turn1_scaffolds=action.str.startswith(TURN1_SCAFFOLD_PREFIX).astype(int),
+        auto_scaffolds=action.str.startswith(AUTO_SCAFFOLD_PREFIX).astype(int),
+    )
+
+
+def student_metrics(interactions: pd.DataFrame, autonomy: pd.DataFrame) -> pd.DataFrame:
+    """Chat turns, uptake and autonomy events per student (keyed by session id, with the name alongside)"""
+    turns = chat_turns(interactions)
+    result = interactions.groupby("session")["student"].first().to_frame()
+    result = result.join(turns.groupby("session")["target"].agg(chat_turns="size", target_turns="sum", uptake="mean"))
+    result = result.join(autonomy_flags(autonomy).groupby("session")[FLAG_COLUMNS].sum())
+    counts = ["chat_turns", "target_turns"] + FLAG_COLUMNS
+    result[counts] = result[counts].fillna(0).astype(int)
+    return result.sort_index()
+
+
+def activity_metrics(interactions: pd.DataFrame, autonomy: pd.DataFrame) -> pd.DataFrame:
+    """Chat turns, uptake, turns per chat and autonomy events per debate/scenario"""
+    turns = chat_turns(interactions)
+    result = turns.groupby("state").agg(
+        sessions=("session", "nunique"),
+        chat_turns=("target", "size"),
+        chats=("new_chat", "sum"),
+        uptake=("target", "mean"),
+    )
+    result["turns_per_chat"] = result["chat_turns"] / result["chats"].where(result["chats"] > 0)
+    result = result.join(autonomy_flags(autonomy).groupby("state")[FLAG_COLUMNS].sum())
+    result[FLAG_COLUMNS] = result[FLAG_COLUMNS].fillna(0).astype(int)
+    return result.reindex([state for state in CHAT_STATES if state in result.index])
+
+
+def summary(interactions: pd.DataFrame, autonomy: pd.DataFrame) -> Dict:
+    """Headline numbers across all sessions"""
+    turns = chat_turns(interactions)
+    flags = autonomy_flags(autonomy)
+    return {
+        "sessions": int(interactions["session"].nunique()),
+        "students": int(interactions["session"].nunique()),   # One per session - see the module docstring
+        "chat_turns": int(len(turns)),
+        "uptake": round(float(turns["target"].mean()), 3) if len(turns) else None,
+        "help_requests": int(flags["help_requests"].sum()),
+        "turn1_scaffolds": int(flags["turn1_scaffolds"].sum()),
+        "auto_scaffolds": int(flags["auto_scaffolds"].sum()),
+    }
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log_dir", help="directory searched recursively for session logs")
+    parser.add_argument("--workers", type=int, default=None, help="parser processes (default: one per CPU)")
+    parser.add_argument("--out", help="write students.csv, activities.csv and summary.json here")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    paths = find_logs(args.log_dir)
+    interactions, autonomy, failed = load_logs(paths, args.workers)
+    students = student_metrics(interactions, autonomy)
+    activities = activity_metrics(interactions, autonomy)
+    totals = summary(interactions, autonomy)
+    elapsed = time.perf_counter() - start
+
+    print(f"{len(paths)} files, {totals['sessions']} sessions, {totals['students']} students "
+          f"in {elapsed:.2f}s ({len(failed)} unreadable)")
+    print(f"chat turns {totals['chat_turns']}   uptake {totals['uptake']}   help requests {totals['help_requests']}   "
+          f"scaffolding turn1 {totals['turn1_scaffolds']} / auto {totals['auto_scaffolds']}")
+    with pd.option_context("display.width", 160, "display.max_columns", 20, "display.precision", 3):
+        print("\nPer activity:")
+        print(activities.to_string())
+        print("\nPer student:")
+        print(students.to_string())
+    for path in failed[:10]:
+        print(f"  unreadable: {path}")
+
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+        students.to_csv(os.path.join(args.out, "students.csv"))
+        activities.to_csv(os.path.join(args.out, "activities.csv"))
+        with open(os.path.join(args.out, "summary.json"), "w") as f:
+            json.dump({**totals, "files": len(paths), "unreadable": failed, "seconds": round(elapsed, 2)}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,13 +5,36 @@ Streamlit Version - Includes voice recording and proper scaffolding
 """
 
 import streamlit as st
-from openai import OpenAI
-import json
+from streamlit.errors import StreamlitAPIException
 import datetime
-import io
+import math
+import os
+import pathlib
+import time
 import uuid
-from typing import Dict, List, Optional
-from audio_recorder_streamlit import audio_recorder
+from typing import Dict, List, Optional, Tuple
+
+from catalog import (DEBATE_TOPICS_BY_ID, DIALOGUES, SCENARIOS_BY_ID, corpus_examples_html, scaffolding_html,
+                     scenario_box_html)
+from caching import LRUCache, content_digest, fingerprint, get_response_cache
+from backends import Backend, BackendError, Usage, get_backend, uses_api_key
+from costs import chat_cost, transcription_cost
+from corpus import get_corpus
+from context_builder import (build_context, fold_history, get_fold_pool, message_tokens, needs_fold, new_summary,
+                             summary_prompt)
+from lesson import (COMPLETE_SCREENS, DEBATE_MENU, DIALOGUE_SCREENS, SCENARIO_CHATS, STATE_ACTIVITY, TRANSITIONS,
+                    fresh_conversation)
+from log_writer import get_writer
+from metrics import get_table
+from prewarm import PREWARM_ENABLED, get_prewarmer
+from prompts import GenerationProfile, generation_profile, prefix_messages, topic_message
+from routing import PRIMARY_ATTEMPTS, RouteDecision, get_router
+from scheduler import MAX_ATTEMPTS, WaitCallback, all_stats, get_scheduler
+from session_export import DEFAULT_FORMAT, EXPORT_FORMATS, build_export, export_file_name
+from target_structures import TurnAnalysis, analyze_turn
+from tracing import get_tracer
+
+SCRIPT_STARTED = (time.time_ns() // 1000, time.perf_counter())   # This run of the script, for the rerun span
 
 # ============================================================================
 # PAGE CONFIGURATION
@@ -28,305 +51,29 @@ st.set_page_config(
 # CUSTOM CSS
 # ============================================================================
 
-st.markdown("""
-<style>
-    .main-header {
-        font-size: 2.5rem;
-        color: #1f77b4;
-        text-align: center;
-        padding: 1rem 0;
-        border-bottom: 3px solid #1f77b4;
-        margin-bottom: 2rem;
-    }
-    .activity-header {
-        font-size: 1.8rem;
-        color: #ff7f0e;
-        background-color: #fff3e0;
-        padding: 1rem;
-        border-radius: 10px;
-        margin: 1rem 0;
-        border-left: 5px solid #ff7f0e;
-    }
-    .dialogue-box {
-        background-color: #f0f8ff;
-        padding: 1.5rem;
-        border-radius: 10px;
-        border-left: 5px solid #1f77b4;
-        margin: 1rem 0;
-        font-family: 'Courier New', monospace;
-    }
-    .corpus-example {
-        background-color: #f5f5f5;
-        padding: 1rem;
-        border-radius: 8px;
-        border-left: 4px solid #2ca02c;
-        margin: 0.5rem 0;
-        font-style: italic;
-    }
-    .scenario-box {
-        background-color: #ffe6e6;
-        padding: 1.5rem;
-        border-radius: 10px;
-        border-left: 5px solid #d62728;
-        margin: 1rem 0;
-    }
-    .context-reminder {
-        background-color: #f3e5f5;
-        padding: 0.8rem;
-        border-radius: 8px;
-        border-left: 4px solid #9c27b0;
-        margin: 1rem 0;
-        font-size: 0.95rem;
-    }
-    .chat-message-user {
-        background-color: #e3f2fd;
-        padding: 1rem;
-        border-radius: 15px 15px 5px 15px;
-        margin: 0.8rem 0;
-        margin-left: 20%;
-        border-left: 4px solid #2196f3;
-        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-    }
-    .chat-message-assistant {
-        background-color: #f5f5f5;
-        padding: 1rem;
-        border-radius: 15px 15px 15px 5px;
-        margin: 0.8rem 0;
-        margin-right: 20%;
-        border-left: 4px solid #757575;
-        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-    }
-    .stButton button {
-        background-color: #1f77b4;
-        color: white;
-        border-radius: 8px;
-        padding: 0.5rem 2rem;
-        font-size: 1.1rem;
-        border: none;
-        transition: all 0.3s;
-    }
-    .stButton button:hover {
-        background-color: #145a8a;
-        transform: scale(1.05);
-    }
-    .success-box {
-        background-color: #e8f5e9;
-        padding: 1rem;
-        border-radius: 8px;
-        border-left: 4px solid #4caf50;
-        margin: 1rem 0;
-    }
-    .info-box {
-        background-color: #e3f2fd;
-        padding: 1rem;
-        border-radius: 8px;
-        border-left: 4px solid #2196f3;
-        margin: 1rem 0;
-    }
-    .voice-recording-box {
-        background-color: #fff9c4;
-        padding: 1rem;
-        border-radius: 8px;
-        border-left: 4px solid #fbc02d;
-        margin: 1rem 0;
-    }
-    .scaffolding-box {
-        background-color: #fff3e0;
-        padding: 1.5rem;
-        border-radius: 10px;
-        border-left: 5px solid #ff9800;
-        margin: 1rem 0;
-    }
-</style>
-""", unsafe_allow_html=True)
+STYLESHEET = pathlib.Path(__file__).with_name("static") / "style.css"
+
+# A .css path is sent as a bare <style> element in Streamlit's event container:
+# no markdown parsing on either end and no slot in the page layout
+st.html(STYLESHEET)
 
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
 
-MODEL = "gpt-4"
-TEMPERATURE = 0.7
-MAX_TOKENS = 600
-
-# ============================================================================
-# CORPUS DATA
-# ============================================================================
-
-SYSTEM_PROMPT = """You are a REAL PERSON having a genuine conversation. You're not a chatbot or teacher - you're an actual friend/classmate or boss talking with this person.
-
-🎯 BE HUMAN. BE WARM. BE REAL.
-
-**As a FRIEND/CLASSMATE:**
-- Talk like you're texting your best friend
-- Be supportive, warm, understanding
-- Use casual language: "yeah", "like", "I mean", "you know"
-- Show emotions: "haha", "aw", "honestly", "for real"
-- Be encouraging: "I get that", "that's fair", "I hear you"
-- Disagree gently but stay friendly
-- Keep it short and conversational (1-2 sentences usually)
-
-**As a BOSS:**
-- Be professional but HUMAN - not robotic
-- Show you care about their concerns
-- Be understanding but firm when needed
-- Use "I understand", "I appreciate", "let's work together"
-- Stay respectful and kind
-
-MUST USE THESE PATTERNS NATURALLY:
-
-**Friends/Classmates:**
-- Start with: "Yeah but...", "I get that, but...", "True, but...", "I know, but..."
-- Add: "maybe", "I think", "probably", "like"
-- Example: "Yeah but like, don't you think homework helps you learn? I mean, practice makes perfect, right?"
-
-**Boss:**
-- Start with: "I understand, however...", "I appreciate that, but...", "I see your point, though..."
-- Add: "perhaps", "maybe", "I think", "I feel"
-- Example: "I understand you have school. However, we really need coverage. Perhaps we could find a compromise that works for both of us?"
-
-REAL CONVERSATION EXAMPLES:
-
-**FRIEND about social media (GOOD):**
-"Yeah but honestly, social media helps me stay in touch with people! Like, I'd never talk to my cousins otherwise, you know?"
-
-**FRIEND about social media (BAD - too robotic):**
-"I understand your perspective. However, I believe social media provides valuable connectivity."
-
-**FRIEND reacting to formal language:**
-Student: "I respectfully disagree with your position."
-You: "Haha whoa, you sound like you're in court! We're just chatting, relax! But okay, tell me more - what's on your mind?"
-
-**BOSS about schedule (GOOD):**
-"I hear you, and I know school is important. However, we're really short-staffed right now. Maybe we could adjust your hours so you can do both?"
-
-**BOSS reacting to rude tone:**
-Student: "Nah I'm not doing that"
-You: "Hey, I appreciate you being direct, but let's keep this professional. I'm trying to work with you here. Can we talk about what's really bothering you?"
-
-BE A REAL PERSON:
-✅ Show empathy: "I totally get that", "That makes sense", "I hear you"
-✅ Use natural reactions: "Oh wow", "Really?", "Interesting!", "Haha"
-✅ Ask follow-ups: "What do you think?", "Don't you think?", "You know?"
-✅ Be warm: "Hey", "Look", "Listen", "Come on"
-
-NEVER:
-❌ Give grammar lessons
-❌ Say "You should say..."
-❌ Sound like a robot or assistant
-❌ Be cold or formal as a friend
-❌ Be dismissive or rude as a boss
-
-Remember: Real people are WARM, MESSY, EMOTIONAL, and HUMAN. Be that person."""
-
-DIALOGUES = {
-    "mobile_phones": {
-        "title": "Mobile Phones on Trains",
-        "context": "Eden (boss) and Tiara (employee) are talking",
-        "power": "high",
-        "dialogue": """**Eden:** Do you think that mobile phones should be banned on trains? Should they be forbidden?
-
-**Tiara:** Because people speak too loudly?
-
-**Eden:** Yes. Some people find that very annoying.
-
-**Tiara:** I can see their point. It is sometimes annoying. But I don't agree that they should be banned."""
-    },
-    "life_expectancy": {
-        "title": "Life Expectancy",
-        "context": "Linda and Semih are friends discussing how long people will live",
-        "power": "low",
-        "dialogue": """**Linda:** Scientists say people will live over 100 years. I'm not convinced this is good.
-
-**Semih:** Why aren't you keen on people living over 100?
-
-**Linda:** When you look at 100-year-old people, they're not in excellent physical condition.
-
-**Semih:** Well I agree but medicines and scientific research has been progressing. Maybe there are some kind of medicines in the future which can help.
-
-**Linda:** Yes but if people live over 100 and retire later, then young people can't find jobs because older people keep working.
-
-**Semih:** Well I agree but maybe we can develop more jobs..."""
-    }
-}
-
-CORPUS_EXAMPLES = {
-    "high_power": [
-        "I can see their point. It is sometimes annoying. But I don't agree that they should be banned.",
-        "I can understand your opinion erm but I was still wondering...",
-        "I agree with this point but don't you think maybe the fact that times are changing is a good thing?",
-        "I understand his situation but I'm not sure if I should do it"
-    ],
-    "low_power": [
-        "Yeah but there are some disadvantages like er...",
-        "yeah I agree but I still the problem is that...",
-        "Well I agree but maybe we can develop more jobs",
-        "Yes but if people are going to live over a hundred and they're probably going to retire later..."
-    ]
-}
-
-DEBATE_TOPICS = [
-    {
-        "id": "social_media",
-        "topic": "Social Media",
-        "power": "low",
-        "ai_position": "Social media is helpful",
-        "ai_opening": "Hey! So you think social media is harmful? Yeah, I know it can cause some problems, but I think it really helps people stay connected with friends and family.",
-        "corpus_patterns": "low_power",
-        "relationship": "friends"
-    },
-    {
-        "id": "homework",
-        "topic": "Homework",
-        "power": "low",
-        "ai_position": "Homework is necessary",
-        "ai_opening": "Alright, homework debate! I agree it can be boring, but I think it's really important for learning. Don't you think practice helps?",
-        "corpus_patterns": "low_power",
-        "relationship": "classmates"
-    },
-    {
-        "id": "dress_code",
-        "topic": "Workplace Dress Code",
-        "power": "high",
-        "ai_position": "Professional dress code is necessary",
-        "ai_opening": "I understand you have concerns about the dress code policy. However, I believe maintaining professional attire is important for our company image and client relationships. Could you share your perspective on this?",
-        "corpus_patterns": "high_power",
-        "relationship": "boss-employee"
-    },
-    {
-        "id": "remote_work",
-        "topic": "Remote Work Policy",
-        "power": "high",
-        "ai_position": "Office presence is important",
-        "ai_opening": "I can see why remote work appeals to many employees. However, I'm concerned about team collaboration and company culture. Perhaps we could discuss a balanced approach that addresses both needs?",
-        "corpus_patterns": "high_power",
-        "relationship": "boss-employee"
-    }
-]
-
-ROLE_PLAY_SCENARIOS = [
-    {
-        "id": "friend_phone",
-        "title": "Scenario 1: Disagreeing with a friend",
-        "power": "low",
-        "role_student": "You are talking to your friend",
-        "role_ai": "Your friend",
-        "situation": "Your friend thinks using a phone all day is okay. You think it's bad for health.",
-        "ai_opening": "I don't think using my phone all day is bad. It's fun! I can play games and talk to my friends all the time.",
-        "corpus_patterns": "low_power",
-        "relationship": "friends"
-    },
-    {
-        "id": "boss_schedule",
-        "title": "Scenario 2: Negotiating with your boss",
-        "power": "high",
-        "role_student": "You are an employee",
-        "role_ai": "Your boss",
-        "situation": "Your boss says everyone must work late shifts. You have school in the morning and can't stay late.",
-        "ai_opening": "I've reviewed the schedules, and I've decided that all employees need to work late shifts from now on. It's better for business, and I expect everyone to cooperate. This starts next week.",
-        "corpus_patterns": "high_power",
-        "relationship": "boss-employee"
-    }
-]
+# Chat models are picked per turn by routing.py (DP_SMALL_MODEL / DP_LARGE_MODEL);
+# reply length and sampling per relationship by GENERATION_PROFILES in prompts.py
+STREAM_RESPONSES = True   # Render replies token by token instead of behind a spinner
+SUMMARY_MODEL = "gpt-4o-mini"   # Folds older turns into the running conversation summary
+TRANSCRIPT_CACHE_SIZE = 32      # Transcripts remembered per session, keyed by recording digest
+CHAT_WINDOW_MESSAGES = 12       # Messages shown as chat bubbles; older ones collapse into one block
+LOG_TAIL_EVENTS = 50            # Recent log events kept in session state (everything is on disk - see log_writer)
+RESPONSE_CACHE_ENABLED = os.environ.get("DP_RESPONSE_CACHE", "") == "1"   # Opt in: reuse replies to near-identical opening turns
+RESPONSE_CACHE_TURNS = 1        # Only a student's first N turns of each chat are served from the cache
+RESPONSE_CACHE_MAX_WORDS = 25   # Longer messages always get a fresh reply
+USAGE_FIELDS = ("prompt_tokens", "completion_tokens", "cached_tokens", "wall_ms", "cost_usd")   # Summed per session and per model
+TRACE_PHASES = ("transcribe", "target_check", "prompt_assembly", "api", "retrieval", "render", "rerun")   # Turn order, then whole-page runs
+BUSY_MESSAGE = "Lots of classmates are talking to me right now! Please send your message again in a moment."
 
 # ============================================================================
 # HELPER FUNCTIONS
@@ -351,18 +98,16 @@ def init_session_state():
         st.session_state.current_state = "welcome"
     if 'current_activity' not in st.session_state:
         st.session_state.current_activity = None
-    if 'current_dialogue' not in st.session_state:
-        st.session_state.current_dialogue = None
     if 'current_debate' not in st.session_state:
         st.session_state.current_debate = None
     if 'debate_turn' not in st.session_state:
         st.session_state.debate_turn = 1
-    if 'current_scenario' not in st.session_state:
-        st.session_state.current_scenario = None
     if 'temp_show_examples' not in st.session_state:
         st.session_state.temp_show_examples = False
-    if 'last_audio_bytes' not in st.session_state:
-        st.session_state.last_audio_bytes = None
+    if 'last_audio_digest' not in st.session_state:
+        st.session_state.last_audio_digest = None
+    if 'transcript_cache' not in st.session_state:
+        st.session_state.transcript_cache = LRUCache(TRANSCRIPT_CACHE_SIZE)
     if 'transcribed_text' not in st.session_state:
         st.session_state.transcribed_text = ""
     if 'conversation_history' not in st.session_state:
@@ -375,187 +120,470 @@ def init_session_state():
         st.session_state.responses_without_target = 0
     if 'auto_scaffold_shown' not in st.session_state:
         st.session_state.auto_scaffold_shown = False
+    if 'log_started' not in st.session_state:
+        st.session_state.log_started = False
     if 'session_id' not in st.session_state:
         # Unique ID per student session - use this to search logs in OpenAI platform
         st.session_state.session_id = str(uuid.uuid4())
     if 'turn_number' not in st.session_state:
         st.session_state.turn_number = 0
-
-def log_interaction(role: str, content: str):
-    """Log an interaction"""
-    st.session_state.interaction_logs.append({
+    if 'last_turn_stats' not in st.session_state:
+        st.session_state.last_turn_stats = {}
+    if 'last_clip_stats' not in st.session_state:
+        st.session_state.last_clip_stats = {}
+    if 'session_usage' not in st.session_state:
+        st.session_state.session_usage = {"calls": 0, **{field: 0 for field in USAGE_FIELDS}}
+    if 'history_summary' not in st.session_state:
+        st.session_state.history_summary = new_summary()
+    if 'summary_job' not in st.session_state:
+        st.session_state.summary_job = None
+    if 'render_started' not in st.session_state:
+        st.session_state.render_started = None
+
+def persist_event(kind: str, entry: Dict):
+    """Hand an event to the background log writer, opening the session's log on first use"""
+    writer = get_writer()
+    if not st.session_state.log_started:
+        writer.write(st.session_state.session_id, {
+            "kind": "session",
+            "timestamp": entry["timestamp"],
+            "session_id": st.session_state.session_id,
+            "student_name": st.session_state.student_name
+        })
+        st.session_state.log_started = True
+    writer.write(st.session_state.session_id, {"kind": kind, **entry})
+
+def append_tail(events: List[Dict], entry: Dict):
+    """Keep only the last LOG_TAIL_EVENTS events in memory"""
+    events.append(entry)
+    if len(events) > LOG_TAIL_EVENTS:
+        del events[:-LOG_TAIL_EVENTS]
+
+def log_interaction(role: str, content: str, **details):
+    """Log an interaction (extra keyword arguments, e.g. timings, are stored alongside)"""
+    entry = {
         "timestamp": datetime.datetime.now().isoformat(),
         "activity": st.session_state.current_activity,
         "state": st.session_state.current_state,
         "role": role,
         "content": content
-    })
+    }
+    entry.update(details)
+    persist_event("interaction", entry)
+    append_tail(st.session_state.interaction_logs, entry)
 
 def log_autonomy(action: str):
     """Log autonomous help-seeking behavior"""
-    st.session_state.autonomy_log.append({
+    entry = {
         "timestamp": datetime.datetime.now().isoformat(),
         "activity": st.session_state.current_activity,
+        "state": st.session_state.current_state,
         "action": action
-    })
+    }
+    persist_event("autonomy", entry)
+    append_tail(st.session_state.autonomy_log, entry)
 
-def check_for_target_structure(user_input: str) -> bool:
-    """Check if user's input contains yes-but construction or mitigation markers"""
-    user_lower = user_input.lower()
-    
-    # Yes-but patterns
-    yes_but_patterns = [
-        "yeah but", "yes but", "yeah, but", "yes, but",
-        "i agree but", "i agree, but", "i know but", "i know, but",
-        "true but", "true, but", "i see but", "i see, but",
-        "i get that but", "i get that, but", "i hear you but", "i hear you, but",
-        "i understand but", "i understand, but", "i can see but", "i can see, but"
-    ]
+def trace_phase(name: str, upcoming: bool = False, **args):
+    """Tracing span for one phase of a turn (see tracing.py)
+    
+    Phases before the API call belong to the turn about to be sent (upcoming=True).
+    """
+    turn_number = st.session_state.turn_number + (1 if upcoming else 0)
+    return get_tracer().span(name, st.session_state.session_id, turn_number, **args)
+
+def start_render_trace():
+    """Start timing the rerun that shows a finished turn (closed by finish_render_trace)"""
+    st.session_state.render_started = (st.session_state.turn_number, time.time_ns() // 1000, time.perf_counter())
+
+def finish_render_trace():
+    """Close the render span once the rerun has drawn the chat"""
+    if st.session_state.render_started:
+        turn_number, start_us, start = st.session_state.render_started
+        st.session_state.render_started = None
+        get_tracer().record("render", start_us, (time.perf_counter() - start) * 1e6,
+                            {"session_id": st.session_state.session_id, "turn_number": turn_number})
+
+def finish_rerun_trace():
+    """Record how long this full run of the script took"""
+    start_us, start = SCRIPT_STARTED
+    get_tracer().record("rerun", start_us, (time.perf_counter() - start) * 1e6,
+                        {"session_id": st.session_state.get("session_id"),
+                         "turn_number": st.session_state.get("turn_number"),
+                         "state": st.session_state.get("current_state")})
+
+def target_details(analysis: TurnAnalysis) -> Dict:
+    """Log fields describing which target structure matched and how mitigated the turn was"""
+    return {
+        "target_pattern": analysis.match.pattern if analysis.match else None,
+        "target_span": [analysis.match.start, analysis.match.end] if analysis.match else None,
+        "hedges": analysis.hedges,
+        "mitigation_score": analysis.mitigation_score
+    }
+
+def build_messages(user_message: str, relationship: str = "friend", topic: str = "") -> List[Dict]:
+    """Build the full prompt for one turn: the static prefix first, then the variable tail"""
+    # Precompiled per-relationship prefix - byte-identical every turn so prefix caching hits
+    messages = prefix_messages(relationship)
+    messages.append({"role": "system", "content": topic_message(topic)})
+    
+    # Add conversation history (recent turns verbatim, older ones as a running summary)
+    messages.extend(build_context(st.session_state.conversation_history, st.session_state.history_summary))
     
-    # Check for any yes-but pattern
-    for pattern in yes_but_patterns:
-        if pattern in user_lower:
-            return True
-    
-    return False
-
-def save_logs() -> str:
-    """Generate downloadable JSON log"""
-    data = {
-        "student_name": st.session_state.student_name,
-        "session_start": st.session_state.interaction_logs[0]["timestamp"] if st.session_state.interaction_logs else None,
-        "session_end": datetime.datetime.now().isoformat(),
-        "interactions": st.session_state.interaction_logs,
-        "autonomy_events": st.session_state.autonomy_log
+    # Add current message
+    messages.append({"role": "user", "content": user_message})
+    return messages
+
+def usage_stats(usage: Optional[Usage], model: str) -> Dict:
+    """Token counts and cost from a backend's usage report, including the cached-prefix share"""
+    if usage is None:
+        return {}
+    stats = {
+        "prompt_tokens": usage.prompt_tokens,
+        "completion_tokens": usage.completion_tokens,
+        "cached_tokens": usage.cached_tokens,
+        "cached_share": round(usage.cached_tokens / usage.prompt_tokens, 3) if usage.prompt_tokens else 0.0
+    }
+    cost = chat_cost(model, usage)
+    if cost is not None:
+        stats["cost_usd"] = round(cost, 6)
+    return stats
+
+def account_usage(model: str, stats: Dict):
+    """Add one API call to the session's running totals and the process-wide usage table"""
+    values = {field: stats.get(field) for field in USAGE_FIELDS}
+    values["wall_ms"] = stats.get("generation_ms")
+    totals = st.session_state.session_usage
+    totals["calls"] += 1
+    for field, value in values.items():
+        if value is not None:
+            totals[field] += value
+    get_table("usage").record(model, **values)
+
+def api_metadata(relationship: str) -> Dict[str, str]:
+    """Metadata attached to each stored completion so it can be found in OpenAI logs"""
+    return {
+        "student_name":  str(st.session_state.student_name or "unknown"),
+        "session_id":    str(st.session_state.session_id),
+        "activity":      str(st.session_state.current_activity or "welcome"),
+        "state":         str(st.session_state.current_state or "unknown"),
+        "turn_number":   str(st.session_state.turn_number),
+        "relationship":  str(relationship),
+        "timestamp":     datetime.datetime.now().isoformat()
     }
-    return json.dumps(data, indent=2)
 
-def call_gpt(user_message: str, relationship: str = "friend", topic: str = "") -> str:
+def failure_message(e: Exception) -> str:
+    """What the student sees when a reply can't be generated"""
+    if isinstance(e, BackendError) and e.retryable:
+        return BUSY_MESSAGE
+    st.error(f"Error calling GPT: {str(e)}")
+    return "I'm having trouble connecting right now. Please try again."
+
+def scheduled(model: str, fn, messages: List[Dict], max_tokens: int, on_wait: Optional[WaitCallback] = None,
+              attempts: int = MAX_ATTEMPTS):
+    """Run a backend call through the shared rate-limit scheduler for its model"""
+    return get_scheduler(model).call(
+        st.session_state.session_id, fn,
+        tokens=message_tokens(messages) + max_tokens,
+        on_wait=on_wait,
+        attempts=attempts
+    )
+
+def route_turn(user_message: str, relationship: str) -> RouteDecision:
+    """Pick the chat model for this turn (see routing.py)"""
+    history_turns = sum(1 for m in st.session_state.conversation_history if m["role"] == "user")
+    return get_router().route(relationship, history_turns, len(user_message.split()))
+
+def routed_call(decision: RouteDecision, request, messages: List[Dict], max_tokens: int,
+                on_wait: Optional[WaitCallback] = None):
+    """Run request(model) on the routed model, falling back to the other tier if it fails.
+    
+    Returns (result, decision actually used).
+    """
+    try:
+        return scheduled(decision.model, lambda: request(decision.model), messages, max_tokens,
+                         on_wait, attempts=PRIMARY_ATTEMPTS), decision
+    except BackendError as e:
+        get_router().observe(decision.model, ok=False)
+        if not decision.fallback:
+            raise
+        decision = RouteDecision(
+            decision.fallback,
+            "small" if decision.tier == "large" else "large",
+            f"{decision.reason}; fell back after {decision.model} error {e.status_code or ''}".rstrip(),
+            None
+        )
+        try:
+            return scheduled(decision.model, lambda: request(decision.model), messages, max_tokens, on_wait), decision
+        except BackendError:
+            get_router().observe(decision.model, ok=False)
+            raise
+
+def route_stats(decision: RouteDecision) -> Dict:
+    """Log fields recording which model served a turn and why"""
+    return {"model": decision.model, "route_tier": decision.tier, "route_reason": decision.reason}
+
+def profile_stats(profile: GenerationProfile, stats: Dict) -> Dict:
+    """Log fields for the generation profile, recording the turn in the process-wide profile table"""
+    completion_tokens = stats.get("completion_tokens")
+    hit_limit = completion_tokens is not None and completion_tokens >= profile.max_tokens
+    get_table("profiles").record(
+        profile.name,
+        completion_tokens=completion_tokens,
+        ttft_ms=stats.get("ttft_ms"),
+        generation_ms=stats.get("generation_ms"),
+        hit_limit=int(hit_limit)
+    )
+    return {"profile": profile.name, "max_tokens": profile.max_tokens, "hit_length_limit": hit_limit}
+
+def call_gpt(user_message: str, relationship: str = "friend", topic: str = "",
+             on_wait: Optional[WaitCallback] = None) -> str:
     """Call GPT API with conversational context and proper modeling"""
     try:
-        client = OpenAI(api_key=st.session_state.api_key)
-        
-        # Build detailed context
-        if relationship == "friends" or relationship == "classmates":
-            role_context = """You are their FRIEND/CLASSMATE having a casual, friendly chat.
-
-BE WARM & SUPPORTIVE:
-- Talk like you're texting your bestie
-- Be kind, understanding, encouraging
-- Show you care: "I get you", "I hear you", "That's fair"
-- Use casual words: "yeah", "like", "honestly", "for real"
-- React naturally: "haha", "aw man", "oh wow", "really?"
-- Keep it SHORT (1-2 sentences max)
-
-MUST USE THESE IN YOUR RESPONSES:
-- "Yeah but...", "I know, but...", "True, but...", "I get that, but..."
-- Add "maybe", "I think", "probably", "like"
-- Example: "Yeah but like, don't you think it's important? I mean, it helps you learn, you know?"
-
-IF THEY'RE TOO FORMAL:
-React warmly: "Haha you sound so serious! We're just talking, relax!"
-Then continue chatting naturally.
-
-BE A GOOD FRIEND - warm, supportive, fun!"""
-
-        elif relationship == "boss-employee":
-            role_context = """You are their BOSS in a professional setting.
-
-BE PROFESSIONAL BUT HUMAN:
-- You care about your employee
-- Be understanding but need to get work done
-- Show respect: "I appreciate", "I understand", "I hear you"
-- Be firm when needed but always kind
-- Keep it conversational (2-3 sentences)
-
-MUST USE THESE IN YOUR RESPONSES:
-- "I understand, however...", "I appreciate that, but...", "I see your point, though..."
-- Add "perhaps", "maybe", "I think"
-- Example: "I understand you have school commitments. However, we really need coverage this week. Perhaps we could find a schedule that works for both of us?"
-
-IF THEY'RE TOO CASUAL/RUDE:
-React professionally but kindly: "I appreciate your honesty, but let's keep this professional."
-Then engage with their actual concern.
-
-BE A GOOD BOSS - fair, understanding, human."""
-        else:
-            role_context = ""
-        
-        # Context message
-        context_message = f"""{role_context}
-
-CURRENT TOPIC: {topic}
-
-CRITICAL INSTRUCTIONS:
-
-1. ALWAYS use the appropriate target structures in YOUR responses
-2. React naturally if their register doesn't match the relationship
-3. Engage with their actual content and ideas
-4. Ask follow-up questions
-5. Model the language through your responses - don't teach it explicitly
-
-NOW RESPOND TO WHAT THEY JUST SAID, using the appropriate target structures."""
-        
-        # Build messages
-        messages = [
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "system", "content": context_message}
-        ]
-        
-        # Add conversation history
-        messages.extend(st.session_state.conversation_history)
-        
-        # Add current message
-        messages.append({"role": "user", "content": user_message})
+        backend = get_backend(st.session_state.api_key)
         
         # Increment turn counter
         st.session_state.turn_number += 1
+        with trace_phase("prompt_assembly"):
+            messages = build_messages(user_message, relationship, topic)
 
-        # Call API with store=True so FULL conversations appear in OpenAI platform logs
+        # Passing metadata stores the completion so FULL conversations appear in OpenAI platform logs
         # Go to: platform.openai.com → Logs → Completions tab to see all conversations
-        response = client.chat.completions.create(
-            model=MODEL,
-            messages=messages,
-            temperature=TEMPERATURE,
-            max_tokens=MAX_TOKENS,
-            store=True,                          # ← THIS makes conversations appear in OpenAI logs
-            metadata={
-                "student_name":  str(st.session_state.student_name or "unknown"),
-                "session_id":    str(st.session_state.session_id),
-                "activity":      str(st.session_state.current_activity or "welcome"),
-                "state":         str(st.session_state.current_state or "unknown"),
-                "turn_number":   str(st.session_state.turn_number),
-                "relationship":  str(relationship),
-                "timestamp":     datetime.datetime.now().isoformat()
-            }
-        )
-        
-        ai_response = response.choices[0].message.content.strip()
+        metadata = api_metadata(relationship)
+        profile = generation_profile(relationship)
+        start = time.perf_counter()
+        with trace_phase("api", streamed=False) as span:
+            result, decision = routed_call(route_turn(user_message, relationship), lambda model: backend.chat(
+                messages,
+                model=model,
+                temperature=profile.temperature,
+                max_tokens=profile.max_tokens,
+                stop=list(profile.stop) if profile.stop else None,
+                metadata=metadata
+            ), messages, profile.max_tokens, on_wait)
+            span["model"] = decision.model
+        elapsed_ms = round((time.perf_counter() - start) * 1000)
+        get_router().observe(decision.model)   # Not streamed: a success, but no first-token time
+        
+        ai_response = result.text.strip()
         
         # Update conversation history
         st.session_state.conversation_history.append({"role": "user", "content": user_message})
         st.session_state.conversation_history.append({"role": "assistant", "content": ai_response})
+        # Not streamed, so there is no first-token time to report
+        st.session_state.last_turn_stats = {"ttft_ms": None, "generation_ms": elapsed_ms, "streamed": False}
+        st.session_state.last_turn_stats.update(route_stats(decision))
+        st.session_state.last_turn_stats.update(usage_stats(result.usage, decision.model))
+        st.session_state.last_turn_stats.update(profile_stats(profile, st.session_state.last_turn_stats))
+        account_usage(decision.model, st.session_state.last_turn_stats)
         
         return ai_response
     
     except Exception as e:
+        return failure_message(e)
+
+def stream_gpt(user_message: str, relationship: str = "friend", topic: str = "",
+               on_wait: Optional[WaitCallback] = None):
+    """Same as call_gpt, but yields the reply chunk by chunk as tokens arrive"""
+    parts = []
+    stream = None
+    decision = None
+    profile = generation_profile(relationship)
+    start = time.perf_counter()
+    sent_at = start
+    first_token_at = None
+
+    def request(model: str):
+        # The router judges the model on its own latency, so time from when the scheduler
+        # lets the request through - not queue waits, backoff or a failed primary attempt
+        nonlocal sent_at
+        sent_at = time.perf_counter()
+        return backend.chat_stream(
+            messages,
+            model=model,
+            temperature=profile.temperature,
+            max_tokens=profile.max_tokens,
+            stop=list(profile.stop) if profile.stop else None,
+            metadata=metadata
+        )
+
+    try:
+        backend = get_backend(st.session_state.api_key)
+        st.session_state.turn_number += 1
+        with trace_phase("prompt_assembly"):
+            messages = build_messages(user_message, relationship, topic)
+
+        metadata = api_metadata(relationship)
+        with trace_phase("api", streamed=True) as span:
+            stream, decision = routed_call(route_turn(user_message, relationship), request, messages,
+                                           profile.max_tokens, on_wait)
+            span["model"] = decision.model
+            for delta in stream:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                    span["ttft_ms"] = round((first_token_at - start) * 1000)
+                    get_router().observe(decision.model, (first_token_at - sent_at) * 1000)
+                parts.append(delta)
+                yield delta
+            if not "".join(parts).strip():
+                raise BackendError(f"{decision.model} returned an empty reply")
+    
+    except Exception as e:
+        if decision and isinstance(e, BackendError):
+            get_router().observe(decision.model, ok=False)
+        if not "".join(parts).strip():
+            # Nothing usable came back: the turn isn't added to the history
+            if decision:
+                st.session_state.last_turn_stats = {"ttft_ms": None, "streamed": True, **route_stats(decision)}
+            yield failure_message(e)
+            return
         st.error(f"Error calling GPT: {str(e)}")
-        return "I'm having trouble connecting right now. Please try again."
+    
+    ai_response = "".join(parts).strip()
+    st.session_state.conversation_history.append({"role": "user", "content": user_message})
+    st.session_state.conversation_history.append({"role": "assistant", "content": ai_response})
+    st.session_state.last_turn_stats = {
+        "ttft_ms": round((first_token_at - start) * 1000),
+        "generation_ms": round((time.perf_counter() - start) * 1000),
+        "streamed": True
+    }
+    st.session_state.last_turn_stats.update(route_stats(decision))
+    st.session_state.last_turn_stats.update(usage_stats(stream.usage if stream else None, decision.model))
+    st.session_state.last_turn_stats.update(profile_stats(profile, st.session_state.last_turn_stats))
+    account_usage(decision.model, st.session_state.last_turn_stats)
+
+def fold_summary(backend: Backend, session_id: str, summary: Dict,
+                 history: List[Dict]) -> Tuple[Dict, Optional[Dict]]:
+    """Fold old turns into the summary (runs on the fold pool, so no session state here).
+
+    Returns the new summary and the summariser call's usage stats, if it was called.
+    """
+    stats = {}
+
+    def summarize(previous: str, messages: List[Dict]) -> str:
+        prompt = summary_prompt(previous, messages)
+        start = time.perf_counter()
+        result = get_scheduler(SUMMARY_MODEL).call(session_id, lambda: backend.chat(
+            prompt,
+            model=SUMMARY_MODEL,
+            temperature=0,
+            max_tokens=200
+        ), tokens=message_tokens(prompt) + 200)
+        stats.update(usage_stats(result.usage, SUMMARY_MODEL),
+                     generation_ms=round((time.perf_counter() - start) * 1000))
+        return result.text
+
+    return fold_history(summary, history, summarize), stats or None
+
+def update_history_summary():
+    """Start folding old turns into the summary after a reply; the next turn picks it up"""
+    job = st.session_state.summary_job
+    if job is not None and not job.done():
+        return
+    apply_history_summary()
+    history = list(st.session_state.conversation_history)
+    if needs_fold(st.session_state.history_summary, history):
+        st.session_state.summary_job = get_fold_pool().submit(
+            fold_summary, get_backend(st.session_state.api_key), st.session_state.session_id,
+            st.session_state.history_summary, history
+        )
+
+def apply_history_summary():
+    """Use the summary folded after the previous turn, if it is ready"""
+    job = st.session_state.summary_job
+    if job is None or not job.done():
+        return
+    st.session_state.summary_job = None
+    try:
+        summary, stats = job.result()
+    except Exception as e:
+        # Keep the old summary - build_context still enforces the token budget
+        log_interaction("system", f"Conversation summary failed: {e}")
+        return
+    st.session_state.history_summary = summary
+    if stats:
+        account_usage(SUMMARY_MODEL, stats)
+
+def response_cache_key(user_message: str, relationship: str, topic: str) -> Optional[Tuple]:
+    """Cache key for an early, short student turn - None if this turn shouldn't use the cache"""
+    if not RESPONSE_CACHE_ENABLED or len(user_message.split()) > RESPONSE_CACHE_MAX_WORDS:
+        return None
+    earlier = [m["content"] for m in st.session_state.conversation_history if m["role"] == "user"]
+    message_print = fingerprint(user_message)
+    if len(earlier) >= RESPONSE_CACHE_TURNS or not message_print:
+        return None
+    return (relationship, topic, *map(fingerprint, earlier), message_print)
+
+def wait_notice(placeholder) -> WaitCallback:
+    """Show the scheduler's estimated wait in placeholder while a request is queued"""
+    def show(seconds: float):
+        placeholder.info(f"⏳ Lots of classmates are talking right now - I'll reply in about {max(1, math.ceil(seconds))} seconds...")
+    return show
+
+def respond(user_input: str, relationship: str, topic: str, chat_area, spinner_text: str) -> str:
+    """Get the AI reply for a student turn, streaming it into chat_area when enabled"""
+    st.session_state.last_turn_stats = {}
+    apply_history_summary()
+    cache_key = response_cache_key(user_input, relationship, topic)
+    cached = get_response_cache().get(cache_key) if cache_key else None
+    if cached:
+        ai_response = cached.text
+        st.session_state.conversation_history.append({"role": "user", "content": user_input})
+        st.session_state.conversation_history.append({"role": "assistant", "content": ai_response})
+        # No API call, but still a turn: counted and logged like one, marked as cached
+        st.session_state.turn_number += 1
+        st.session_state.last_turn_stats = {"cached": True, "turn_number": st.session_state.turn_number,
+                                            "latency_saved_ms": cached.saved_ms}
+        if STREAM_RESPONSES:
+            with chat_area:
+                with st.chat_message("user"):
+                    st.markdown(user_input)
+                with st.chat_message("assistant"):
+                    st.markdown(ai_response)
+    elif STREAM_RESPONSES:
+        with chat_area:
+            with st.chat_message("user"):
+                st.markdown(user_input)
+            notice = st.empty()
+            with st.chat_message("assistant"):
+                ai_response = st.write_stream(stream_gpt(user_input, relationship, topic, wait_notice(notice))).strip()
+            notice.empty()
+    else:
+        notice = st.empty()
+        with st.spinner(spinner_text):
+            ai_response = call_gpt(user_input, relationship, topic, wait_notice(notice))
+        notice.empty()
+    # Only successful generations carry timings; error fallbacks are never cached
+    if cache_key and not cached and "generation_ms" in st.session_state.last_turn_stats:
+        get_response_cache().put(cache_key, ai_response, st.session_state.last_turn_stats["generation_ms"])
+    log_interaction("assistant", ai_response, **st.session_state.last_turn_stats)
+    update_history_summary()
+    return ai_response
 
 def transcribe_audio(audio_bytes: bytes) -> str:
-    """Transcribe audio using OpenAI Whisper API"""
+    """Transcribe audio using OpenAI Whisper API (trimmed, mono, 16 kHz - see audio_processing)"""
+    from audio_processing import prepare_clip   # Pulls in numpy - only needed once a student records
+    from transcription import TRANSCRIBE_MODEL, transcribe_clip
+    
+    clip = prepare_clip(audio_bytes)
+    st.session_state.last_clip_stats = clip.stats()
+    if clip.audio is None:
+        # Nothing but silence - don't spend an API call on it
+        return ""
+    
     try:
-        client = OpenAI(api_key=st.session_state.api_key)
-        
-        audio_file = io.BytesIO(audio_bytes)
-        audio_file.name = "recording.wav"
-        
-        transcript = client.audio.transcriptions.create(
-            model="whisper-1",
-            file=audio_file
-        )
-        
-        return transcript.text
+        backend = get_backend(st.session_state.api_key)
+        
+        start = time.perf_counter()
+        # Long clips are transcribed as parallel chunks (see transcription.py)
+        transcript = transcribe_clip(backend, clip, st.session_state.session_id)
+        clip_stats = st.session_state.last_clip_stats
+        clip_stats["transcribe_ms"] = round((time.perf_counter() - start) * 1000)
+        cost = transcription_cost(TRANSCRIBE_MODEL, clip.processed_seconds)
+        if cost is not None:
+            clip_stats["cost_usd"] = round(cost, 6)
+        account_usage(TRANSCRIBE_MODEL, {"generation_ms": clip_stats["transcribe_ms"], "cost_usd": cost})
+        
+        return transcript
     
     except Exception as e:
         st.error(f"Error transcribing audio: {str(e)}")
@@ -563,9 +591,7 @@ def transcribe_audio(audio_bytes: bytes) -> str:
 
 def show_corpus_examples(examples: List[str], title: str = "Here are some examples from real conversations:"):
     """Display corpus examples in a styled box"""
-    st.markdown(f"**{title}**")
-    for example in examples:
-        st.markdown(f'<div class="corpus-example">"{example}"</div>', unsafe_allow_html=True)
+    st.markdown(corpus_examples_html(tuple(examples), title), unsafe_allow_html=True)
 
 def show_context_reminder(relationship: str, power: str):
     """Display a context reminder box"""
@@ -580,53 +606,123 @@ def show_context_reminder(relationship: str, power: str):
     st.markdown(f'<div class="context-reminder">{reminder_text}</div>', unsafe_allow_html=True)
 
 def display_conversation_history():
-    """Display conversation using Streamlit's native chat pattern - THE WORKING VERSION"""
-    for message in st.session_state.conversation_history:
+    """Display the latest messages as chat bubbles; older ones collapse into one block so render cost stays flat"""
+    history = st.session_state.conversation_history
+    earlier = history[:-CHAT_WINDOW_MESSAGES]
+    if earlier:
+        with st.expander(f"Earlier messages ({len(earlier)})"):
+            st.markdown("\n\n".join(
+                f"**{'You' if message['role'] == 'user' else 'Partner'}:** {message['content']}"
+                for message in earlier
+            ))
+    for message in history[-CHAT_WINDOW_MESSAGES:]:
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
 
-def show_scaffolding(power_level: str):
+def similar_examples(power_level: str, relationship: str, k: int = 4) -> List[str]:
+    """Corpus examples closest to the student's last message, for this relationship"""
+    last_message = next((message["content"] for message in reversed(st.session_state.conversation_history)
+                         if message["role"] == "user"), "")
+    with trace_phase("retrieval"):
+        return get_corpus().search(last_message, power_level, relationship, k)
+
+def show_scaffolding(power_level: str, relationship: str):
     """Show scaffolding at Turn 1 of each scenario - ONLY examples and noticing questions, NO explicit teaching"""
-    st.markdown("""
-    <div class="scaffolding-box">
-    <h4>💡 Let me show you how others disagreed in similar situations...</h4>
-    """, unsafe_allow_html=True)
+    examples = tuple(similar_examples(power_level, relationship))
+    st.markdown(scaffolding_html(power_level, examples), unsafe_allow_html=True)
+
+@st.fragment
+def chat_panel(chat: Dict):
+    """Chat area of a debate or role-play; a new message reruns only this fragment, not the page
     
-    st.markdown("**Examples from real conversations:**")
-    
-    if power_level == "low":
-        show_corpus_examples([
-            "Yeah but there are some disadvantages like er...",
-            "Well I agree but maybe we can develop more jobs",
-            "yeah I agree but I still the problem is that...",
-            "Yes but if people are going to live over a hundred..."
-        ], "")
-        st.markdown("""
-        **Look at these examples. What do you notice?**
-        - How do they start their disagreement?
-        - What words appear in most of these examples?
-        - Do they disagree directly or do they do something first?
-        """)
-    else:
-        show_corpus_examples([
-            "I can see their point. It is sometimes annoying. But I don't agree that they should be banned.",
-            "I can understand your opinion erm but I was still wondering...",
-            "I understand his situation but I'm not sure if I should do it",
-            "I agree with this point but don't you think maybe..."
-        ], "")
-        st.markdown("""
-        **Look at these examples. What do you notice?**
-        - How do they start their disagreement?
-        - Are these examples longer or shorter than casual conversations?
-        - What do they say BEFORE disagreeing?
-        - Do you see any words like "maybe", "perhaps", "I think"?
-        """)
-    
-    st.markdown("**Want to try your response again?**")
-    st.markdown("</div>", unsafe_allow_html=True)
+    chat holds the per-activity settings (see the *_chat states). Anything that
+    changes between turns is read from session state, since a fragment rerun
+    reuses the arguments of the last full run.
+    """
+    st.markdown("---")
+    st.markdown("### 💬 Chat")
+    display_conversation_history()
+    
+    # New turns (streamed replies) render here, directly under the history
+    chat_area = st.container()
+    
+    # Show scaffolding at Turn 1
+    if st.session_state.turn_count == 1 and not st.session_state.scaffolding_shown:
+        show_scaffolding(chat["power"], chat["relationship"])
+        st.session_state.scaffolding_shown = True
+        log_autonomy(chat["scaffolding_event"])
+    
+    # Show AUTOMATIC scaffolding after 3 responses without target structure
+    if st.session_state.auto_scaffold_shown and st.session_state.responses_without_target >= 3:
+        st.markdown(chat["auto_scaffold_intro"], unsafe_allow_html=True)
+        show_scaffolding(chat["power"], chat["relationship"])
+        # Reset the counter after showing
+        st.session_state.responses_without_target = 0
+    
+    st.markdown("---")
+    st.markdown("### Your Turn:")
+    
+    # Keys change every turn so the widgets start fresh
+    turn = st.session_state[chat["turn_key"]]
+    user_input = st.chat_input(chat["placeholder"], key=f"{chat['input_key']}_{turn}")
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        help_button = st.button("❓ Need Help?", key=f"help{chat['key_suffix']}_{turn}")
+    with col2:
+        end_button = st.button(chat["end_label"], key=f"end{chat['key_suffix']}_{turn}")
+    with col3:
+        back_button = st.button("🔙 Try Another", key=f"back{chat['key_suffix']}_{turn}")
+    
+    if user_input:
+        # Check if user used target structure
+        with trace_phase("target_check", upcoming=True):
+            analysis = analyze_turn(user_input)
+        has_target = analysis.has_target
+        if has_target:
+            st.session_state.responses_without_target = 0
+        else:
+            st.session_state.responses_without_target += 1
+        
+        log_interaction("user", f"Turn {st.session_state.turn_count + 1}: {user_input} [Target: {has_target}]", **target_details(analysis))
+        
+        respond(user_input, chat["relationship"], chat["topic"], chat_area, chat["spinner_text"])
+        
+        if chat["turn_key"] == "debate_turn":
+            st.session_state.debate_turn += 1
+        st.session_state.turn_count += 1
+        
+        # Trigger auto-scaffolding
+        if st.session_state.responses_without_target >= 3 and not st.session_state.auto_scaffold_shown:
+            st.session_state.auto_scaffold_shown = True
+            log_autonomy(chat["auto_scaffold_event"])
+        
+        start_render_trace()
+        try:
+            st.rerun(scope="fragment")
+        except StreamlitAPIException:
+            # The message arrived with a full-page run (e.g. the page was just loaded)
+            st.rerun()
+    
+    if help_button:
+        log_autonomy("examples_request")
+        st.markdown("---")
+        st.markdown("### 📚 Example Patterns:")
+        show_corpus_examples(similar_examples(chat["power"], chat["relationship"]), chat["examples_title"])
+    
+    # Leaving the chat changes the page, so these rerun the whole app
+    if end_button:
+        go_to("end")
+    
+    if back_button:
+        go_to("back")
+    
+    finish_render_trace()
 
 def voice_or_text_input(input_label: str, key_prefix: str, height: int = 100):
     """Display both voice recording and text input options"""
+    from audio_recorder_streamlit import audio_recorder   # Deferred until a page actually offers recording
+    
     st.markdown(f"""
     <div class="voice-recording-box">
     <strong>🎤 You can either speak OR type your response:</strong>
@@ -646,12 +742,32 @@ def voice_or_text_input(input_label: str, key_prefix: str, height: int = 100):
             key=f"audio_{key_prefix}"
         )
         
-        if audio_bytes and audio_bytes != st.session_state.last_audio_bytes:
-            st.session_state.last_audio_bytes = audio_bytes
+        # Recordings are identified by digest; the raw WAV is never kept in session state
+        audio_digest = content_digest(audio_bytes) if audio_bytes else None
+        is_new_recording = audio_digest is not None and audio_digest != st.session_state.last_audio_digest
+        
+        if is_new_recording:
+            st.session_state.last_audio_digest = audio_digest
+            transcribed_text = st.session_state.transcript_cache.get(audio_digest)
             
-            with st.spinner("Transcribing your voice..."):
-                transcribed_text = transcribe_audio(audio_bytes)
-                st.session_state.transcribed_text = transcribed_text
+            if transcribed_text is None:
+                with st.spinner("Transcribing your voice..."), trace_phase("transcribe", upcoming=True):
+                    transcribed_text = transcribe_audio(audio_bytes)
+                
+                clip_stats = st.session_state.last_clip_stats
+                log_interaction("system", "Voice clip transcribed", **clip_stats)
+                if clip_stats["skip_reason"]:
+                    st.warning("🔇 I couldn't hear anything in that recording - please try again.")
+                elif "transcribe_ms" in clip_stats:
+                    st.caption(
+                        f"Uploaded {clip_stats['processed_bytes'] / 1024:.0f} KB "
+                        f"(saved {clip_stats['bytes_saved'] / 1024:.0f} KB) · "
+                        f"transcribed in {clip_stats['transcribe_ms'] / 1000:.1f}s"
+                    )
+                if transcribed_text:
+                    st.session_state.transcript_cache.put(audio_digest, transcribed_text)
+            
+            st.session_state.transcribed_text = transcribed_text
             
             if transcribed_text:
                 st.success("✅ Recording transcribed!")
@@ -659,7 +775,7 @@ def voice_or_text_input(input_label: str, key_prefix: str, height: int = 100):
                 return transcribed_text, "voice"
         
         if st.session_state.transcribed_text:
-            if not (audio_bytes and audio_bytes != st.session_state.last_audio_bytes):
+            if not is_new_recording:
                 st.info(f"📝 **Ready to send:** {st.session_state.transcribed_text}")
             return st.session_state.transcribed_text, "voice"
     
@@ -673,6 +789,39 @@ def voice_or_text_input(input_label: str, key_prefix: str, height: int = 100):
 # ============================================================================
 # ACTIVITY PROCESSING FUNCTIONS
 # ============================================================================
+def go_to(event: str, rerun: bool = True, **updates):
+    """Leave the current screen by one of its events (see lesson.TRANSITIONS); updates are extra session values"""
+    transition = TRANSITIONS[(st.session_state.current_state, event)]
+    values = {**(fresh_conversation() if transition.fresh else {}), **updates}
+    for key, value in values.items():
+        st.session_state[key] = value
+    st.session_state.current_state = transition.target
+    st.session_state.current_activity = STATE_ACTIVITY[transition.target]
+    if transition.log:
+        log_interaction("system", transition.log)
+    warm_up_chat()
+    if rerun:
+        st.rerun()
+
+def warm_up_chat():
+    """If the new screen is a chat, start warming its first turn in the background (see prewarm.py)"""
+    state = st.session_state.current_state
+    if state == "debate_chat":
+        setting = st.session_state.current_debate
+    elif state in SCENARIO_CHATS:
+        setting = SCENARIOS_BY_ID[SCENARIO_CHATS[state]["scenario"]]
+    else:
+        return
+    if not PREWARM_ENABLED or (uses_api_key() and not st.session_state.api_key):
+        return
+    relationship = setting["relationship"]
+    # The first turn will open with exactly these messages (see build_messages)
+    messages = prefix_messages(relationship) + [
+        {"role": "system", "content": topic_message(setting["topic"])},
+        {"role": "assistant", "content": setting["ai_opening"]},
+    ]
+    get_prewarmer().warm(get_backend(st.session_state.api_key), get_router().route(relationship, 0, 0).model,
+                         relationship, setting["topic"], messages, st.session_state.session_id)
 
 def process_welcome():
     """Display welcome screen"""
@@ -699,703 +848,310 @@ def process_welcome():
     """, unsafe_allow_html=True)
     
     if st.button("Start Activity 1"):
-        st.session_state.current_activity = "activity1"
-        st.session_state.current_state = "activity1_intro"
-        log_interaction("system", "Started Activity 1")
-        st.rerun()
+        go_to("start")
 
-def process_activity1():
-    """Process Activity 1: Noticing yes-but constructions"""
+def process_activity1_intro():
+    """Activity 1: Noticing yes-but constructions"""
+    st.markdown('<div class="activity-header">📚 Activity 1: Discovering Disagreement Patterns</div>', unsafe_allow_html=True)
     
-    if st.session_state.current_state == "activity1_intro":
-        st.markdown('<div class="activity-header">📚 Activity 1: Discovering Disagreement Patterns</div>', unsafe_allow_html=True)
-        
-        st.markdown("""
-        <div class="info-box">
-        <h3>What you'll do:</h3>
-        <p>Look at TWO conversations between people. Your job is to discover:</p>
-        <ul>
-            <li>How do they disagree?</li>
-            <li>What words do they use?</li>
-            <li>Are the conversations different? How?</li>
-        </ul>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        if st.button("Show First Conversation"):
-            st.session_state.current_state = "show_dialogue1"
-            st.session_state.current_dialogue = "mobile_phones"
-            st.rerun()
+    st.markdown("""
+    <div class="info-box">
+    <h3>What you'll do:</h3>
+    <p>Look at TWO conversations between people. Your job is to discover:</p>
+    <ul>
+        <li>How do they disagree?</li>
+        <li>What words do they use?</li>
+        <li>Are the conversations different? How?</li>
+    </ul>
+    </div>
+    """, unsafe_allow_html=True)
     
-    elif st.session_state.current_state == "show_dialogue1":
-        st.markdown('<div class="activity-header">📚 Activity 1: First Conversation</div>', unsafe_allow_html=True)
-        
-        dialogue_data = DIALOGUES["mobile_phones"]
-        
-        st.markdown(f"""
-        <div class="dialogue-box">
-        <h4>{dialogue_data['title']}</h4>
-        <p><em>{dialogue_data['context']}</em></p>
-        <hr>
-        {dialogue_data['dialogue'].replace('**', '<strong>').replace('**', '</strong>')}
-        </div>
-        """, unsafe_allow_html=True)
-        
-        st.markdown("**Questions to think about:**")
-        st.markdown("1. Does Tiara agree or disagree with Eden?")
-        st.markdown("2. What words does Tiara use to disagree?")
-        st.markdown("3. Is Tiara polite or rude?")
-        
-        response = st.text_area("Write your thoughts here:", key="dialogue1_response", height=150)
-        
-        if st.button("Continue to Second Conversation"):
-            if response:
-                log_interaction("user", f"Activity 1 - Dialogue 1 response: {response}")
-            st.session_state.current_state = "show_dialogue2"
-            st.session_state.current_dialogue = "life_expectancy"
-            st.rerun()
+    if st.button("Show First Conversation"):
+        go_to("next")
+
+def process_dialogue():
+    """One corpus dialogue with noticing questions (see lesson.DIALOGUE_SCREENS)"""
+    screen = DIALOGUE_SCREENS[st.session_state.current_state]
+    st.markdown(f'<div class="activity-header">{screen["header"]}</div>', unsafe_allow_html=True)
     
-    elif st.session_state.current_state == "show_dialogue2":
-        st.markdown('<div class="activity-header">📚 Activity 1: Second Conversation</div>', unsafe_allow_html=True)
-        
-        dialogue_data = DIALOGUES["life_expectancy"]
-        
-        st.markdown(f"""
-        <div class="dialogue-box">
-        <h4>{dialogue_data['title']}</h4>
-        <p><em>{dialogue_data['context']}</em></p>
-        <hr>
-        {dialogue_data['dialogue'].replace('**', '<strong>').replace('**', '</strong>')}
-        </div>
-        """, unsafe_allow_html=True)
-        
-        st.markdown("**Questions to think about:**")
-        st.markdown("1. Do Linda and Semih agree or disagree?")
-        st.markdown("2. What words do they use to disagree?")
-        st.markdown("3. How is this conversation different from the first one?")
-        
-        response = st.text_area("Write your thoughts here:", key="dialogue2_response", height=150)
-        
-        if st.button("See What You Discovered"):
-            if response:
-                log_interaction("user", f"Activity 1 - Dialogue 2 response: {response}")
-            st.session_state.current_state = "activity1_summary"
-            st.rerun()
+    dialogue_data = DIALOGUES[screen["dialogue"]]
     
-    elif st.session_state.current_state == "activity1_summary":
-        st.markdown('<div class="activity-header">📚 Activity 1: Look at More Examples</div>', unsafe_allow_html=True)
-        
-        st.markdown("""
-        <div class="info-box">
-        <p>Here are more examples from the same corpus of how people disagree:</p>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        st.markdown("**From conversations between friends:**")
-        show_corpus_examples([
-            "Yeah but there are some disadvantages like er...",
-            "yeah I agree but I still the problem is that...",
-            "Yes but if people are going to live over 100...",
-            "well I agree but maybe we can develop more jobs"
-        ])
-        
-        st.markdown("**From conversations between boss and employee:**")
-        show_corpus_examples([
-            "I can see their point. It is sometimes annoying. But I don't agree that they should be banned.",
-            "I can understand your opinion erm but I was still wondering...",
-            "I agree with this point but don't you think maybe the fact that times are changing is a good thing?",
-            "I understand his situation but I'm not sure if I should do it"
-        ])
-        
-        st.markdown("**Questions to think about:**")
-        st.markdown("""
-        <div class="info-box">
-        <ol>
-            <li>What do you notice that's <strong>the same</strong> in all these examples?</li>
-            <li>What do you notice that's <strong>different</strong> between friends vs. boss/employee?</li>
-            <li>Which examples are longer? Which are shorter?</li>
-            <li>When would you use each style?</li>
-        </ol>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        st.markdown("**Reflect on what you discovered:**")
-        reflection = st.text_area("Write your thoughts:", key="activity1_reflection", height=100)
-        
-        if st.button("Ready for Activity 2"):
-            if reflection:
-                log_interaction("user", f"Activity 1 reflection: {reflection}")
-            st.session_state.current_activity = "activity2"
-            st.session_state.current_state = "activity2_intro"
-            log_interaction("system", "Completed Activity 1, Started Activity 2")
-            st.rerun()
-
-def process_activity2():
-    """Process Activity 2: Debate practice"""
+    st.markdown(f"""
+    <div class="dialogue-box">
+    <h4>{dialogue_data['title']}</h4>
+    <p><em>{dialogue_data['context']}</em></p>
+    <hr>
+    {dialogue_data['dialogue'].replace('**', '<strong>').replace('**', '</strong>')}
+    </div>
+    """, unsafe_allow_html=True)
     
-    if st.session_state.current_state == "activity2_intro":
-        st.markdown('<div class="activity-header">💭 Activity 2: Practice Debate with Me!</div>', unsafe_allow_html=True)
-        
-        st.markdown("""
-        <div class="info-box">
-        <h3>Now it's your turn to practice!</h3>
-        
-        <p>We'll have <strong>debates</strong> about different topics. I'll take one side, you take the other.</p>
-        
-        <p><strong>✨ You can record your voice or type!</strong></p>
-        
-        <p>Choose a debate topic below. Don't worry - you can come back and try different ones!</p>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        st.markdown("**Choose a debate topic:**")
-        
-        st.markdown("**Casual Conversations (with friends/classmates):**")
-        col1, col2 = st.columns(2)
-        with col1:
-            if st.button("📱 Social Media\n(Chat with your friend)", key="debate_social"):
-                st.session_state.current_debate = DEBATE_TOPICS[0]
-                st.session_state.current_state = "debate_chat"
-                st.session_state.conversation_history = []
-                st.session_state.transcribed_text = ""
-                st.session_state.last_audio_bytes = None
-                st.session_state.debate_turn = 1
-                st.session_state.turn_count = 0
-                st.session_state.scaffolding_shown = False
-                st.rerun()
-        with col2:
-            if st.button("📚 Homework\n(Chat with your classmate)", key="debate_homework"):
-                st.session_state.current_debate = DEBATE_TOPICS[1]
-                st.session_state.current_state = "debate_chat"
-                st.session_state.conversation_history = []
-                st.session_state.transcribed_text = ""
-                st.session_state.last_audio_bytes = None
-                st.session_state.debate_turn = 1
-                st.session_state.turn_count = 0
-                st.session_state.scaffolding_shown = False
-                st.rerun()
-        
-        st.markdown("---")
-        st.markdown("**Professional Conversations (with your boss):**")
-        col3, col4 = st.columns(2)
-        with col3:
-            if st.button("👔 Dress Code Policy\n(Talk with your boss)", key="debate_dress"):
-                st.session_state.current_debate = DEBATE_TOPICS[2]
-                st.session_state.current_state = "debate_chat"
-                st.session_state.conversation_history = []
-                st.session_state.transcribed_text = ""
-                st.session_state.last_audio_bytes = None
-                st.session_state.debate_turn = 1
-                st.session_state.turn_count = 0
-                st.session_state.scaffolding_shown = False
-                st.rerun()
-        with col4:
-            if st.button("🏢 Remote Work Policy\n(Talk with your boss)", key="debate_remote"):
-                st.session_state.current_debate = DEBATE_TOPICS[3]
-                st.session_state.current_state = "debate_chat"
-                st.session_state.conversation_history = []
-                st.session_state.transcribed_text = ""
-                st.session_state.last_audio_bytes = None
-                st.session_state.debate_turn = 1
-                st.session_state.turn_count = 0
-                st.session_state.scaffolding_shown = False
-                st.rerun()
+    st.markdown("**Questions to think about:**")
+    for number, question in enumerate(screen["questions"], 1):
+        st.markdown(f"{number}. {question}")
     
-    elif st.session_state.current_state == "debate_chat":
-        topic = st.session_state.current_debate
-        
-        st.markdown('<div class="activity-header">💭 Activity 2: Debate Time!</div>', unsafe_allow_html=True)
-        
-        # Show context reminder
-        show_context_reminder(topic['relationship'], topic['power'])
-        
-        st.markdown(f"""
-        <div class="scenario-box">
-        <h3>Topic: {topic['topic']}</h3>
-        <p><strong>My position:</strong> {topic['ai_position']}</p>
-        <p><strong>Your position:</strong> {topic['topic']} is harmful/not necessary</p>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # Show opening
-        if len(st.session_state.conversation_history) == 0:
-            st.session_state.conversation_history.append({
-                "role": "assistant", 
-                "content": topic['ai_opening']
-            })
-            log_interaction("assistant", topic['ai_opening'])
-        
-        # ===== CHAT DISPLAY - WORKING VERSION =====
-        st.markdown("---")
-        st.markdown("### 💬 Chat")
-        
-        # Display all messages
-        for message in st.session_state.conversation_history:
-            with st.chat_message(message["role"]):
-                st.markdown(message["content"])
-        
-        # Show scaffolding at Turn 1
-        if st.session_state.turn_count == 1 and not st.session_state.scaffolding_shown:
-            show_scaffolding(topic['power'])
-            st.session_state.scaffolding_shown = True
-            log_autonomy("scaffolding_turn1")
-        
-        # Show AUTOMATIC scaffolding after 3 responses without target structure
-        if st.session_state.auto_scaffold_shown and st.session_state.responses_without_target >= 3:
-            st.markdown("""
-            <div class="scaffolding-box">
-            <h4>💡 I noticed you might benefit from seeing how others disagree...</h4>
-            <p style="color: #666; font-size: 0.9rem;">You've been disagreeing, but I haven't seen certain patterns that make disagreements sound more natural in English.</p>
-            </div>
-            """, unsafe_allow_html=True)
-            show_scaffolding(topic['power'])
-            # Reset the counter after showing
-            st.session_state.responses_without_target = 0
-        
-        st.markdown("---")
-        
-        # Input area - WORKING VERSION
-        st.markdown("### Your Turn:")
-        
-        # Chat input - press Enter to send
-        user_input = st.chat_input("Type your message and press Enter...", key=f"chat_{st.session_state.debate_turn}")
-        
-        # Buttons
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            help_button = st.button("❓ Need Help?", key=f"help_{st.session_state.debate_turn}")
-        with col2:
-            end_button = st.button("✅ End Debate", key=f"end_{st.session_state.debate_turn}")
-        with col3:
-            back_button = st.button("🔙 Try Another", key=f"back_{st.session_state.debate_turn}")
-        
-        # Handle chat input
-        if user_input:
-            # Check if user used target structure
-            has_target = check_for_target_structure(user_input)
-            
-            if has_target:
-                # Reset counter if they used it
-                st.session_state.responses_without_target = 0
-            else:
-                # Increment counter
-                st.session_state.responses_without_target += 1
-            
-            log_interaction("user", f"Turn {st.session_state.turn_count + 1}: {user_input} [Target: {has_target}]")
-            
-            with st.spinner("💭 Thinking..."):
-                ai_response = call_gpt(user_input, topic['relationship'], topic['topic'])
-                log_interaction("assistant", ai_response)
-            
-            st.session_state.debate_turn += 1
-            st.session_state.turn_count += 1
-            
-            # Show automatic scaffolding after 3 responses without target structure
-            if st.session_state.responses_without_target >= 3 and not st.session_state.auto_scaffold_shown:
-                st.session_state.auto_scaffold_shown = True
-                log_autonomy("auto_scaffolding_triggered")
-            
-            st.rerun()
-        
-        if help_button:
-            log_autonomy("examples_request")
-            examples_key = topic['corpus_patterns']
-            example_title = "Examples of casual disagreements:" if topic['power'] == 'low' else "Examples of professional disagreements:"
+    response = st.text_area("Write your thoughts here:", key=screen["response_key"], height=150)
+    
+    if st.button(screen["button"]):
+        if response:
+            log_interaction("user", f"{screen['log_label']}: {response}")
+        go_to("next")
+
+def process_activity1_summary():
+    """Activity 1: more corpus examples and reflection"""
+    st.markdown('<div class="activity-header">📚 Activity 1: Look at More Examples</div>', unsafe_allow_html=True)
+    
+    st.markdown("""
+    <div class="info-box">
+    <p>Here are more examples from the same corpus of how people disagree:</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    st.markdown("**From conversations between friends:**")
+    show_corpus_examples(get_corpus().featured("low", 4))
+    
+    st.markdown("**From conversations between boss and employee:**")
+    show_corpus_examples(get_corpus().featured("high", 4))
+    
+    st.markdown("**Questions to think about:**")
+    st.markdown("""
+    <div class="info-box">
+    <ol>
+        <li>What do you notice that's <strong>the same</strong> in all these examples?</li>
+        <li>What do you notice that's <strong>different</strong> between friends vs. boss/employee?</li>
+        <li>Which examples are longer? Which are shorter?</li>
+        <li>When would you use each style?</li>
+    </ol>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    st.markdown("**Reflect on what you discovered:**")
+    reflection = st.text_area("Write your thoughts:", key="activity1_reflection", height=100)
+    
+    if st.button("Ready for Activity 2"):
+        if reflection:
+            log_interaction("user", f"Activity 1 reflection: {reflection}")
+        go_to("next")
+
+def process_activity2_intro():
+    """Activity 2: choose a debate topic"""
+    st.markdown('<div class="activity-header">💭 Activity 2: Practice Debate with Me!</div>', unsafe_allow_html=True)
+    
+    st.markdown("""
+    <div class="info-box">
+    <h3>Now it's your turn to practice!</h3>
+    
+    <p>We'll have <strong>debates</strong> about different topics. I'll take one side, you take the other.</p>
+    
+    <p><strong>✨ You can record your voice or type!</strong></p>
+    
+    <p>Choose a debate topic below. Don't worry - you can come back and try different ones!</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    st.markdown("**Choose a debate topic:**")
+    
+    for group, (heading, topics) in enumerate(DEBATE_MENU):
+        if group:
             st.markdown("---")
-            st.markdown("### 📚 Example Patterns:")
-            show_corpus_examples(CORPUS_EXAMPLES[examples_key], example_title)
-        
-        if end_button:
-            st.session_state.current_state = "debate_complete"
-            st.rerun()
-        
-        if back_button:
-            st.session_state.current_state = "activity2_intro"
-            st.session_state.conversation_history = []
-            st.session_state.turn_count = 0
-            st.session_state.scaffolding_shown = False
-            st.rerun()
+        st.markdown(f"**{heading}**")
+        for column, (topic_id, label, key) in zip(st.columns(len(topics)), topics):
+            with column:
+                if st.button(label, key=key):
+                    go_to("debate", current_debate=DEBATE_TOPICS_BY_ID[topic_id])
+
+def start_conversation(opening: str):
+    """Open an empty conversation with the partner's first line"""
+    if len(st.session_state.conversation_history) == 0:
+        st.session_state.conversation_history.append({
+            "role": "assistant",
+            "content": opening
+        })
+        log_interaction("assistant", opening)
+
+def process_debate_chat():
+    """Activity 2: debate on the chosen topic"""
+    topic = st.session_state.current_debate
     
-    elif st.session_state.current_state == "debate_complete":
-        st.markdown('<div class="activity-header">💭 Activity 2: Debate Complete!</div>', unsafe_allow_html=True)
-        
-        st.markdown("""
-        <div class="success-box">
-        <h3>Great debate!</h3>
-        
-        <p>You practiced disagreeing in a natural conversation!</p>
-        
-        <p>Next, you'll try role-play scenarios with different relationships!</p>
+    st.markdown('<div class="activity-header">💭 Activity 2: Debate Time!</div>', unsafe_allow_html=True)
+    
+    # Show context reminder
+    show_context_reminder(topic['relationship'], topic['power'])
+    
+    st.markdown(scenario_box_html(f"Topic: {topic['topic']}", (
+        ("My position", topic['ai_position']),
+        ("Your position", f"{topic['topic']} is harmful/not necessary")
+    )), unsafe_allow_html=True)
+    
+    start_conversation(topic['ai_opening'])
+    
+    chat_panel({
+        "power": topic['power'],
+        "relationship": topic['relationship'],
+        "topic": topic['topic'],
+        "turn_key": "debate_turn",
+        "input_key": "chat",
+        "key_suffix": "",
+        "placeholder": "Type your message and press Enter...",
+        "spinner_text": "💭 Thinking...",
+        "end_label": "✅ End Debate",
+        "scaffolding_event": "scaffolding_turn1",
+        "auto_scaffold_event": "auto_scaffolding_triggered",
+        "auto_scaffold_intro": """
+        <div class="scaffolding-box">
+        <h4>💡 I noticed you might benefit from seeing how others disagree...</h4>
+        <p style="color: #666; font-size: 0.9rem;">You've been disagreeing, but I haven't seen certain patterns that make disagreements sound more natural in English.</p>
         </div>
-        """, unsafe_allow_html=True)
-        
-        col1, col2 = st.columns(2)
-        with col1:
-            if st.button("Continue to Activity 3"):
-                st.session_state.current_activity = "activity3"
-                st.session_state.current_state = "activity3_intro"
-                st.session_state.conversation_history = []
-                st.session_state.transcribed_text = ""
-                st.session_state.last_audio_bytes = None
-                st.session_state.debate_turn = 1
-                st.session_state.turn_count = 0
-                st.session_state.scaffolding_shown = False
-                log_interaction("system", "Completed Activity 2, Started Activity 3")
-                st.rerun()
-        with col2:
-            if st.button("Try Another Debate Topic"):
-                st.session_state.current_state = "activity2_intro"
-                st.session_state.conversation_history = []
-                st.session_state.turn_count = 0
-                st.session_state.scaffolding_shown = False
-                st.rerun()
+        """,
+        "examples_title": "Examples of casual disagreements:" if topic['power'] == 'low' else "Examples of professional disagreements:"
+    })
 
-def process_activity3():
-    """Process Activity 3: Role-play scenarios"""
+def process_complete_screen():
+    """The page after a debate or scenario (see lesson.COMPLETE_SCREENS)"""
+    screen = COMPLETE_SCREENS[st.session_state.current_state]
+    st.markdown(f'<div class="activity-header">{screen["header"]}</div>', unsafe_allow_html=True)
     
-    if st.session_state.current_state == "activity3_intro":
-        st.markdown('<div class="activity-header">🎭 Activity 3: Real-Life Role-Play</div>', unsafe_allow_html=True)
-        
-        st.markdown("""
-        <div class="info-box">
-        <h3>Now for the real challenge!</h3>
-        
-        <p>You'll practice TWO scenarios:</p>
-        <ol>
-            <li><strong>Scenario 1:</strong> Talking with a friend</li>
-            <li><strong>Scenario 2:</strong> Talking with your boss</li>
-        </ol>
-        
-        <p><strong>✨ You can record your voice or type!</strong></p>
-        
-        <p>Try to disagree politely in each situation. Remember what you discovered!</p>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        col1, col2 = st.columns(2)
-        with col1:
-            if st.button("Start Scenario 1 (Friend)"):
-                st.session_state.current_state = "scenario1_chat"
-                st.session_state.current_scenario = ROLE_PLAY_SCENARIOS[0]
-                st.session_state.conversation_history = []
-                st.session_state.turn_count = 0
-                st.session_state.scaffolding_shown = False
-                st.rerun()
-        with col2:
-            if st.button("Start Scenario 2 (Boss)"):
-                st.session_state.current_state = "scenario2_chat"
-                st.session_state.current_scenario = ROLE_PLAY_SCENARIOS[1]
-                st.session_state.conversation_history = []
-                st.session_state.turn_count = 0
-                st.session_state.scaffolding_shown = False
-                st.rerun()
+    st.markdown(screen["body"], unsafe_allow_html=True)
     
-    elif st.session_state.current_state == "scenario1_chat":
-        scenario = ROLE_PLAY_SCENARIOS[0]
-        
-        st.markdown('<div class="activity-header">🎭 Scenario 1: Talking with a friend</div>', unsafe_allow_html=True)
-        
-        show_context_reminder(scenario['relationship'], scenario['power'])
-        
-        st.markdown(f"""
-        <div class="scenario-box">
-        <h3>{scenario['title']}</h3>
-        <p><strong>Your role:</strong> {scenario['role_student']}</p>
-        <p><strong>Situation:</strong> {scenario['situation']}</p>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # Show opening
-        if len(st.session_state.conversation_history) == 0:
-            st.session_state.conversation_history.append({
-                "role": "assistant",
-                "content": scenario['ai_opening']
-            })
-            log_interaction("assistant", scenario['ai_opening'])
-        
-        st.markdown("---")
-        st.markdown("### 💬 Chat")
-        display_conversation_history()
-        
-        # Show scaffolding at Turn 1
-        if st.session_state.turn_count == 1 and not st.session_state.scaffolding_shown:
-            show_scaffolding(scenario['power'])
-            st.session_state.scaffolding_shown = True
-            log_autonomy("scaffolding_turn1_scenario1")
-        
-        # Show AUTOMATIC scaffolding after 3 responses without target structure
-        if st.session_state.auto_scaffold_shown and st.session_state.responses_without_target >= 3:
-            st.markdown("""
-            <div class="scaffolding-box">
-            <h4>💡 Let me show you how others express disagreement in similar situations...</h4>
-            <p style="color: #666; font-size: 0.9rem;">I noticed you've been disagreeing, but certain patterns make disagreements sound more natural.</p>
-            </div>
-            """, unsafe_allow_html=True)
-            show_scaffolding(scenario['power'])
-            st.session_state.responses_without_target = 0
-        
-        st.markdown("---")
-        st.markdown("### Your Turn:")
-        
-        # Simple chat input
-        user_input = st.chat_input("Type your response...", key=f"scenario1_{st.session_state.turn_count}")
-        
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            help_button = st.button("❓ Need Help?", key=f"help_s1_{st.session_state.turn_count}")
-        with col2:
-            end_button = st.button("✅ End Scenario", key=f"end_s1_{st.session_state.turn_count}")
-        with col3:
-            back_button = st.button("🔙 Try Another", key=f"back_s1_{st.session_state.turn_count}")
-        
-        if user_input:
-            # Check for target structure
-            has_target = check_for_target_structure(user_input)
-            if has_target:
-                st.session_state.responses_without_target = 0
-            else:
-                st.session_state.responses_without_target += 1
-            
-            log_interaction("user", f"Turn {st.session_state.turn_count + 1}: {user_input} [Target: {has_target}]")
-            
-            with st.spinner("💭 Responding..."):
-                ai_response = call_gpt(user_input, scenario['relationship'], "phone usage and health")
-                log_interaction("assistant", ai_response)
-            
-            st.session_state.turn_count += 1
-            
-            # Trigger auto-scaffolding
-            if st.session_state.responses_without_target >= 3 and not st.session_state.auto_scaffold_shown:
-                st.session_state.auto_scaffold_shown = True
-                log_autonomy("auto_scaffolding_triggered_s1")
-            
-            st.rerun()
-        
-        if help_button:
-            log_autonomy("examples_request")
-            st.markdown("---")
-            st.markdown("### 📚 Example Patterns:")
-            show_corpus_examples(CORPUS_EXAMPLES["low_power"], "Casual disagreement patterns:")
-        
-        if end_button:
-            st.session_state.current_state = "scenario1_complete"
-            st.rerun()
-        
-        if back_button:
-            st.session_state.current_state = "activity3_intro"
-            st.session_state.conversation_history = []
-            st.session_state.turn_count = 0
-            st.session_state.scaffolding_shown = False
-            st.rerun()
+    for column, (label, event) in zip(st.columns(len(screen["buttons"])), screen["buttons"]):
+        with column:
+            if st.button(label):
+                go_to(event)
+
+def process_activity3_intro():
+    """Activity 3: Role-play scenarios"""
+    st.markdown('<div class="activity-header">🎭 Activity 3: Real-Life Role-Play</div>', unsafe_allow_html=True)
     
-    elif st.session_state.current_state == "scenario1_complete":
-        st.markdown('<div class="activity-header">🎭 Scenario 1: Complete!</div>', unsafe_allow_html=True)
-        
-        st.markdown("""
-        <div class="success-box">
-        <h3>Nice conversation with your friend!</h3>
-        
-        <p>Would you like to try the boss scenario, or try this one again?</p>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            if st.button("Continue to Scenario 2 (Boss)"):
-                st.session_state.current_state = "scenario2_chat"
-                st.session_state.current_scenario = ROLE_PLAY_SCENARIOS[1]
-                st.session_state.conversation_history = []
-                st.session_state.transcribed_text = ""
-                st.session_state.last_audio_bytes = None
-                st.session_state.turn_count = 0
-                st.session_state.scaffolding_shown = False
-                st.rerun()
-        with col2:
-            if st.button("Try Scenario 1 Again"):
-                st.session_state.current_state = "scenario1_chat"
-                st.session_state.conversation_history = []
-                st.session_state.turn_count = 0
-                st.session_state.scaffolding_shown = False
-                st.rerun()
-        with col3:
-            if st.button("Go to Activity 3 Menu"):
-                st.session_state.current_state = "activity3_intro"
-                st.rerun()
+    st.markdown("""
+    <div class="info-box">
+    <h3>Now for the real challenge!</h3>
     
-    elif st.session_state.current_state == "scenario2_chat":
-        scenario = ROLE_PLAY_SCENARIOS[1]
-        
-        st.markdown('<div class="activity-header">🎭 Scenario 2: Talking with your boss</div>', unsafe_allow_html=True)
-        
-        show_context_reminder(scenario['relationship'], scenario['power'])
-        
-        st.markdown(f"""
-        <div class="scenario-box">
-        <h3>{scenario['title']}</h3>
-        <p><strong>Your role:</strong> {scenario['role_student']}</p>
-        <p><strong>Situation:</strong> {scenario['situation']}</p>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # Show opening
-        if len(st.session_state.conversation_history) == 0:
-            st.session_state.conversation_history.append({
-                "role": "assistant",
-                "content": scenario['ai_opening']
-            })
-            log_interaction("assistant", scenario['ai_opening'])
-        
-        st.markdown("---")
-        st.markdown("### 💬 Chat")
-        display_conversation_history()
-        
-        # Show scaffolding at Turn 1
-        if st.session_state.turn_count == 1 and not st.session_state.scaffolding_shown:
-            show_scaffolding(scenario['power'])
-            st.session_state.scaffolding_shown = True
-            log_autonomy("scaffolding_turn1_scenario2")
-        
-        # Show AUTOMATIC scaffolding after 3 responses without target structure
-        if st.session_state.auto_scaffold_shown and st.session_state.responses_without_target >= 3:
-            st.markdown("""
-            <div class="scaffolding-box">
-            <h4>💡 Let me show you how others express disagreement professionally...</h4>
-            <p style="color: #666; font-size: 0.9rem;">I see you're disagreeing, but there are patterns that make it sound more professional.</p>
-            </div>
-            """, unsafe_allow_html=True)
-            show_scaffolding(scenario['power'])
-            st.session_state.responses_without_target = 0
-        
-        st.markdown("---")
-        st.markdown("### Your Turn:")
-        
-        # Simple chat input
-        user_input = st.chat_input("Type your response...", key=f"scenario2_{st.session_state.turn_count}")
-        
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            help_button = st.button("❓ Need Help?", key=f"help_s2_{st.session_state.turn_count}")
-        with col2:
-            end_button = st.button("✅ End Scenario", key=f"end_s2_{st.session_state.turn_count}")
-        with col3:
-            back_button = st.button("🔙 Try Another", key=f"back_s2_{st.session_state.turn_count}")
-        
-        if user_input:
-            # Check for target structure
-            has_target = check_for_target_structure(user_input)
-            if has_target:
-                st.session_state.responses_without_target = 0
-            else:
-                st.session_state.responses_without_target += 1
-            
-            log_interaction("user", f"Turn {st.session_state.turn_count + 1}: {user_input} [Target: {has_target}]")
-            
-            with st.spinner("💭 Responding..."):
-                ai_response = call_gpt(user_input, scenario['relationship'], "late shift schedule vs school")
-                log_interaction("assistant", ai_response)
-            
-            st.session_state.turn_count += 1
-            
-            # Trigger auto-scaffolding
-            if st.session_state.responses_without_target >= 3 and not st.session_state.auto_scaffold_shown:
-                st.session_state.auto_scaffold_shown = True
-                log_autonomy("auto_scaffolding_triggered_s2")
-            
-            st.rerun()
-        
-        if help_button:
-            log_autonomy("examples_request")
-            st.markdown("---")
-            st.markdown("### 📚 Example Patterns:")
-            show_corpus_examples(CORPUS_EXAMPLES["high_power"], "Formal disagreement patterns:")
-        
-        if end_button:
-            st.session_state.current_state = "scenario2_complete"
-            st.rerun()
-        
-        if back_button:
-            st.session_state.current_state = "activity3_intro"
-            st.session_state.conversation_history = []
-            st.session_state.turn_count = 0
-            st.session_state.scaffolding_shown = False
-            st.rerun()
+    <p>You'll practice TWO scenarios:</p>
+    <ol>
+        <li><strong>Scenario 1:</strong> Talking with a friend</li>
+        <li><strong>Scenario 2:</strong> Talking with your boss</li>
+    </ol>
     
-    elif st.session_state.current_state == "scenario2_complete":
-        st.markdown('<div class="activity-header">🎭 Scenario 2: Complete!</div>', unsafe_allow_html=True)
-        
-        st.markdown("""
-        <div class="success-box">
-        <h3>Professional conversation complete!</h3>
-        
-        <p>Would you like to complete the session or try another scenario?</p>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            if st.button("Complete Session"):
-                st.session_state.current_state = "reflection"
-                st.rerun()
-        with col2:
-            if st.button("Try Scenario 2 Again"):
-                st.session_state.current_state = "scenario2_chat"
-                st.session_state.conversation_history = []
-                st.session_state.turn_count = 0
-                st.session_state.scaffolding_shown = False
-                st.rerun()
-        with col3:
-            if st.button("Go to Activity 3 Menu"):
-                st.session_state.current_state = "activity3_intro"
-                st.rerun()
+    <p><strong>✨ You can record your voice or type!</strong></p>
     
-    elif st.session_state.current_state == "reflection":
-        st.markdown('<div class="activity-header">🎓 Session Complete!</div>', unsafe_allow_html=True)
-        
-        st.markdown("""
-        <div class="success-box">
-        <h3>Today you discovered:</h3>
-        
-        <ol>
-            <li>How people disagree politely in English using real corpus examples</li>
-            <li>Different styles for different relationships:
-                <ul>
-                    <li>Casual (friends/family): More direct and shorter</li>
-                    <li>Formal (boss/teacher): More elaborate and diplomatic</li>
-                </ul>
-            </li>
-            <li>Practice in both situations through natural conversation!</li>
-            <li>✨ Used voice recording to practice speaking naturally!</li>
-        </ol>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        st.markdown("**Before we finish, tell me:**")
-        st.markdown("What's ONE thing you learned today about disagreeing politely?")
-        
-        reflection = st.text_area("Type your reflection:", key="final_reflection", height=100)
-        
-        if st.button("Submit & Download My Session"):
-            if reflection:
-                log_interaction("user", f"REFLECTION: {reflection}")
-                
-                logs_json = save_logs()
-                
-                st.success("Thank you for participating!")
-                
-                st.download_button(
-                    label="📥 Download Your Session Log",
-                    data=logs_json,
-                    file_name=f"discussion_partner_log_{st.session_state.student_name}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-                    mime="application/json"
-                )
-                
-                st.balloons()
-                st.session_state.current_state = "complete"
+    <p>Try to disagree politely in each situation. Remember what you discovered!</p>
+    </div>
+    """, unsafe_allow_html=True)
     
-    elif st.session_state.current_state == "complete":
-        st.markdown('<div class="main-header">🎉 Thank You!</div>', unsafe_allow_html=True)
-        st.success("Your session is complete. Your responses have been saved.")
-        st.info("You can close this window now.")
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("Start Scenario 1 (Friend)"):
+            go_to("scenario1")
+    with col2:
+        if st.button("Start Scenario 2 (Boss)"):
+            go_to("scenario2")
+
+def process_scenario_chat():
+    """Activity 3: one role-play scenario (see lesson.SCENARIO_CHATS)"""
+    screen = SCENARIO_CHATS[st.session_state.current_state]
+    scenario = SCENARIOS_BY_ID[screen["scenario"]]
+    
+    st.markdown(f'<div class="activity-header">{screen["header"]}</div>', unsafe_allow_html=True)
+    
+    show_context_reminder(scenario['relationship'], scenario['power'])
+    
+    st.markdown(scenario_box_html(scenario['title'], (
+        ("Your role", scenario['role_student']),
+        ("Situation", scenario['situation'])
+    )), unsafe_allow_html=True)
+    
+    start_conversation(scenario['ai_opening'])
+    
+    chat_panel({
+        "power": scenario['power'],
+        "relationship": scenario['relationship'],
+        "topic": scenario['topic'],
+        "turn_key": "turn_count",
+        "input_key": screen["input_key"],
+        "key_suffix": screen["key_suffix"],
+        "placeholder": "Type your response...",
+        "spinner_text": "💭 Responding...",
+        "end_label": "✅ End Scenario",
+        "scaffolding_event": screen["scaffolding_event"],
+        "auto_scaffold_event": screen["auto_scaffold_event"],
+        "auto_scaffold_intro": screen["auto_scaffold_intro"],
+        "examples_title": screen["examples_title"]
+    })
+
+def process_reflection():
+    """End of the session: reflection and download"""
+    st.markdown('<div class="activity-header">🎓 Session Complete!</div>', unsafe_allow_html=True)
+    
+    st.markdown("""
+    <div class="success-box">
+    <h3>Today you discovered:</h3>
+    
+    <ol>
+        <li>How people disagree politely in English using real corpus examples</li>
+        <li>Different styles for different relationships:
+            <ul>
+                <li>Casual (friends/family): More direct and shorter</li>
+                <li>Formal (boss/teacher): More elaborate and diplomatic</li>
+            </ul>
+        </li>
+        <li>Practice in both situations through natural conversation!</li>
+        <li>✨ Used voice recording to practice speaking naturally!</li>
+    </ol>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    st.markdown("**Before we finish, tell me:**")
+    st.markdown("What's ONE thing you learned today about disagreeing politely?")
+    
+    reflection = st.text_area("Type your reflection:", key="final_reflection", height=100)
+    
+    export_format = st.radio(
+        "Download format:",
+        list(EXPORT_FORMATS),
+        index=list(EXPORT_FORMATS).index(DEFAULT_FORMAT),
+        format_func=lambda fmt: EXPORT_FORMATS[fmt].label,
+        horizontal=True
+    )
+    
+    if st.button("Submit & Download My Session"):
+        if reflection:
+            log_interaction("user", f"REFLECTION: {reflection}")
+            
+            st.success("Thank you for participating!")
+            
+            # The export is only built (streamed from the durable log) when the student clicks download.
+            # The callable runs outside the script, so it gets plain values rather than session state.
+            session_id, student_name = st.session_state.session_id, st.session_state.student_name
+            st.download_button(
+                label="📥 Download Your Session Log",
+                data=lambda: build_export(session_id, student_name, export_format),
+                file_name=export_file_name(student_name, export_format),
+                mime=EXPORT_FORMATS[export_format].mime,
+                on_click="ignore"
+            )
+            
+            st.balloons()
+            go_to("submit", rerun=False)
+
+def process_complete():
+    """Session finished"""
+    st.markdown('<div class="main-header">🎉 Thank You!</div>', unsafe_allow_html=True)
+    st.success("Your session is complete. Your responses have been saved.")
+    st.info("You can close this window now.")
+
+# The render function for each state; only the current screen's code runs on a rerun
+SCREENS = {
+    "welcome": process_welcome,
+    "activity1_intro": process_activity1_intro,
+    **{state: process_dialogue for state in DIALOGUE_SCREENS},
+    "activity1_summary": process_activity1_summary,
+    "activity2_intro": process_activity2_intro,
+    "debate_chat": process_debate_chat,
+    "activity3_intro": process_activity3_intro,
+    **{state: process_scenario_chat for state in SCENARIO_CHATS},
+    **{state: process_complete_screen for state in COMPLETE_SCREENS},
+    "reflection": process_reflection,
+    "complete": process_complete,
+}
 
 # ============================================================================
 # MAIN APP
@@ -1431,6 +1187,56 @@ def main():
         st.markdown(f"State: {st.session_state.current_state}")
         st.markdown(f"Turn Count: {st.session_state.turn_count}")
         st.markdown(f"API Turns Logged: {st.session_state.turn_number}")
+        usage = st.session_state.session_usage
+        if usage["calls"]:
+            st.markdown(f"Session Tokens: {usage['prompt_tokens']:,} in ({usage['cached_tokens']:,} cached), "
+                        f"{usage['completion_tokens']:,} out")
+            st.markdown(f"Session Cost: ${usage['cost_usd']:.4f} for {usage['calls']} API calls "
+                        f"({usage['wall_ms'] / 1000:.1f}s waiting on the API)")
+        if "cached_share" in st.session_state.last_turn_stats:
+            st.markdown(f"Prompt Cache Hit (last turn): {st.session_state.last_turn_stats['cached_share']:.0%}")
+        for model, health in get_router().stats().items():
+            if health["samples"]:
+                st.markdown(f"{model}: {health['ttft_ms'] or '-'} ms to first token, {health['error_rate']:.0%} errors"
+                            + (f" - avoided ({health['problem']})" if health["problem"] else ""))
+        for model, queue_stats in all_stats().items():
+            if queue_stats["queued"] or queue_stats["retries"]:
+                st.markdown(f"Queue ({model}): {queue_stats['waiting']} waiting, "
+                            f"{queue_stats['queued']} delayed, {queue_stats['retries']} retried")
+        for name, fields in sorted(get_table("profiles").snapshot().items()):
+            if "completion_tokens" in fields:
+                st.markdown(f"Replies ({name}): {fields['completion_tokens']['mean']:.0f} tokens avg "
+                            f"over {fields['completion_tokens']['count']}, "
+                            f"{fields['generation_ms']['mean'] / 1000:.1f}s avg, "
+                            f"{fields['hit_limit']['mean']:.0%} cut at the limit")
+        phases = get_tracer().phase_stats()
+        if phases:
+            with st.expander("⏱️ Turn Phases (all sessions)"):
+                rows = ["| Phase | Spans | p50 | p95 |", "|---|---|---|---|"]
+                for name in TRACE_PHASES:
+                    if name in phases:
+                        rows.append(f"| {name} | {phases[name]['count']} | {phases[name]['p50_ms']:,.0f} ms "
+                                    f"| {phases[name]['p95_ms']:,.0f} ms |")
+                st.markdown("\n".join(rows))
+        all_usage = get_table("usage").snapshot()
+        if all_usage:
+            def usage_total(fields: Dict, field: str) -> float:
+                return fields[field]["total"] if field in fields else 0
+            st.markdown("**All Sessions (this server):**")
+            for model, fields in sorted(all_usage.items()):
+                prompt = fields.get("prompt_tokens")
+                st.markdown(f"{model}: {fields['wall_ms']['count']} calls, ${usage_total(fields, 'cost_usd'):.4f}"
+                            + (f", {prompt['total']:,.0f} in / {usage_total(fields, 'completion_tokens'):,.0f} out "
+                               f"(prompt avg {prompt['mean']:,.0f}, max {prompt['max']:,.0f})" if prompt else ""))
+            st.markdown(f"Total Cost: ${sum(usage_total(fields, 'cost_usd') for fields in all_usage.values()):.4f}")
+        prewarm_stats = get_prewarmer().stats() if PREWARM_ENABLED else None
+        if prewarm_stats and prewarm_stats["started"]:
+            st.markdown(f"Warm-ups (all sessions): {prewarm_stats['started']} sent, "
+                        f"{prewarm_stats['skipped']} not needed, {prewarm_stats['failed']} failed")
+        if RESPONSE_CACHE_ENABLED:
+            cache_stats = get_response_cache().stats()
+            st.markdown(f"Reply Cache (all sessions): {cache_stats['hit_rate']:.0%} hits "
+                        f"({cache_stats['repeat_rate']:.0%} repeats), {cache_stats['saved_ms'] / 1000:.1f}s saved")
 
         # ── OpenAI Log Tracking ──────────────────────────────────────────────
         st.markdown("---")
@@ -1455,7 +1261,7 @@ def main():
             init_session_state()
             st.rerun()
     
-    if not st.session_state.api_key:
+    if not st.session_state.api_key and uses_api_key():
         st.error("⚠️ Instructor: Please configure the OpenAI API key in the sidebar.")
         return
     
@@ -1471,15 +1277,11 @@ def main():
                 st.warning("Please enter your name to continue.")
         return
     
-    # Route to appropriate screen
-    if st.session_state.current_state == "welcome":
-        process_welcome()
-    elif st.session_state.current_activity is None or st.session_state.current_activity == "activity1":
-        process_activity1()
-    elif st.session_state.current_activity == "activity2":
-        process_activity2()
-    elif st.session_state.current_activity == "activity3":
-        process_activity3()
+    # Route to the current screen
+    SCREENS[st.session_state.current_state]()
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        finish_rerun_trace()
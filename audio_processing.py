@@ -0,0 +1,237 @@
+"""
+Local audio preprocessing for the Discussion Partner app.
+
+Recordings from audio_recorder arrive as full-rate (often stereo) WAV with
+leading and trailing silence. Before uploading to Whisper we downmix to
+mono, resample to 16 kHz (what Whisper uses internally anyway), trim the
+silence and cap the duration. Clips with no speech never reach the API.
+Long clips are also cut into chunks at pauses, so they can be transcribed
+in parallel (see transcription.py).
+"""
+
+import io
+import wave
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+TARGET_SAMPLE_RATE = 16000
+FRAME_MS = 20                   # Energy is measured per frame of this length
+SILENCE_FLOOR_DBFS = -50.0      # Frames quieter than this are always silence
+SILENCE_BELOW_PEAK_DB = 35.0    # ...as are frames this far below the loudest frame
+PAD_MS = 200                    # Silence kept before/after speech so words aren't clipped
+MIN_SPEECH_MS = 300             # Less voiced audio than this counts as an empty clip
+MAX_CLIP_SECONDS = 120          # Longer recordings are cut to this length
+
+# Chunking: clips longer than CHUNK_MIN_CLIP_SECONDS are cut at pauses into chunks of at most
+# CHUNK_MAX_SECONDS (aiming for CHUNK_TARGET_SECONDS); with no pause in reach the cut is forced
+# and the chunks overlap by CHUNK_OVERLAP_MS, so a word split by the cut is whole in one of them.
+CHUNK_MIN_CLIP_SECONDS = 20.0
+CHUNK_TARGET_SECONDS = 10.0
+CHUNK_MAX_SECONDS = 15.0
+MIN_PAUSE_MS = 160              # Shorter gaps are between words, not phrases
+CHUNK_OVERLAP_MS = 600
+
+# ============================================================================
+# WAV I/O
+# ============================================================================
+
+def decode_wav(data: bytes) -> Tuple[np.ndarray, int]:
+    """PCM WAV bytes -> (float32 samples shaped [frames, channels] in [-1, 1], sample rate)"""
+    with wave.open(io.BytesIO(data), "rb") as wav:
+        channels = wav.getnchannels()
+        width = wav.getsampwidth()
+        rate = wav.getframerate()
+        raw = wav.readframes(wav.getnframes())
+
+    if width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif width == 2:
+        samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768
+    elif width == 3:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        ints = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+        ints = np.where(ints & 0x800000, ints - 0x1000000, ints)
+        samples = ints.astype(np.float32) / 8388608
+    elif width == 4:
+        samples = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648
+    else:
+        raise ValueError(f"unsupported sample width: {width} bytes")
+
+    usable = len(samples) - len(samples) % channels
+    return samples[:usable].reshape(-1, channels), rate
+
+
+def encode_wav(samples: np.ndarray, rate: int) -> bytes:
+    """Mono float samples -> 16-bit PCM WAV bytes"""
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+# ============================================================================
+# PROCESSING STAGES
+# ============================================================================
+
+def downmix(samples: np.ndarray) -> np.ndarray:
+    """[frames, channels] -> mono"""
+    return samples.mean(axis=1) if samples.shape[1] > 1 else samples[:, 0]
+
+
+def resample(samples: np.ndarray, rate: int, target: int = TARGET_SAMPLE_RATE) -> np.ndarray:
+    """Linear-interpolation resampling, with a moving-average low-pass when downsampling"""
+    if rate == target or len(samples) == 0:
+        return samples
+    ratio = rate / target
+    if ratio > 1:
+        width = int(np.ceil(ratio))
+        samples = np.convolve(samples, np.ones(width, dtype=np.float32) / width, mode="same")
+    positions = np.arange(0, len(samples), ratio, dtype=np.float64)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def frame_energy_db(samples: np.ndarray, rate: int) -> np.ndarray:
+    """RMS level of each FRAME_MS frame in dBFS"""
+    frame = max(1, rate * FRAME_MS // 1000)
+    count = len(samples) // frame
+    if count == 0:
+        return np.full(1, -120.0)
+    frames = samples[:count * frame].reshape(count, frame)
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-6))
+
+
+def voiced_frames(samples: np.ndarray, rate: int) -> np.ndarray:
+    """Boolean mask of frames loud enough to count as speech"""
+    energy = frame_energy_db(samples, rate)
+    threshold = max(SILENCE_FLOOR_DBFS, energy.max() - SILENCE_BELOW_PEAK_DB)
+    return energy >= threshold
+
+
+def trim_silence(samples: np.ndarray, rate: int) -> Tuple[np.ndarray, int]:
+    """Cut leading/trailing silence (keeping PAD_MS); returns (samples, voiced ms)"""
+    frame = max(1, rate * FRAME_MS // 1000)
+    voiced = voiced_frames(samples, rate)
+    voiced_ms = int(voiced.sum()) * FRAME_MS
+    if voiced_ms < MIN_SPEECH_MS:
+        return samples[:0], voiced_ms
+    idx = np.flatnonzero(voiced)
+    pad = rate * PAD_MS // 1000
+    start = max(0, idx[0] * frame - pad)
+    end = min(len(samples), (idx[-1] + 1) * frame + pad)
+    return samples[start:end], voiced_ms
+
+
+def pauses(samples: np.ndarray, rate: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(centre sample, length in frames) of every silent run of at least MIN_PAUSE_MS"""
+    frame = max(1, rate * FRAME_MS // 1000)
+    silent = np.concatenate(([0], (~voiced_frames(samples, rate)).astype(np.int8), [0]))
+    edges = np.flatnonzero(np.diff(silent))
+    starts, ends = edges[0::2], edges[1::2]
+    keep = (ends - starts) * FRAME_MS >= MIN_PAUSE_MS
+    starts, ends = starts[keep], ends[keep]
+    return (starts + ends) * frame // 2, ends - starts
+
+
+def chunk_bounds(samples: np.ndarray, rate: int) -> List[Tuple[int, int]]:
+    """Sample ranges to transcribe separately: cut in the longest pause near each CHUNK_TARGET_SECONDS"""
+    total = len(samples)
+    max_len = int(CHUNK_MAX_SECONDS * rate)
+    if total <= CHUNK_MIN_CLIP_SECONDS * rate:
+        return [(0, total)]
+    centres, lengths = pauses(samples, rate)
+    target, overlap = int(CHUNK_TARGET_SECONDS * rate), rate * CHUNK_OVERLAP_MS // 1000
+    bounds, start = [], 0
+    while total - start > max_len:
+        window = (centres > start + target // 2) & (centres <= start + max_len)
+        if window.any():
+            # Longest pause first (sentence ends beat breaths), then the one nearest the target length
+            candidates = np.flatnonzero(window)
+            best = min(candidates, key=lambda i: (-lengths[i], abs(centres[i] - start - target)))
+            cut = int(centres[best])
+            bounds.append((start, cut))
+            start = cut
+        else:
+            cut = start + max_len
+            bounds.append((start, cut))
+            start = cut - overlap
+    bounds.append((start, total))
+    return bounds
+
+# ============================================================================
+# PIPELINE
+# ============================================================================
+
+class AudioChunk(NamedTuple):
+    """One piece of a long clip"""
+    audio: bytes             # WAV
+    start_seconds: float     # Position in the processed clip
+    end_seconds: float
+    overlap_seconds: float   # Shared with the previous chunk (0 when cut at a pause)
+
+
+class PreparedClip(NamedTuple):
+    """Result of preprocessing one recording"""
+    audio: Optional[bytes]   # WAV to upload, or None if the clip has no speech
+    original_bytes: int
+    processed_bytes: int
+    original_seconds: float
+    processed_seconds: float
+    skip_reason: Optional[str] = None
+    chunks: Tuple[AudioChunk, ...] = ()   # Set for long clips only; short ones go up as `audio`
+
+    def stats(self) -> Dict:
+        """Numbers worth logging for this clip"""
+        return {
+            "original_bytes": self.original_bytes,
+            "processed_bytes": self.processed_bytes,
+            "bytes_saved": self.original_bytes - self.processed_bytes,
+            "original_seconds": round(self.original_seconds, 2),
+            "processed_seconds": round(self.processed_seconds, 2),
+            "skip_reason": self.skip_reason,
+            "chunks": len(self.chunks) or 1,
+        }
+
+
+def prepare_samples(data: bytes) -> Tuple[np.ndarray, float]:
+    """Decode, downmix and resample to 16 kHz; returns (samples, original seconds)"""
+    samples, rate = decode_wav(data)
+    original_seconds = len(samples) / rate if rate else 0.0
+    return resample(downmix(samples), rate), original_seconds
+
+
+def split_clip(samples: np.ndarray, rate: int = TARGET_SAMPLE_RATE) -> Tuple[AudioChunk, ...]:
+    """Chunks for a long clip, or () if it is short enough for one request"""
+    bounds = chunk_bounds(samples, rate)
+    if len(bounds) == 1:
+        return ()
+    return tuple(
+        AudioChunk(encode_wav(samples[start:end], rate), start / rate, end / rate,
+                   max(0, bounds[i - 1][1] - start) / rate if i else 0.0)
+        for i, (start, end) in enumerate(bounds)
+    )
+
+
+def prepare_clip(data: bytes) -> PreparedClip:
+    """Full preprocessing pipeline; non-WAV input is passed through untouched"""
+    try:
+        mono, original_seconds = prepare_samples(data)
+    except (wave.Error, EOFError, ValueError):
+        return PreparedClip(data, len(data), len(data), 0.0, 0.0)
+
+    trimmed, _ = trim_silence(mono, TARGET_SAMPLE_RATE)
+    if len(trimmed) == 0:
+        return PreparedClip(None, len(data), 0, original_seconds, 0.0, "no speech detected")
+
+    trimmed = trimmed[:MAX_CLIP_SECONDS * TARGET_SAMPLE_RATE]
+    audio = encode_wav(trimmed, TARGET_SAMPLE_RATE)
+    return PreparedClip(audio, len(data), len(audio), original_seconds,
+                        len(trimmed) / TARGET_SAMPLE_RATE, chunks=split_clip(trimmed))
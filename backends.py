@@ -0,0 +1,362 @@
+"""
+LLM and transcription backends for the Discussion Partner app.
+
+call_gpt and transcribe_audio talk to a Backend rather than to the OpenAI
+SDK directly. OpenAIBackend is the real thing; StubBackend emulates chat
+completions (including streaming and prompt caching) and transcriptions
+in-process with configurable latency and error rates, so the app can be
+load-tested deterministically with no network and no API spend.
+
+Select the stub with DP_BACKEND=stub (see StubConfig.from_env for knobs).
+"""
+
+import hashlib
+import io
+import os
+import random
+import threading
+import time
+import wave
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+# ============================================================================
+# COMMON TYPES
+# ============================================================================
+
+class Usage(NamedTuple):
+    """Token usage for one completion"""
+    prompt_tokens: int
+    completion_tokens: int
+    cached_tokens: int = 0
+
+
+class ChatResult(NamedTuple):
+    """A finished (non-streamed) completion"""
+    text: str
+    usage: Optional[Usage]
+    model: str
+
+
+class BackendError(Exception):
+    """A failed backend call, normalised across providers"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None,
+                 retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        """Rate limits, server errors and connection failures are worth retrying"""
+        return self.status_code is None or self.status_code == 429 or self.status_code >= 500
+
+
+class ChatStream:
+    """Iterator over text deltas; usage is filled in once the stream is exhausted"""
+
+    def __init__(self, deltas: Iterator[str], model: str):
+        self._deltas = deltas
+        self.model = model
+        self.usage: Optional[Usage] = None
+
+    def __iter__(self) -> Iterator[str]:
+        return self._deltas
+
+
+class Backend(ABC):
+    """Interface shared by every backend (a subclass missing a method can't be instantiated)"""
+
+    name = "base"
+    client_key = ""             # Which pooled client requests go out on (see clients.get_client)
+
+    @abstractmethod
+    def chat(self, messages: List[Dict], model: str, temperature: float, max_tokens: int,
+             stop: Optional[List[str]] = None, metadata: Optional[Dict[str, str]] = None) -> ChatResult:
+        """A finished completion"""
+
+    @abstractmethod
+    def chat_stream(self, messages: List[Dict], model: str, temperature: float, max_tokens: int,
+                    stop: Optional[List[str]] = None, metadata: Optional[Dict[str, str]] = None) -> ChatStream:
+        """A completion streamed as text deltas (errors before the first one are raised here)"""
+
+    @abstractmethod
+    def transcribe(self, audio: bytes, model: str, filename: str = "recording.wav") -> str:
+        """The transcript of one audio file"""
+
+# ============================================================================
+# OPENAI
+# ============================================================================
+
+def _usage_from_openai(usage) -> Optional[Usage]:
+    """Convert an OpenAI usage block (cached tokens live in prompt_tokens_details)"""
+    if usage is None:
+        return None
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = (getattr(details, "cached_tokens", 0) or 0) if details else 0
+    return Usage(usage.prompt_tokens, usage.completion_tokens, cached)
+
+
+def _sdk():
+    """The OpenAI SDK, imported on first use: it takes longer to import than the rest of
+    the app put together, and the stub never needs it"""
+    import openai
+    return openai
+
+
+def _backend_error(exc: Exception) -> BackendError:
+    """Map an OpenAI SDK exception onto BackendError"""
+    if isinstance(exc, _sdk().APIStatusError):
+        retry_after = exc.response.headers.get("retry-after") if exc.response is not None else None
+        try:
+            retry_after = float(retry_after) if retry_after else None
+        except ValueError:
+            retry_after = None
+        return BackendError(str(exc), exc.status_code, retry_after)
+    return BackendError(str(exc))
+
+
+class OpenAIBackend(Backend):
+    """The real OpenAI API, through the shared pooled client"""
+
+    name = "openai"
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None):
+        from clients import get_client
+        self.client = get_client(api_key, base_url)
+        # Same pooling key as get_client, hashed so the key itself isn't kept around in other tables
+        self.client_key = hashlib.blake2b(f"{api_key}\x00{base_url or ''}".encode(), digest_size=16).hexdigest()
+
+    def _request(self, messages, model, temperature, max_tokens, stop, metadata) -> Dict:
+        kwargs = {"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens}
+        if stop:
+            kwargs["stop"] = stop
+        if metadata is not None:
+            # store=True makes the full conversation appear in platform.openai.com → Logs
+            kwargs["store"] = True
+            kwargs["metadata"] = metadata
+        return kwargs
+
+    def chat(self, messages, model, temperature, max_tokens, stop=None, metadata=None) -> ChatResult:
+        try:
+            response = self.client.chat.completions.create(
+                **self._request(messages, model, temperature, max_tokens, stop, metadata)
+            )
+        except _sdk().OpenAIError as e:
+            raise _backend_error(e) from e
+        return ChatResult(response.choices[0].message.content or "", _usage_from_openai(response.usage), response.model)
+
+    def chat_stream(self, messages, model, temperature, max_tokens, stop=None, metadata=None) -> ChatStream:
+        try:
+            response = self.client.chat.completions.create(
+                stream=True,
+                stream_options={"include_usage": True},   # Final chunk carries token usage
+                **self._request(messages, model, temperature, max_tokens, stop, metadata)
+            )
+        except _sdk().OpenAIError as e:
+            raise _backend_error(e) from e
+
+        def deltas() -> Iterator[str]:
+            try:
+                for chunk in response:
+                    if getattr(chunk, "usage", None):
+                        stream.usage = _usage_from_openai(chunk.usage)
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            except _sdk().OpenAIError as e:
+                raise _backend_error(e) from e
+
+        stream = ChatStream(deltas(), model)
+        return stream
+
+    def transcribe(self, audio: bytes, model: str, filename: str = "recording.wav") -> str:
+        audio_file = io.BytesIO(audio)
+        audio_file.name = filename
+        try:
+            return self.client.audio.transcriptions.create(model=model, file=audio_file).text
+        except _sdk().OpenAIError as e:
+            raise _backend_error(e) from e
+
+# ============================================================================
+# LOCAL STUB
+# ============================================================================
+
+class StubConfig(NamedTuple):
+    """Latency/error model for StubBackend - latencies are lognormal around the median"""
+    ttft_ms: float = 600.0              # Median time to first token
+    ttft_sigma: float = 0.35            # Lognormal spread of TTFT
+    token_ms: float = 25.0              # Mean gap between streamed tokens
+    prefix_miss_ms: float = 0.0         # Extra TTFT when the prompt prefix isn't cached yet
+    transcribe_ms_per_second: float = 80.0
+    transcribe_base_ms: float = 300.0
+    error_rate: float = 0.0             # Probability a call fails
+    error_statuses: Tuple[int, ...] = (429, 500, 503)
+    seed: Optional[int] = None
+
+    @classmethod
+    def from_env(cls) -> "StubConfig":
+        """Build a config from DP_STUB_* environment variables"""
+        env = os.environ
+        default = cls()
+        seed = env.get("DP_STUB_SEED")
+        statuses = env.get("DP_STUB_ERROR_STATUSES")   # e.g. "429,503"
+        return cls(
+            ttft_ms=float(env.get("DP_STUB_TTFT_MS", default.ttft_ms)),
+            ttft_sigma=float(env.get("DP_STUB_TTFT_SIGMA", default.ttft_sigma)),
+            token_ms=float(env.get("DP_STUB_TOKEN_MS", default.token_ms)),
+            prefix_miss_ms=float(env.get("DP_STUB_PREFIX_MISS_MS", default.prefix_miss_ms)),
+            transcribe_ms_per_second=float(env.get("DP_STUB_TRANSCRIBE_MS_PER_S", default.transcribe_ms_per_second)),
+            transcribe_base_ms=float(env.get("DP_STUB_TRANSCRIBE_BASE_MS", default.transcribe_base_ms)),
+            error_rate=float(env.get("DP_STUB_ERROR_RATE", default.error_rate)),
+            error_statuses=tuple(int(s) for s in statuses.split(",")) if statuses else default.error_statuses,
+            seed=int(seed) if seed else None,
+        )
+
+
+# Canned replies that use the target structures, so the app behaves plausibly
+_STUB_REPLIES = {
+    "friend": [
+        "Yeah but honestly, I think it's not that bad? Like, it helps me relax, you know?",
+        "I get that, but maybe you're overthinking it a bit. What would you do instead?",
+        "True, but I probably couldn't stay in touch with my cousins otherwise, haha.",
+    ],
+    "boss": [
+        "I understand your concern. However, we really need coverage this week. Perhaps we can find a compromise?",
+        "I appreciate you telling me that, but I think the team depends on it. What would work for you?",
+        "I see your point, though I feel we need to consider the whole team. Maybe we could adjust the schedule?",
+    ],
+}
+
+_STUB_TRANSCRIPTS = [
+    "Yeah but I think it's bad for your sleep.",
+    "I understand, but I have school in the morning.",
+    "I don't agree, it's too much.",
+]
+
+
+class StubBackend(Backend):
+    """In-process stand-in for OpenAI with a configurable latency and error model"""
+
+    name = "stub"
+
+    def __init__(self, config: Optional[StubConfig] = None):
+        self.config = config or StubConfig()
+        self._rng = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._seen_prefixes = set()
+        self.calls = 0
+
+    def _random(self) -> float:
+        with self._lock:
+            return self._rng.random()
+
+    def _lognormal(self, median_ms: float, sigma: float) -> float:
+        with self._lock:
+            return self._rng.lognormvariate(0.0, sigma) * median_ms / 1000
+
+    def _maybe_fail(self):
+        """Raise a BackendError with probability config.error_rate"""
+        with self._lock:
+            self.calls += 1
+            fail = self._rng.random() < self.config.error_rate
+            status = self._rng.choice(self.config.error_statuses) if fail else None
+        if fail:
+            time.sleep(self._lognormal(self.config.ttft_ms / 4, self.config.ttft_sigma))
+            raise BackendError(f"stub error {status}", status, retry_after=1.0 if status == 429 else None)
+
+    def _reply(self, messages: List[Dict], max_tokens: int, stop: Optional[List[str]]) -> str:
+        """Deterministic canned reply: boss voice if the prompt says so, picked by the last message"""
+        system = " ".join(m["content"] for m in messages if m["role"] == "system")
+        pool = _STUB_REPLIES["boss" if "You are their BOSS" in system else "friend"]
+        last = messages[-1]["content"] if messages else ""
+        text = pool[int(hashlib.md5(last.encode()).hexdigest(), 16) % len(pool)]
+        for marker in stop or []:
+            if marker in text:
+                text = text[:text.index(marker)]
+        return " ".join(text.split(" ")[:max_tokens])
+
+    @staticmethod
+    def _prefix(messages: List[Dict]) -> Tuple[List[str], str]:
+        """The leading system messages (the part providers cache) and a key for them"""
+        prefix = [m["content"] for m in messages[:2] if m["role"] == "system"]
+        return prefix, hashlib.md5("\x00".join(prefix).encode()).hexdigest()
+
+    def _ttft(self, messages: List[Dict]) -> float:
+        """Seconds to the first token, slower while the prefix is uncached"""
+        _, key = self._prefix(messages)
+        with self._lock:
+            miss_ms = 0.0 if key in self._seen_prefixes else self.config.prefix_miss_ms
+        return self._lognormal(self.config.ttft_ms, self.config.ttft_sigma) + miss_ms / 1000
+
+    def _usage(self, messages: List[Dict], text: str) -> Usage:
+        """Estimated usage, emulating provider prefix caching on the leading system messages"""
+        from context_builder import estimate_tokens
+
+        prompt = sum(estimate_tokens(m["content"]) + 4 for m in messages)
+        prefix, key = self._prefix(messages)
+        with self._lock:
+            cached = key in self._seen_prefixes
+            self._seen_prefixes.add(key)
+        cached_tokens = sum(estimate_tokens(p) + 4 for p in prefix) if cached else 0
+        return Usage(prompt, estimate_tokens(text), cached_tokens)
+
+    def chat(self, messages, model, temperature, max_tokens, stop=None, metadata=None) -> ChatResult:
+        self._maybe_fail()
+        text = self._reply(messages, max_tokens, stop)
+        tokens = len(text.split(" "))
+        time.sleep(self._ttft(messages) + tokens * self.config.token_ms / 1000)
+        return ChatResult(text, self._usage(messages, text), model)
+
+    def chat_stream(self, messages, model, temperature, max_tokens, stop=None, metadata=None) -> ChatStream:
+        self._maybe_fail()
+        text = self._reply(messages, max_tokens, stop)
+
+        def deltas() -> Iterator[str]:
+            time.sleep(self._ttft(messages))
+            words = text.split(" ")
+            for i, word in enumerate(words):
+                if i:
+                    time.sleep(self._lognormal(self.config.token_ms, self.config.ttft_sigma))
+                yield word if i == 0 else " " + word
+            stream.usage = self._usage(messages, text)
+
+        stream = ChatStream(deltas(), model)
+        return stream
+
+    def transcribe(self, audio: bytes, model: str, filename: str = "recording.wav") -> str:
+        self._maybe_fail()
+        try:
+            with wave.open(io.BytesIO(audio), "rb") as wav:
+                seconds = wav.getnframes() / wav.getframerate()
+        except (wave.Error, EOFError):
+            seconds = len(audio) / 32000
+        time.sleep((self.config.transcribe_base_ms + seconds * self.config.transcribe_ms_per_second) / 1000)
+        digest = int(hashlib.md5(audio).hexdigest(), 16)
+        return _STUB_TRANSCRIPTS[digest % len(_STUB_TRANSCRIPTS)]
+
+# ============================================================================
+# SELECTION
+# ============================================================================
+
+BACKEND = os.environ.get("DP_BACKEND", "openai")   # "openai" or "stub"
+
+_stub: Optional[StubBackend] = None
+_stub_lock = threading.Lock()
+
+
+def uses_api_key() -> bool:
+    """Whether the configured backend needs an OpenAI API key"""
+    return BACKEND != "stub"
+
+
+def get_backend(api_key: Optional[str] = None) -> Backend:
+    """The configured backend; the stub is a process-wide singleton so its state is shared"""
+    global _stub
+    if BACKEND == "stub":
+        if _stub is None:
+            with _stub_lock:
+                if _stub is None:
+                    _stub = StubBackend(StubConfig.from_env())
+        return _stub
+    return OpenAIBackend(api_key)
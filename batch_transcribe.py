@@ -0,0 +1,243 @@
+"""
+Batch transcription of offline recordings, for instructors.
+
+Takes a folder (searched recursively) or a .zip of audio files, transcribes
+them concurrently and checks every transcript for the target structure,
+writing one row per recording to a JSONL or CSV file (by extension):
+
+  file, status (ok / no_speech / error), transcript, has_target,
+  target_pattern, hedges, mitigation_score, seconds, transcribe_ms,
+  cost_usd, error
+
+Clips get the same preprocessing as in the app (audio_processing) and long
+ones are split into parallel chunks (transcription.py). Every call goes
+through the shared rate-limit scheduler for the transcription model, so a
+bounded pool of workers never runs past the provider's RPM and backs off
+on 429s. Rows are appended as each file finishes: rerunning the same
+command after a crash or a Ctrl-C skips what is already done and retries
+only the failures.
+
+Usage:
+    python batch_transcribe.py recordings/ --out transcripts.jsonl
+    python batch_transcribe.py recordings.zip --out transcripts.csv --workers 8
+    DP_BACKEND=stub python batch_transcribe.py recordings/ --out /tmp/t.jsonl   # dry run, no API calls
+"""
+
+import argparse
+import csv
+import json
+import os
+import pathlib
+import sys
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Tuple
+
+from audio_processing import prepare_clip
+from backends import Backend, get_backend, uses_api_key
+from costs import transcription_cost
+from target_structures import analyze_turn
+from transcription import TRANSCRIBE_MODEL, transcribe_clip
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".m4a", ".mp4", ".mpeg", ".mpga", ".ogg", ".webm", ".flac")
+DEFAULT_WORKERS = 4             # In flight at once; the scheduler still enforces the model's RPM
+BATCH_SESSION = "batch"         # Scheduler queue for this run
+
+FIELDS = ["file", "status", "transcript", "has_target", "target_pattern", "hedges", "mitigation_score",
+          "seconds", "transcribe_ms", "cost_usd", "error"]
+DONE_STATUSES = ("ok", "no_speech")   # Rows with these are skipped on a rerun
+
+# ============================================================================
+# INPUT
+# ============================================================================
+
+def _is_audio(name: str) -> bool:
+    """Audio by extension, leaving out hidden files (e.g. macOS "._" resource forks in zips)"""
+    return name.lower().endswith(AUDIO_EXTENSIONS) and not os.path.basename(name).startswith(".")
+
+
+def find_recordings(source: str) -> List[Tuple[str, Callable[[], bytes]]]:
+    """(name, reader) for every audio file in a folder or zip, sorted by name"""
+    if zipfile.is_zipfile(source):
+        archive = zipfile.ZipFile(source)   # Reads from worker threads are serialised by zipfile itself
+        return [(info.filename, lambda name=info.filename: archive.read(name))
+                for info in sorted(archive.infolist(), key=lambda info: info.filename)
+                if not info.is_dir() and _is_audio(info.filename)]
+    root = pathlib.Path(source)
+    return [(path.relative_to(root).as_posix(), path.read_bytes)
+            for path in sorted(root.rglob("*")) if path.is_file() and _is_audio(path.name)]
+
+# ============================================================================
+# OUTPUT
+# ============================================================================
+
+class ResultWriter:
+    """Appends result rows to a JSONL or CSV file, flushing each one so a crash loses nothing"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.is_csv = path.lower().endswith(".csv")
+        self._lock = threading.Lock()
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8", newline="")
+        self._csv = csv.DictWriter(self._file, FIELDS) if self.is_csv else None
+        if self._csv and new:
+            self._csv.writeheader()
+
+    def write(self, row: Dict):
+        with self._lock:
+            if self._csv:
+                hedges = row.get("hedges")
+                self._csv.writerow({**row, "hedges": " | ".join(hedges) if isinstance(hedges, list) else hedges})
+            else:
+                self._file.write(json.dumps(row, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def read_results(path: str) -> List[Dict]:
+    """Rows already in an output file (none if it doesn't exist yet)"""
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            return list(csv.DictReader(f))
+        rows = []
+        for line in f:
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                continue   # A line cut short by a crash
+        return rows
+
+
+def compact_results(path: str):
+    """Keep only the last row per file (a retried failure leaves its error row behind)"""
+    rows = read_results(path)
+    latest = {row["file"]: row for row in rows}
+    if len(latest) == len(rows):
+        return
+    tmp = path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    writer = ResultWriter(tmp)
+    for row in latest.values():
+        writer.write(row)
+    writer.close()
+    os.replace(tmp, path)
+
+# ============================================================================
+# TRANSCRIPTION
+# ============================================================================
+
+def transcribe_one(backend: Backend, name: str, read: Callable[[], bytes]) -> Dict:
+    """Preprocess, transcribe and analyse one recording; failures become an error row"""
+    row: Dict = {field: None for field in FIELDS}
+    row["file"] = name
+    try:
+        clip = prepare_clip(read())
+        # Only WAV is decoded locally; other formats go up as they are, length unknown
+        row["seconds"] = round(clip.processed_seconds, 2) if clip.original_seconds else None
+        if clip.audio is None:
+            row["status"] = "no_speech"
+            row["transcript"] = ""
+            return row
+        start = time.perf_counter()
+        transcript = transcribe_clip(backend, clip, BATCH_SESSION, os.path.basename(name))
+        row["transcribe_ms"] = round((time.perf_counter() - start) * 1000)
+    except Exception as e:   # Recorded against this file; the rest of the batch carries on
+        row["status"] = "error"
+        row["error"] = str(e)
+        return row
+
+    analysis = analyze_turn(transcript)
+    cost = transcription_cost(TRANSCRIBE_MODEL, clip.processed_seconds) if row["seconds"] is not None else None
+    row.update(
+        status="ok",
+        transcript=transcript,
+        has_target=analysis.has_target,
+        target_pattern=analysis.match.pattern if analysis.match else None,
+        hedges=analysis.hedges,
+        mitigation_score=analysis.mitigation_score,
+        cost_usd=round(cost, 6) if cost is not None else None
+    )
+    return row
+
+
+def run(source: str, out: str, workers: int = DEFAULT_WORKERS, api_key: Optional[str] = None,
+        progress: Callable[[str], None] = print) -> Dict:
+    """Transcribe everything in source not already done in out; returns run totals"""
+    recordings = find_recordings(source)
+    done = {row["file"] for row in read_results(out) if row.get("status") in DONE_STATUSES}
+    todo = [(name, read) for name, read in recordings if name not in done]
+    progress(f"{len(recordings)} recordings, {len(recordings) - len(todo)} already done, {len(todo)} to go "
+             f"({workers} workers)")
+
+    totals = {"files": len(recordings), "skipped": len(recordings) - len(todo), "ok": 0, "no_speech": 0, "error": 0,
+              "with_target": 0, "audio_seconds": 0.0, "cost_usd": 0.0}
+    backend = get_backend(api_key)
+    writer = ResultWriter(out)
+    start = time.perf_counter()
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="transcribe")
+    try:
+        futures = [pool.submit(transcribe_one, backend, name, read) for name, read in todo]
+        for finished, future in enumerate(as_completed(futures), 1):
+            row = future.result()
+            writer.write(row)
+            totals[row["status"]] += 1
+            totals["with_target"] += bool(row["has_target"])
+            totals["audio_seconds"] += row["seconds"] or 0.0
+            totals["cost_usd"] += row["cost_usd"] or 0.0
+            elapsed = time.perf_counter() - start
+            rate = finished / elapsed if elapsed else 0.0
+            eta = (len(todo) - finished) / rate if rate else 0.0
+            progress(f"[{finished}/{len(todo)}] {row['status']:<9} {row['file']}"
+                     + (f"  ({row['error']})" if row["error"] else "")
+                     + f"   {rate * 60:.1f} files/min, {totals['audio_seconds'] / elapsed * 60 if elapsed else 0:.0f}"
+                       f" audio s/min, ETA {eta:.0f}s")
+    finally:
+        # On Ctrl-C, drop what hasn't started; calls already in flight finish but aren't recorded
+        pool.shutdown(wait=True, cancel_futures=True)
+        writer.close()
+    compact_results(out)
+    totals["seconds"] = round(time.perf_counter() - start, 2)
+    totals["cost_usd"] = round(totals["cost_usd"], 4)
+    totals["audio_seconds"] = round(totals["audio_seconds"], 1)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="folder (searched recursively) or .zip of recordings")
+    parser.add_argument("--out", required=True, help="results file: .jsonl or .csv (appended to, so reruns resume)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="concurrent transcriptions")
+    args = parser.parse_args()
+
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if uses_api_key() and not api_key:
+        sys.exit("Set OPENAI_API_KEY (or DP_BACKEND=stub for a dry run).")
+    if not os.path.exists(args.source):
+        sys.exit(f"No such folder or zip: {args.source}")
+
+    try:
+        totals = run(args.source, args.out, args.workers, api_key)
+    except KeyboardInterrupt:
+        sys.exit(f"\nInterrupted - finished rows are in {args.out}; run the same command again to resume.")
+    print(f"{totals['ok']} transcribed ({totals['with_target']} with the target structure), "
+          f"{totals['no_speech']} without speech, {totals['error']} failed, {totals['skipped']} skipped as done - "
+          f"{totals['audio_seconds']:.0f}s of audio in {totals['seconds']:.1f}s, ${totals['cost_usd']:.4f}")
+    if totals["error"]:
+        print(f"Run the same command again to retry the {totals['error']} failed files.")
+
+
+if __name__ == "__main__":
+    main()
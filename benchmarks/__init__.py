@@ -0,0 +1 @@
+"""Benchmarks for the Discussion Partner app - run from the repo root with python -m benchmarks.<name>"""
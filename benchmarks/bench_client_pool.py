@@ -0,0 +1,86 @@
+"""
+Per-turn latency: a fresh OpenAI client per call vs. the shared pooled client.
+
+Usage (from the repo root):
+    OPENAI_API_KEY=sk-... python -m benchmarks.bench_client_pool --turns 20
+    python -m benchmarks.bench_client_pool --base-url http://localhost:8000/v1 --api-key test
+"""
+
+import argparse
+import os
+import statistics
+import time
+from typing import Callable, List
+
+from openai import OpenAI
+
+from clients import close_clients, get_client
+
+
+def _turn(client: OpenAI, model: str):
+    """One minimal chat turn - the smallest request that exercises the full round trip"""
+    client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": "Say ok."}],
+        max_tokens=1,
+    )
+
+
+def _measure(label: str, turns: int, make_client: Callable[[], OpenAI], model: str,
+             close: bool = False) -> List[float]:
+    """Run `turns` sequential turns and return per-turn latencies in ms; close=True closes each client after its turn"""
+    latencies = []
+    for _ in range(turns):
+        start = time.perf_counter()
+        client = make_client()
+        _turn(client, model)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if close:
+            # Outside the timing: a fresh client left open would leak its sockets into the next turns
+            client.close()
+    _report(label, latencies)
+    return latencies
+
+
+def _report(label: str, latencies: List[float]):
+    """Print a one-line latency summary"""
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"{label:<22} mean {statistics.mean(ordered):8.1f} ms   "
+          f"p50 {statistics.median(ordered):8.1f} ms   p95 {p95:8.1f} ms   "
+          f"first {latencies[0]:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--model", default="gpt-4")
+    parser.add_argument("--api-key", default=os.environ.get("OPENAI_API_KEY"))
+    parser.add_argument("--base-url", default=None)
+    args = parser.parse_args()
+
+    if not args.api_key:
+        parser.error("an API key is required (--api-key or OPENAI_API_KEY)")
+
+    print(f"{args.turns} turns against {args.base_url or 'api.openai.com'} ({args.model})")
+
+    # Before: what call_gpt used to do on every turn
+    before = _measure(
+        "fresh client per turn", args.turns,
+        lambda: OpenAI(api_key=args.api_key, base_url=args.base_url), args.model, close=True,
+    )
+
+    # After: the shared registry (warm the pool with one untimed turn first)
+    _turn(get_client(args.api_key, args.base_url), args.model)
+    after = _measure(
+        "shared pooled client", args.turns,
+        lambda: get_client(args.api_key, args.base_url), args.model,
+    )
+    close_clients()
+
+    saved = statistics.mean(before) - statistics.mean(after)
+    print(f"saved per turn: {saved:.1f} ms ({saved / statistics.mean(before):.0%})")
+
+
+if __name__ == "__main__":
+    main()
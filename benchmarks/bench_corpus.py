@@ -0,0 +1,76 @@
+"""
+Corpus retrieval: load + index time and per-query latency on a synthetic corpus.
+
+Writes a JSONL corpus of --entries turns (spread over both power levels and
+the three relationships), loads it the way the app does, then times
+CorpusStore.search for synthetic student messages.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_corpus --entries 20000 --queries 2000
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from corpus import CorpusStore
+
+HEADS = {
+    "low": ["Yeah but", "yeah I agree but", "True, but", "I know but", "Well I agree but maybe", "I get that but"],
+    "high": ["I can see your point, but", "I understand, however,", "I appreciate that, but perhaps",
+             "I agree with this point but don't you think", "I see what you mean, though maybe"],
+}
+RELATIONSHIPS = {"low": ["friends", "classmates"], "high": ["boss-employee"]}
+BODIES = [
+    "social media is bad for sleep", "homework takes too much time", "we should wear what we want",
+    "working from home is more productive", "phones are fine if you take breaks", "late shifts clash with school",
+    "people will have to retire later", "the trains are too loud", "we can develop more jobs",
+    "it depends on the person", "the company image matters", "students learn more in class",
+]
+
+
+def write_corpus(path: str, n: int, seed: int = 11):
+    """n synthetic disagreement turns as JSONL"""
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as file:
+        for i in range(n):
+            power = rng.choice(("low", "high"))
+            text = f"{rng.choice(HEADS[power])} {rng.choice(BODIES)}, and {rng.choice(BODIES)} ({i})"
+            file.write(json.dumps({"text": text, "power": power, "relationship": rng.choice(RELATIONSHIPS[power]),
+                                   "source": "synthetic"}) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=20_000)
+    parser.add_argument("--queries", type=int, default=2_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "corpus.jsonl")
+        write_corpus(path, args.entries)
+        start = time.perf_counter()
+        store = CorpusStore.load(path)
+        load_ms = (time.perf_counter() - start) * 1000
+    print(f"load + index          {load_ms:9.1f} ms   {store.stats()['entries']:,} entries   "
+          f"partitions {store.stats()['partitions']}")
+
+    rng = random.Random(3)
+    queries = [(f"{rng.choice(['Yeah but', 'No,', 'I think', 'Honestly'])} {rng.choice(BODIES)}",
+                rng.choice(("low", "high"))) for _ in range(args.queries)]
+    times = []
+    for query, power in queries:
+        start = time.perf_counter()
+        store.search(query, power, rng.choice(RELATIONSHIPS[power]))
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    print(f"search (k=4)          median {statistics.median(times):6.3f} ms   "
+          f"p95 {times[int(0.95 * (len(times) - 1))]:6.3f} ms   max {times[-1]:6.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Cold start and per-rerun script time of app.py.
+
+time to first paint   a fresh Python process (Streamlit already imported, as
+                      in a running server) executes app.py for the first
+                      time and renders the name prompt - this includes
+                      importing everything app.py pulls in
+rerun                 further full reruns of the same session, on the name
+                      prompt and on an open debate chat
+
+Both time the script itself (Streamlit's exec of app.py), not the AppTest
+harness around it, which adds ~100 ms of polling per run. Each cold start
+runs in its own interpreter so module imports aren't shared.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --cold 10 --reruns 200
+"""
+
+import argparse
+import json
+import logging
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+APP_PATH = str(pathlib.Path(__file__).resolve().parent.parent / "app.py")
+
+# Run in a child interpreter: import Streamlit first (untimed), then time the first script run
+COLD_START = """
+import json, logging, sys
+logging.disable(logging.WARNING)
+sys.path.insert(0, sys.argv[2])
+from benchmarks.bench_startup import time_scripts
+from streamlit.testing.v1 import AppTest
+times = time_scripts()
+at = AppTest.from_file(sys.argv[1], default_timeout=60)
+at.run()
+assert not at.exception, at.exception
+print(json.dumps({"first_paint_s": times[0], "modules": len(sys.modules)}))
+"""
+
+
+def time_scripts() -> List[float]:
+    """Collect the duration of every script run from now on (seconds)"""
+    from streamlit.runtime.scriptrunner import script_runner
+
+    times = []
+    run_script = script_runner.exec_func_with_error_handling
+
+    def timed(func, ctx):
+        start = time.perf_counter()
+        try:
+            return run_script(func, ctx)
+        finally:
+            times.append(time.perf_counter() - start)
+
+    script_runner.exec_func_with_error_handling = timed
+    return times
+
+
+def cold_starts(runs: int) -> List[dict]:
+    """First-run timings from fresh interpreters"""
+    results = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", COLD_START, APP_PATH, str(pathlib.Path(APP_PATH).parent)],
+                             capture_output=True, text=True, check=True)
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return results
+
+
+def time_reruns(at, times: List[float], runs: int) -> List[float]:
+    """Script seconds per full rerun of the page the session is on"""
+    first = len(times)
+    for _ in range(runs):
+        at.run()
+        assert not at.exception, at.exception
+    return times[first:]
+
+
+def _click(at, label: str):
+    next(b for b in at.button if b.label.startswith(label)).click()
+    at.run()
+    assert not at.exception, at.exception
+
+
+def rerun_timings(runs: int) -> dict:
+    """Median/p95 ms per rerun on the name prompt and in a debate chat"""
+    logging.disable(logging.WARNING)
+    os.environ.setdefault("DP_BACKEND", "stub")
+    # Keep the benchmark session's logs and traces out of the real directories
+    os.environ.setdefault("DP_LOG_DIR", tempfile.mkdtemp(prefix="dp_bench_logs_"))
+    os.environ.setdefault("DP_TRACE_DIR", tempfile.mkdtemp(prefix="dp_bench_traces_"))
+    from streamlit.testing.v1 import AppTest
+
+    times = time_scripts()
+    at = AppTest.from_file(APP_PATH, default_timeout=60)
+    at.run()
+    results = {"name_prompt": time_reruns(at, times, runs)}
+
+    next(t for t in at.text_input if t.label == "Your Name:").input("Ana")
+    _click(at, "Start Session")
+    for label in ("Start Activity 1", "Show First", "Continue to Second", "See What",
+                  "Ready for Activity 2", "📱 Social"):
+        _click(at, label)
+    at.chat_input[0].set_value("Yeah but it's bad for sleep").run()
+    results["debate_chat"] = time_reruns(at, times, runs)
+
+    return {
+        page: {"median_ms": round(statistics.median(times) * 1000, 2),
+               "p95_ms": round(sorted(times)[int(0.95 * (len(times) - 1))] * 1000, 2)}
+        for page, times in results.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cold", type=int, default=5, help="fresh-interpreter cold starts")
+    parser.add_argument("--reruns", type=int, default=100, help="timed reruns per page")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    cold = cold_starts(args.cold)
+    paint = [c["first_paint_s"] * 1000 for c in cold]
+    summary = {
+        "first_paint_ms": {"median": round(statistics.median(paint), 1), "min": round(min(paint), 1)},
+        "modules_loaded": cold[0]["modules"],
+        "rerun": rerun_timings(args.reruns),
+    }
+
+    print(f"time to first paint   median {summary['first_paint_ms']['median']:8.1f} ms   "
+          f"min {summary['first_paint_ms']['min']:8.1f} ms   ({summary['modules_loaded']} modules loaded)")
+    for page, stats in summary["rerun"].items():
+        print(f"rerun ({page:<11}) median {stats['median_ms']:8.2f} ms   p95 {stats['p95_ms']:8.2f} ms")
+
+    if args.json:
+        pathlib.Path(args.json).write_text(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Target-structure detection: the original substring loop vs. the compiled matcher.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_target_structure --utterances 200000
+"""
+
+import argparse
+import random
+import time
+from typing import Callable, List
+
+from target_structures import HEAD_PHRASES, analyze_turn, find_target_structure
+
+# The hard-coded list check_for_target_structure looped over before
+LEGACY_PATTERNS = [
+    "yeah but", "yes but", "yeah, but", "yes, but",
+    "i agree but", "i agree, but", "i know but", "i know, but",
+    "true but", "true, but", "i see but", "i see, but",
+    "i get that but", "i get that, but", "i hear you but", "i hear you, but",
+    "i understand but", "i understand, but", "i can see but", "i can see, but"
+]
+
+OPENERS = [
+    "Yeah but", "yeah, I agree, but", "I see your point, but", "True,  but", "I understand, however,",
+    "Well I agree but maybe", "I know... but", "No,", "I don't think so.", "That's wrong,", "Honestly",
+    "I get mad at homework but", "I know my sister but", "I see a dog but",
+]
+# Plain statements with an "I know/see/get" and a "but" that are not acknowledgements
+NEAR_MISSES = [
+    "I get mad at homework but I do it", "I know my sister but she is rude", "I see a dog but no cat",
+    "I get up early but I'm still late", "I hear music but I can't sleep", "Yeah I went there but it was closed",
+]
+BODIES = [
+    "social media is bad for sleep", "homework takes too much time", "we should wear what we want",
+    "working from home is more productive", "phones are fine if you take breaks", "I think it depends",
+]
+
+
+def legacy_check(user_input: str) -> bool:
+    """The original implementation: lowercase, then one `in` per pattern"""
+    user_lower = user_input.lower()
+    for pattern in LEGACY_PATTERNS:
+        if pattern in user_lower:
+            return True
+    return False
+
+
+def expanded_patterns() -> List[str]:
+    """What LEGACY_PATTERNS would have to grow to for the loop to cover the matcher's simple variants"""
+    clauses = ["i agree", "i know", "i see", "i understand", "i get that", "i hear you", "i can see",
+               "i totally agree", "i really understand", "i can understand", "i appreciate that"]
+    acks = HEAD_PHRASES + clauses + [f"{h}{sep}{c}" for h in HEAD_PHRASES for c in clauses for sep in (" ", ", ")]
+    return [f"{a}{sep}{c}" for a in acks for sep in (" ", ", ", "... ", ". ") for c in ("but", "though", "however")]
+
+
+def _any_in(text: str, patterns: List[str]) -> bool:
+    """The legacy loop body over an arbitrary pattern list"""
+    return any(p in text for p in patterns)
+
+
+def make_utterances(n: int, seed: int = 7) -> List[str]:
+    """Synthetic student turns mixing target structures, near misses and plain disagreement"""
+    rng = random.Random(seed)
+    return [f"{rng.choice(OPENERS)} {rng.choice(BODIES)}. {rng.choice(BODIES)}" for _ in range(n)]
+
+
+def _time(label: str, fn: Callable[[str], object], utterances: List[str]) -> List[object]:
+    """Run fn over every utterance and print throughput"""
+    start = time.perf_counter()
+    results = [fn(u) for u in utterances]
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed * 1000:9.1f} ms   {len(utterances) / elapsed:12,.0f} utterances/s")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--utterances", type=int, default=200_000)
+    args = parser.parse_args()
+
+    utterances = make_utterances(args.utterances)
+    legacy = _time("legacy substring loop", legacy_check, utterances)
+
+    expanded = expanded_patterns()
+    _time(f"loop over {len(expanded):,} variants",
+          lambda u: _any_in(u.lower(), expanded), utterances[:max(1, len(utterances) // 100)])
+    print(f"{'':<28} (timed on 1% of the batch)")
+
+    compiled = _time("compiled matcher", lambda u: find_target_structure(u) is not None, utterances)
+    _time("matcher + mitigation score", analyze_turn, utterances)
+
+    agree = sum(a == b for a, b in zip(legacy, compiled))
+    extra = sum(b and not a for a, b in zip(legacy, compiled))
+    missed = sum(a and not b for a, b in zip(legacy, compiled))
+    print(f"agreement {agree / len(utterances):.1%}   "
+          f"matched only by compiled matcher: {extra:,}   only by legacy loop: {missed:,}")
+    false_positives = [u for u in NEAR_MISSES if find_target_structure(u) is not None]
+    print(f"near misses matched: {len(false_positives)} of {len(NEAR_MISSES)}"
+          + (f"   {false_positives}" if false_positives else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""
+Classroom load test: N simulated students driven through the whole app at once.
+
+Every student is a headless Streamlit AppTest session walking
+welcome → activity1 → activity2 (debate) → activity3 (both scenarios) → reflection
+with scripted chat turns, all concurrently, against the in-process stub backend
+(no network, no API key). Reports per-rerun latency percentiles, time spent
+waiting on the backend and session-state memory per student.
+
+Usage (from the repo root):
+    python -m benchmarks.loadtest --students 40 --turns 3
+    python -m benchmarks.loadtest --students 40 --ttft-ms 800 --error-rate 0.02 --json results.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import pathlib
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+APP_PATH = str(pathlib.Path(__file__).resolve().parent.parent / "app.py")
+
+STUDENT_LINES = [
+    "Yeah but I think it's really bad for your sleep.",
+    "I don't agree, it wastes so much time.",
+    "I understand, but maybe there are better ways to learn?",
+    "No, that's not true at all.",
+    "True, but perhaps we could try something different.",
+    "I see your point, though I still think it's too much.",
+]
+
+DEBATE_BUTTONS = ["📱 Social Media", "📚 Homework", "👔 Dress Code", "🏢 Remote Work"]
+
+# ============================================================================
+# MEASUREMENT
+# ============================================================================
+
+class Recorder:
+    """Thread-safe collection of timings from all simulated students"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reruns: List[float] = []
+        self.api_waits: List[float] = []
+        self.api_errors = 0
+
+    def rerun(self, seconds: float):
+        with self._lock:
+            self.reruns.append(seconds)
+
+    def api_wait(self, seconds: float, failed: bool = False):
+        with self._lock:
+            self.api_waits.append(seconds)
+            self.api_errors += failed
+
+
+def instrument_backend(backend, recorder: Recorder):
+    """Wrap the stub's methods so every call's wall time (incl. full streams) is recorded"""
+    chat, chat_stream, transcribe = backend.chat, backend.chat_stream, backend.transcribe
+
+    def timed(fn):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+                recorder.api_wait(time.perf_counter() - start, failed=True)
+                raise
+            recorder.api_wait(time.perf_counter() - start)
+            return result
+        return wrapper
+
+    def timed_stream(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            stream = chat_stream(*args, **kwargs)
+        except Exception:
+            recorder.api_wait(time.perf_counter() - start, failed=True)
+            raise
+        deltas = iter(stream)
+
+        def drain():
+            try:
+                yield from deltas
+            finally:
+                recorder.api_wait(time.perf_counter() - start)
+
+        stream._deltas = drain()
+        return stream
+
+    backend.chat = timed(chat)
+    backend.transcribe = timed(transcribe)
+    backend.chat_stream = timed_stream
+
+
+def deep_sizeof(obj, seen=None) -> int:
+    """Approximate retained size of an object graph in bytes"""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__"):
+        size += deep_sizeof(vars(obj), seen)
+    return size
+
+
+def prepare_concurrent_apptest():
+    """Let many AppTest sessions run at once in one process.
+
+    AppTest installs a mock Runtime singleton for the duration of each run
+    and clears it afterwards, so concurrent runs pull it out from under each
+    other - fall back to one shared mock built the same way instead. Each
+    run also recompiles app.py, and CPython 3.11's compiler is not safe to
+    call from several threads at once, so compilation is serialised.
+    """
+    from unittest.mock import MagicMock
+
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+
+    shared = MagicMock(spec=Runtime)
+    shared.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    shared.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime.instance = classmethod(lambda cls: cls._instance or shared)
+    Runtime.exists = classmethod(lambda cls: True)
+
+    compile_lock = threading.Lock()
+    get_bytecode = ScriptCache.get_bytecode
+
+    def locked_get_bytecode(self, script_path):
+        with compile_lock:
+            return get_bytecode(self, script_path)
+
+    ScriptCache.get_bytecode = locked_get_bytecode
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))]
+
+# ============================================================================
+# SIMULATED STUDENT
+# ============================================================================
+
+class Student:
+    """One headless session walking through the full lesson"""
+
+    def __init__(self, index: int, turns: int, recorder: Recorder, timeout: float):
+        from streamlit.testing.v1 import AppTest
+
+        self.index = index
+        self.turns = turns
+        self.recorder = recorder
+        self.at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+
+    def run(self):
+        """Rerun the script and record how long it took"""
+        start = time.perf_counter()
+        self.at.run()
+        self.recorder.rerun(time.perf_counter() - start)
+        if self.at.exception:
+            raise RuntimeError(f"student {self.index}: {self.at.exception[0].message}")
+
+    def click(self, label: str):
+        for button in self.at.button:
+            if button.label.startswith(label):
+                button.click()
+                self.run()
+                return
+        raise RuntimeError(f"student {self.index}: no button {label!r} in state "
+                           f"{self.at.session_state['current_state']}")
+
+    def type(self, label: str, text: str):
+        for widget in list(self.at.text_input) + list(self.at.text_area):
+            if widget.label == label:
+                widget.input(text)
+                return
+        raise RuntimeError(f"student {self.index}: no text field {label!r}")
+
+    def chat(self):
+        for turn in range(self.turns):
+            line = STUDENT_LINES[(self.index + turn) % len(STUDENT_LINES)]
+            self.at.chat_input[0].set_value(line)
+            self.run()
+
+    def lesson(self) -> Dict:
+        """Walk the full lesson; returns per-session stats"""
+        self.run()
+        self.type("Your Name:", f"student{self.index:03d}")
+        self.click("Start Session")
+
+        self.click("Start Activity 1")
+        self.click("Show First Conversation")
+        self.type("Write your thoughts here:", "She disagrees politely.")
+        self.click("Continue to Second Conversation")
+        self.click("See What You Discovered")
+        self.click("Ready for Activity 2")
+
+        self.click(DEBATE_BUTTONS[self.index % len(DEBATE_BUTTONS)])
+        self.chat()
+        self.click("✅ End Debate")
+        self.click("Continue to Activity 3")
+
+        self.click("Start Scenario 1")
+        self.chat()
+        self.click("✅ End Scenario")
+        self.click("Continue to Scenario 2")
+        self.chat()
+        self.click("✅ End Scenario")
+        self.click("Complete Session")
+
+        self.type("Type your reflection:", "Start with yeah but, then disagree.")
+        self.click("Submit & Download")
+
+        state = self.at.session_state
+        return {"session_state_bytes": deep_sizeof({k: state[k] for k in state.keys()})}
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=40)
+    parser.add_argument("--turns", type=int, default=3, help="chat turns per debate/scenario")
+    parser.add_argument("--ttft-ms", type=float, default=600.0, help="stub median time to first token")
+    parser.add_argument("--token-ms", type=float, default=25.0, help="stub gap between streamed tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="stub failure probability")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds allowed per rerun")
+    parser.add_argument("--json", help="also write the summary to this file")
+    args = parser.parse_args()
+
+    # The stub must be selected before the app (and backends) are first imported
+    os.environ.update({
+        "DP_BACKEND": "stub",
+        "DP_STUB_TTFT_MS": str(args.ttft_ms),
+        "DP_STUB_TOKEN_MS": str(args.token_ms),
+        "DP_STUB_ERROR_RATE": str(args.error_rate),
+        "DP_STUB_SEED": str(args.seed),
+    })
+    # Keep the simulated students' session logs and traces out of the real directories
+    os.environ.setdefault("DP_LOG_DIR", tempfile.mkdtemp(prefix="dp_loadtest_logs_"))
+    os.environ.setdefault("DP_TRACE_DIR", tempfile.mkdtemp(prefix="dp_loadtest_traces_"))
+    logging.disable(logging.WARNING)   # AppTest is chatty about missing script contexts
+    sys.path.insert(0, str(pathlib.Path(APP_PATH).parent))
+
+    import backends
+    import tracing
+
+    prepare_concurrent_apptest()
+    recorder = Recorder()
+    instrument_backend(backends.get_backend(), recorder)
+
+    print(f"{args.students} students × {args.turns} turns per chat, stub TTFT {args.ttft_ms:.0f} ms")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.students) as pool:
+        futures = [pool.submit(lambda i=i: Student(i, args.turns, recorder, args.timeout).lesson())
+                   for i in range(args.students)]
+        sessions, failures = [], []
+        for future in futures:
+            try:
+                sessions.append(future.result())
+            except Exception as e:
+                failures.append(str(e))
+    wall = time.perf_counter() - start
+
+    reruns_ms = [r * 1000 for r in recorder.reruns]
+    waits_ms = [w * 1000 for w in recorder.api_waits]
+    memory = [s["session_state_bytes"] for s in sessions]
+    summary = {
+        "students": args.students,
+        "completed": len(sessions),
+        "failures": failures,
+        "wall_seconds": round(wall, 2),
+        "reruns": len(reruns_ms),
+        "rerun_ms": {p: round(percentile(reruns_ms, q), 1) for p, q in (("p50", 50), ("p95", 95), ("p99", 99))},
+        "api_calls": len(waits_ms),
+        "api_errors": recorder.api_errors,
+        "api_wait_ms": {p: round(percentile(waits_ms, q), 1) for p, q in (("p50", 50), ("p95", 95), ("p99", 99))},
+        "api_wait_share": round(sum(waits_ms) / sum(reruns_ms), 3) if reruns_ms else 0.0,
+        "phase_ms": {name: {"spans": stats["count"], "p50": round(stats["p50_ms"], 1), "p95": round(stats["p95_ms"], 1)}
+                     for name, stats in tracing.get_tracer().phase_stats().items()},
+        "session_state_kb": {
+            "mean": round(statistics.mean(memory) / 1024, 1) if memory else 0.0,
+            "max": round(max(memory) / 1024, 1) if memory else 0.0,
+        },
+    }
+
+    print(f"completed {summary['completed']}/{args.students} in {summary['wall_seconds']}s "
+          f"({summary['reruns']} reruns)")
+    print("rerun latency    " + "   ".join(f"{k} {v:8.1f} ms" for k, v in summary["rerun_ms"].items()))
+    print("API wait         " + "   ".join(f"{k} {v:8.1f} ms" for k, v in summary["api_wait_ms"].items())
+          + f"   ({summary['api_calls']} calls, {summary['api_errors']} errors, "
+          f"{summary['api_wait_share']:.0%} of rerun time)")
+    for name, stats in summary["phase_ms"].items():
+        print(f"phase {name:<16} p50 {stats['p50']:8.1f} ms   p95 {stats['p95']:8.1f} ms   ({stats['spans']} spans)")
+    print(f"session state    mean {summary['session_state_kb']['mean']} KB   "
+          f"max {summary['session_state_kb']['max']} KB")
+    for failure in failures[:5]:
+        print(f"  failed: {failure}")
+
+    if args.json:
+        pathlib.Path(args.json).write_text(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Small in-memory caches shared by the Discussion Partner app.
+"""
+
+import hashlib
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, NamedTuple, Optional, Tuple
+
+
+def content_digest(data: bytes) -> str:
+    """Short, stable identifier for a blob (e.g. a voice recording)"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class LRUCache:
+    """Bounded mapping that evicts the least recently used entry; safe to share between threads"""
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        """Return the cached value (marking it recently used) or default"""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any):
+        """Store a value, evicting the oldest entry if the cache is full"""
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# Words that don't change what a student is saying ("I think social media is really bad" ~ "social media bad")
+FINGERPRINT_STOPWORDS = frozenset("""
+a an the i i'm im me my you your we it it's its is are was be to of and or so
+that this just really very too well um uh er erm like think feel guess yeah yes
+actually honestly totally quite kind sort pretty
+""".split())
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+
+def fingerprint(text: str) -> str:
+    """Order- and filler-insensitive summary of a short message, for near-duplicate matching"""
+    words = {w.strip("'") for w in _WORD_RE.findall(text.lower().replace("’", "'"))}
+    return " ".join(sorted(w for w in words if w and w not in FINGERPRINT_STOPWORDS))
+
+
+class CachedReply(NamedTuple):
+    """A reply served from the response cache"""
+    text: str
+    saved_ms: int    # What generating it took originally
+
+
+class ResponseCache:
+    """Pools of model replies per key, with TTL and LRU eviction; safe to share between threads.
+
+    A key only starts serving once it has min_variants replies, and then
+    serves one at random, so students sending the same opening line still
+    get varied answers. Until then a lookup is counted as filling (the turn
+    was a repeat, but its reply still gets generated and added to the pool)
+    rather than as a miss.
+    """
+
+    def __init__(self, maxsize: int = 512, ttl_seconds: float = 6 * 3600,
+                 max_variants: int = 5, min_variants: int = 3):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.max_variants = max_variants
+        self.min_variants = min_variants
+        self._pools: "OrderedDict[Hashable, List[Tuple[float, str, int]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.filling = 0
+        self.misses = 0
+        self.saved_ms = 0
+
+    def _live(self, key: Hashable, now: float) -> List[Tuple[float, str, int]]:
+        pool = [v for v in self._pools.get(key, []) if now - v[0] < self.ttl_seconds]
+        if pool:
+            self._pools[key] = pool
+        else:
+            self._pools.pop(key, None)
+        return pool
+
+    def get(self, key: Hashable) -> Optional[CachedReply]:
+        """A random stored reply for key, or None if its pool isn't full enough yet"""
+        with self._lock:
+            pool = self._live(key, time.monotonic())
+            if len(pool) < self.min_variants:
+                if pool:
+                    self.filling += 1
+                else:
+                    self.misses += 1
+                return None
+            self._pools.move_to_end(key)
+            _, text, generation_ms = random.choice(pool)
+            self.hits += 1
+            self.saved_ms += generation_ms
+            return CachedReply(text, generation_ms)
+
+    def put(self, key: Hashable, text: str, generation_ms: int):
+        """Add a freshly generated reply to key's pool (replacing the oldest when the pool is full)"""
+        with self._lock:
+            now = time.monotonic()
+            pool = self._live(key, now)
+            if any(stored == text for _, stored, _ in pool):
+                return
+            pool.append((now, text, generation_ms))
+            del pool[:-self.max_variants]
+            self._pools[key] = pool
+            self._pools.move_to_end(key)
+            while len(self._pools) > self.maxsize:
+                self._pools.popitem(last=False)
+
+    def stats(self) -> Dict:
+        """Hit rate (served from the cache), repeat rate (served or filling a pool) and generation time saved so far"""
+        with self._lock:
+            lookups = self.hits + self.filling + self.misses
+            return {
+                "hits": self.hits,
+                "filling": self.filling,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "repeat_rate": round((self.hits + self.filling) / lookups, 3) if lookups else 0.0,
+                "saved_ms": self.saved_ms,
+                "keys": len(self._pools),
+            }
+
+    def __len__(self) -> int:
+        return len(self._pools)
+
+    def clear(self):
+        with self._lock:
+            self._pools.clear()
+
+
+_response_cache: Optional[ResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """The process-wide reply cache (shared by every session)"""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache()
+        return _response_cache
@@ -0,0 +1,194 @@
+"""
+Course content for the Discussion Partner app: the corpus dialogues and
+examples, Turn 1 scaffolding, debate topics and role-play scenarios.
+
+Kept out of app.py so it is built once per process rather than on every
+rerun, along with the lookups by id that the activities use and the HTML
+blocks rendered from it.
+"""
+
+import html
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Mapping, Tuple
+
+# ============================================================================
+# CORPUS DATA
+# ============================================================================
+
+DIALOGUES = {
+    "mobile_phones": {
+        "title": "Mobile Phones on Trains",
+        "context": "Eden (boss) and Tiara (employee) are talking",
+        "power": "high",
+        "dialogue": """**Eden:** Do you think that mobile phones should be banned on trains? Should they be forbidden?
+
+**Tiara:** Because people speak too loudly?
+
+**Eden:** Yes. Some people find that very annoying.
+
+**Tiara:** I can see their point. It is sometimes annoying. But I don't agree that they should be banned."""
+    },
+    "life_expectancy": {
+        "title": "Life Expectancy",
+        "context": "Linda and Semih are friends discussing how long people will live",
+        "power": "low",
+        "dialogue": """**Linda:** Scientists say people will live over 100 years. I'm not convinced this is good.
+
+**Semih:** Why aren't you keen on people living over 100?
+
+**Linda:** When you look at 100-year-old people, they're not in excellent physical condition.
+
+**Semih:** Well I agree but medicines and scientific research has been progressing. Maybe there are some kind of medicines in the future which can help.
+
+**Linda:** Yes but if people live over 100 and retire later, then young people can't find jobs because older people keep working.
+
+**Semih:** Well I agree but maybe we can develop more jobs..."""
+    }
+}
+
+# The built-in examples, in display order; corpus.py indexes them with the learner corpus file
+CORPUS_EXAMPLES = {
+    "high_power": [
+        "I can see their point. It is sometimes annoying. But I don't agree that they should be banned.",
+        "I can understand your opinion erm but I was still wondering...",
+        "I agree with this point but don't you think maybe the fact that times are changing is a good thing?",
+        "I understand his situation but I'm not sure if I should do it"
+    ],
+    "low_power": [
+        "Yeah but there are some disadvantages like er...",
+        "yeah I agree but I still the problem is that...",
+        "Well I agree but maybe we can develop more jobs",
+        "Yes but if people are going to live over a hundred and they're probably going to retire later..."
+    ]
+}
+
+# Turn 1 scaffolding: noticing questions (no explicit teaching) shown under corpus examples picked by corpus.py
+SCAFFOLDING = {
+    "low": {
+        "questions": [
+            "How do they start their disagreement?",
+            "What words appear in most of these examples?",
+            "Do they disagree directly or do they do something first?"
+        ]
+    },
+    "high": {
+        "questions": [
+            "How do they start their disagreement?",
+            "Are these examples longer or shorter than casual conversations?",
+            "What do they say BEFORE disagreeing?",
+            'Do you see any words like "maybe", "perhaps", "I think"?'
+        ]
+    }
+}
+
+DEBATE_TOPICS = [
+    {
+        "id": "social_media",
+        "topic": "Social Media",
+        "power": "low",
+        "ai_position": "Social media is helpful",
+        "ai_opening": "Hey! So you think social media is harmful? Yeah, I know it can cause some problems, but I think it really helps people stay connected with friends and family.",
+        "corpus_patterns": "low_power",
+        "relationship": "friends"
+    },
+    {
+        "id": "homework",
+        "topic": "Homework",
+        "power": "low",
+        "ai_position": "Homework is necessary",
+        "ai_opening": "Alright, homework debate! I agree it can be boring, but I think it's really important for learning. Don't you think practice helps?",
+        "corpus_patterns": "low_power",
+        "relationship": "classmates"
+    },
+    {
+        "id": "dress_code",
+        "topic": "Workplace Dress Code",
+        "power": "high",
+        "ai_position": "Professional dress code is necessary",
+        "ai_opening": "I understand you have concerns about the dress code policy. However, I believe maintaining professional attire is important for our company image and client relationships. Could you share your perspective on this?",
+        "corpus_patterns": "high_power",
+        "relationship": "boss-employee"
+    },
+    {
+        "id": "remote_work",
+        "topic": "Remote Work Policy",
+        "power": "high",
+        "ai_position": "Office presence is important",
+        "ai_opening": "I can see why remote work appeals to many employees. However, I'm concerned about team collaboration and company culture. Perhaps we could discuss a balanced approach that addresses both needs?",
+        "corpus_patterns": "high_power",
+        "relationship": "boss-employee"
+    }
+]
+
+ROLE_PLAY_SCENARIOS = [
+    {
+        "id": "friend_phone",
+        "title": "Scenario 1: Disagreeing with a friend",
+        "power": "low",
+        "role_student": "You are talking to your friend",
+        "role_ai": "Your friend",
+        "situation": "Your friend thinks using a phone all day is okay. You think it's bad for health.",
+        "ai_opening": "I don't think using my phone all day is bad. It's fun! I can play games and talk to my friends all the time.",
+        "corpus_patterns": "low_power",
+        "relationship": "friends",
+        "topic": "phone usage and health"
+    },
+    {
+        "id": "boss_schedule",
+        "title": "Scenario 2: Negotiating with your boss",
+        "power": "high",
+        "role_student": "You are an employee",
+        "role_ai": "Your boss",
+        "situation": "Your boss says everyone must work late shifts. You have school in the morning and can't stay late.",
+        "ai_opening": "I've reviewed the schedules, and I've decided that all employees need to work late shifts from now on. It's better for business, and I expect everyone to cooperate. This starts next week.",
+        "corpus_patterns": "high_power",
+        "relationship": "boss-employee",
+        "topic": "late shift schedule vs school"
+    }
+]
+
+# ============================================================================
+# INDEXES
+# ============================================================================
+
+DEBATE_TOPICS_BY_ID: Mapping[str, Dict] = MappingProxyType({topic["id"]: topic for topic in DEBATE_TOPICS})
+SCENARIOS_BY_ID: Mapping[str, Dict] = MappingProxyType({scenario["id"]: scenario for scenario in ROLE_PLAY_SCENARIOS})
+
+# ============================================================================
+# RENDERED HTML
+# ============================================================================
+
+@lru_cache(maxsize=64)
+def corpus_examples_html(examples: Tuple[str, ...], title: str) -> str:
+    """Markdown/HTML for a list of corpus examples, built once per list"""
+    parts = [f"**{title}**"] if title else []
+    # Examples may come from the learner corpus file, so they are text, never markup
+    parts.extend(f'<div class="corpus-example">"{html.escape(example)}"</div>' for example in examples)
+    return "\n\n".join(parts)
+
+
+@lru_cache(maxsize=64)
+def scenario_box_html(heading: str, lines: Tuple[Tuple[str, str], ...]) -> str:
+    """The red scenario box shown above a debate/role-play chat"""
+    rows = "".join(f"<p><strong>{label}:</strong> {text}</p>" for label, text in lines)
+    return f'<div class="scenario-box"><h3>{heading}</h3>{rows}</div>'
+
+
+@lru_cache(maxsize=256)
+def scaffolding_html(power_level: str, examples: Tuple[str, ...]) -> str:
+    """The whole Turn 1 scaffolding box as one block, built once per power level and example list"""
+    scaffold = SCAFFOLDING["low" if power_level == "low" else "high"]
+    questions = "\n".join(f"- {question}" for question in scaffold["questions"])
+    return f"""<div class="scaffolding-box">
+<h4>💡 Let me show you how others disagreed in similar situations...</h4>
+
+{corpus_examples_html(examples, "Examples from real conversations:")}
+
+**Look at these examples. What do you notice?**
+
+{questions}
+
+**Want to try your response again?**
+
+</div>"""
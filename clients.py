@@ -0,0 +1,90 @@
+"""
+Shared OpenAI clients for the Discussion Partner app.
+
+Streamlit re-executes app.py on every rerun, so anything created there is
+thrown away after each student message. Clients live in this module instead:
+one pooled client per API key, shared by every session in the process, so a
+turn reuses an open keep-alive connection instead of paying for a new HTTP
+client and TLS handshake.
+"""
+
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from openai import OpenAI
+
+try:
+    import httpx
+except ImportError:  # newer openai releases ship the httpx2 fork
+    import httpx2 as httpx
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+# Pool sizing - one classroom (~30-40 students) fits comfortably in the defaults
+POOL_MAX_CONNECTIONS = int(os.environ.get("DP_POOL_MAX_CONNECTIONS", "100"))
+POOL_MAX_KEEPALIVE = int(os.environ.get("DP_POOL_MAX_KEEPALIVE", "40"))
+POOL_KEEPALIVE_EXPIRY = float(os.environ.get("DP_POOL_KEEPALIVE_EXPIRY", "120"))
+
+# Timeouts in seconds
+CONNECT_TIMEOUT = float(os.environ.get("DP_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.environ.get("DP_READ_TIMEOUT", "60"))
+WRITE_TIMEOUT = float(os.environ.get("DP_WRITE_TIMEOUT", "30"))
+POOL_TIMEOUT = float(os.environ.get("DP_POOL_TIMEOUT", "10"))
+
+# Retries (with backoff and fair queueing across sessions) are done by scheduler.py
+MAX_RETRIES = int(os.environ.get("DP_MAX_RETRIES", "0"))
+
+# ============================================================================
+# CLIENT REGISTRY
+# ============================================================================
+
+_clients: Dict[Tuple[str, Optional[str]], OpenAI] = {}
+_lock = threading.Lock()
+
+
+def _build_client(api_key: str, base_url: Optional[str]) -> OpenAI:
+    """Create an OpenAI client backed by a keep-alive connection pool"""
+    http_client = httpx.Client(
+        limits=httpx.Limits(
+            max_connections=POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=POOL_MAX_KEEPALIVE,
+            keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(
+            READ_TIMEOUT,
+            connect=CONNECT_TIMEOUT,
+            write=WRITE_TIMEOUT,
+            pool=POOL_TIMEOUT,
+        ),
+        follow_redirects=True,
+    )
+    return OpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        http_client=http_client,
+        max_retries=MAX_RETRIES,
+    )
+
+
+def get_client(api_key: str, base_url: Optional[str] = None) -> OpenAI:
+    """Return the process-wide client for this API key, creating it on first use"""
+    key = (api_key, base_url)
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _build_client(api_key, base_url)
+                _clients[key] = client
+    return client
+
+
+def close_clients():
+    """Close every pooled client (used by benchmarks and on shutdown)"""
+    with _lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
@@ -0,0 +1,166 @@
+"""
+Token-budgeted conversation context for the Discussion Partner app.
+
+The prompt keeps the most recent turns verbatim and folds everything older
+into a short running summary. The summary is extended incrementally (previous
+summary + newly evicted turns), never regenerated from the full history, so
+prompt size stays flat however long a student keeps debating. Folding runs
+on a background pool after a reply, so the student never waits for it; the
+next turn picks up the new summary.
+"""
+
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except ImportError:  # tiktoken is optional - fall back to a character estimate
+    _ENCODING = None
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+KEEP_RECENT_TURNS = 4        # Student/AI exchanges always sent verbatim
+FOLD_BATCH_TURNS = 2         # Fold older turns into the summary this many at a time
+HISTORY_TOKEN_BUDGET = 1200  # Max tokens for summary + verbatim history
+MESSAGE_OVERHEAD_TOKENS = 4  # Per-message framing tokens added by the chat format
+FOLD_WORKERS = 4             # Summaries folded in the background at once, all sessions together
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+SUMMARY_HEADER = "EARLIER IN THIS CONVERSATION (summary):\n"
+
+# ============================================================================
+# TOKEN COUNTING
+# ============================================================================
+
+def estimate_tokens(text: str) -> int:
+    """Count tokens with tiktoken when installed, otherwise estimate ~4 chars per token"""
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return len(text) // 4 + 1
+
+
+def message_tokens(messages: List[Dict]) -> int:
+    """Token count of a list of chat messages, including per-message overhead"""
+    return sum(estimate_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+# ============================================================================
+# RUNNING SUMMARY
+# ============================================================================
+
+def new_summary() -> Dict:
+    """Empty summary state: text so far and how many history messages it covers"""
+    return {"text": "", "covered": 0, "anchor": None}
+
+
+def _anchor(history: List[Dict], covered: int) -> Optional[str]:
+    """Identify the folded prefix so a reset conversation_history is detected"""
+    if covered == 0:
+        return None
+    return history[0]["content"] + "\x00" + history[covered - 1]["content"]
+
+
+def is_current(summary: Dict, history: List[Dict]) -> bool:
+    """True if the summary still describes the start of this history"""
+    covered = summary["covered"]
+    if covered > len(history):
+        return False
+    return summary["anchor"] == _anchor(history, covered)
+
+
+def _foldable(summary: Dict, history: List[Dict]) -> int:
+    """Messages outside the verbatim window that the summary doesn't cover yet"""
+    return len(history) - KEEP_RECENT_TURNS * 2 - summary["covered"]
+
+
+def needs_fold(summary: Dict, history: List[Dict]) -> bool:
+    """True if fold_history would call the summariser"""
+    if not is_current(summary, history):
+        summary = new_summary()
+    return _foldable(summary, history) >= FOLD_BATCH_TURNS * 2
+
+
+def fold_history(summary: Dict, history: List[Dict],
+                 summarize: Callable[[str, List[Dict]], str]) -> Dict:
+    """Fold turns that fell out of the verbatim window into the running summary.
+
+    Only the newly evicted messages are passed to `summarize`, together with
+    the previous summary text. Folding waits until FOLD_BATCH_TURNS turns have
+    accumulated so the summariser is called every few turns, not every turn.
+    """
+    if not is_current(summary, history):
+        summary = new_summary()
+
+    foldable = _foldable(summary, history)
+    if foldable < FOLD_BATCH_TURNS * 2:
+        return summary
+
+    covered = summary["covered"] + foldable
+    text = summarize(summary["text"], history[summary["covered"]:covered])
+    return {"text": text.strip(), "covered": covered, "anchor": _anchor(history, covered)}
+
+
+_fold_pool: Optional[ThreadPoolExecutor] = None
+_fold_pool_lock = threading.Lock()
+
+
+def get_fold_pool() -> ThreadPoolExecutor:
+    """The process-wide pool summaries are folded on, off the turn path"""
+    global _fold_pool
+    with _fold_pool_lock:
+        if _fold_pool is None:
+            _fold_pool = ThreadPoolExecutor(max_workers=FOLD_WORKERS, thread_name_prefix="fold-summary")
+        return _fold_pool
+
+# ============================================================================
+# CONTEXT ASSEMBLY
+# ============================================================================
+
+def trim_summary(text: str, max_tokens: int) -> str:
+    """Drop the oldest sentences of a summary until it fits (whole words if one sentence is still too long)"""
+    sentences = _SENTENCE_END.split(text)
+    while len(sentences) > 1 and estimate_tokens(" ".join(sentences)) > max_tokens:
+        sentences.pop(0)
+    words = " ".join(sentences).split()
+    while len(words) > 1 and estimate_tokens(" ".join(words)) > max_tokens:
+        words = words[max(1, len(words) // 4):]
+    return " ".join(words)
+
+
+def build_context(history: List[Dict], summary: Optional[Dict] = None,
+                  budget: int = HISTORY_TOKEN_BUDGET) -> List[Dict]:
+    """Summary message (if any) plus the unsummarised tail, trimmed to the token budget"""
+    context = []
+    start = 0
+    if summary and summary["text"] and is_current(summary, history):
+        # A runaway summary must never eat the whole budget
+        text = trim_summary(summary["text"], budget // 2)
+        context.append({"role": "system", "content": SUMMARY_HEADER + text})
+        start = summary["covered"]
+
+    tail = list(history[start:])
+    # Hard cap: if long messages still blow the budget, drop the oldest verbatim ones
+    while len(tail) > 1 and message_tokens(context + tail) > budget:
+        tail.pop(0)
+    return context + tail
+
+
+def summary_prompt(previous: str, messages: List[Dict]) -> List[Dict]:
+    """Prompt asking the model to extend the running summary with new turns"""
+    transcript = "\n".join(
+        f"{'Student' if m['role'] == 'user' else 'You'}: {m['content']}" for m in messages
+    )
+    return [
+        {"role": "system", "content": (
+            "You keep a running summary of a practice conversation between a student "
+            "and you. Update the summary with the new turns. Keep the positions each "
+            "side has taken, arguments already made and any agreements or concessions. "
+            "Write at most 120 words in the third person. Return only the summary."
+        )},
+        {"role": "user", "content": f"Summary so far:\n{previous or '(none)'}\n\nNew turns:\n{transcript}"}
+    ]
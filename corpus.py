@@ -0,0 +1,224 @@
+"""
+Learner corpus of disagreement turns, indexed for example retrieval.
+
+The built-in examples (catalog.CORPUS_EXAMPLES) are always there; a larger
+corpus can be added as a JSONL file (DP_CORPUS_FILE), one turn per line:
+
+    {"text": "Yeah but ...", "power": "low", "relationship": "friends", "source": "..."}
+
+power is "low" or "high"; relationship (friends, classmates, boss-employee)
+and source are optional. The file is read once per process into one BM25
+index per power level, searchable per relationship, so the scaffolding and
+"Need Help?" boxes can show the turns closest to what the student just
+wrote without scanning the corpus.
+"""
+
+import heapq
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from catalog import CORPUS_EXAMPLES
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+CORPUS_FILE = os.environ.get("DP_CORPUS_FILE", os.path.join("corpus", "disagreements.jsonl"))
+
+# BM25 parameters (the usual defaults)
+BM25_K1 = 1.2
+BM25_B = 0.75
+COMMON_TERM_SHARE = 0.25    # Terms in more of a partition than this only re-rank (see BM25Index.search)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+# ============================================================================
+# ENTRIES
+# ============================================================================
+
+class CorpusEntry(NamedTuple):
+    """One disagreement turn"""
+    text: str
+    power: str                  # "low" or "high"
+    relationship: str = ""      # "" when the corpus doesn't say
+    source: str = ""
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens (contractions kept whole)"""
+    return _TOKEN_RE.findall(text.lower())
+
+
+def builtin_entries() -> List[CorpusEntry]:
+    """The curated examples that ship with the app, in their display order"""
+    return [CorpusEntry(text, key.split("_")[0], source="builtin")
+            for key, examples in CORPUS_EXAMPLES.items() for text in examples]
+
+
+def read_entries(path: str) -> Tuple[List[CorpusEntry], int]:
+    """Entries from a JSONL corpus file, plus the number of unusable lines skipped"""
+    entries, skipped = [], 0
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+                text, power = row["text"].strip(), row["power"]
+            except (ValueError, KeyError, TypeError, AttributeError):
+                skipped += 1
+                continue
+            if not text or power not in ("low", "high"):
+                skipped += 1
+                continue
+            entries.append(CorpusEntry(text, power, row.get("relationship") or "", row.get("source") or ""))
+    return entries, skipped
+
+# ============================================================================
+# INDEX
+# ============================================================================
+
+class BM25Index:
+    """Inverted index over one power level, with posting weights precomputed so a query only adds them up
+
+    Entries are grouped by relationship, so each relationship is a contiguous
+    range of document numbers and can be searched on its own.
+    """
+
+    def __init__(self, entries: Sequence[CorpusEntry], k1: float = BM25_K1, b: float = BM25_B):
+        self.entries = tuple(sorted(entries, key=lambda entry: entry.relationship))   # Stable: corpus order within a group
+        self.ranges: Dict[str, Tuple[int, int]] = {}
+        for doc, entry in enumerate(self.entries):
+            start, _ = self.ranges.get(entry.relationship, (doc, doc))
+            self.ranges[entry.relationship] = (start, doc + 1)
+
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        lengths = []
+        for doc, entry in enumerate(self.entries):
+            tokens = tokenize(entry.text)
+            lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, []).append((doc, tf))
+        average = sum(lengths) / len(lengths) if lengths else 0.0
+        norms = [k1 * (1 - b + b * length / average) for length in lengths]
+
+        n = len(self.entries)
+        self._postings: Dict[str, List[Tuple[int, float]]] = {}
+        for term, docs in postings.items():
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            self._postings[term] = [(doc, idf * tf * (k1 + 1) / (tf + norms[doc])) for doc, tf in docs]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def search(self, query: str, k: int, relationship: Optional[str] = None) -> List[CorpusEntry]:
+        """Up to k entries sharing a term with the query, best first (corpus order breaks ties)
+
+        Rare terms are scored first. Terms found in over COMMON_TERM_SHARE of the
+        entries ("but", "I") then only add to entries that already matched, rather
+        than touching most of the index for a near-zero weight.
+        """
+        low, high = (0, len(self.entries)) if relationship is None else self.ranges.get(relationship, (0, 0))
+        common = COMMON_TERM_SHARE * len(self.entries)
+        scores: Dict[int, float] = {}
+        for term in sorted(set(tokenize(query)), key=lambda term: len(self._postings.get(term, ()))):
+            docs = self._postings.get(term, ())
+            if scores and len(docs) > common:
+                for doc, weight in docs:
+                    if doc in scores:
+                        scores[doc] += weight
+                continue
+            for doc, weight in docs:
+                if low <= doc < high:
+                    scores[doc] = scores.get(doc, 0.0) + weight
+        best = heapq.nsmallest(k, scores.items(), key=lambda item: (-item[1], item[0]))
+        return [self.entries[doc] for doc, _ in best]
+
+# ============================================================================
+# STORE
+# ============================================================================
+
+class CorpusStore:
+    """The corpus partitioned by power level, and within each level by relationship"""
+
+    def __init__(self, entries: Iterable[CorpusEntry], skipped: int = 0, load_error: Optional[str] = None):
+        unique: Dict[Tuple[str, str, str], CorpusEntry] = {}
+        for entry in entries:
+            unique.setdefault((entry.power, entry.relationship, entry.text), entry)
+
+        levels: Dict[str, List[CorpusEntry]] = {}
+        for entry in unique.values():
+            levels.setdefault(entry.power, []).append(entry)
+        self._indexes = {power: BM25Index(group) for power, group in levels.items()}
+        self._featured = {power: [entry.text for entry in group] for power, group in levels.items()}
+        self.size = len(unique)
+        self.skipped = skipped
+        self.load_error = load_error
+
+    @classmethod
+    def load(cls, path: str = CORPUS_FILE) -> "CorpusStore":
+        """The built-in examples plus the corpus file, if there is one"""
+        entries, skipped, error = builtin_entries(), 0, None
+        if os.path.exists(path):
+            try:
+                extra, skipped = read_entries(path)
+                entries.extend(extra)
+            except OSError as e:
+                error = str(e)
+        return cls(entries, skipped, error)
+
+    def featured(self, power: str, k: int) -> List[str]:
+        """The first k examples for a power level, in corpus order (the built-in ones come first)"""
+        return self._featured.get(power, [])[:k]
+
+    def search(self, query: str, power: str, relationship: str = "", k: int = 4) -> List[str]:
+        """The k examples most similar to the query
+
+        Turns from the same relationship come first, then the rest of the power
+        level; if too few share a word with the query, the featured examples
+        fill the remaining places.
+        """
+        index = self._indexes.get(power)
+        if index is None:
+            return []
+        results: List[str] = []
+        for scope in ((relationship, None) if relationship else (None,)):
+            for entry in index.search(query, k, scope):
+                if entry.text not in results:
+                    results.append(entry.text)
+            if len(results) >= k:
+                return results[:k]
+        for text in self.featured(power, 2 * k):
+            if text not in results:
+                results.append(text)
+        return results[:k]
+
+    def stats(self) -> Dict:
+        partitions = {}
+        for power, index in sorted(self._indexes.items()):
+            partitions[power] = len(index)
+            for relationship, (start, end) in sorted(index.ranges.items()):
+                if relationship:
+                    partitions[f"{power}/{relationship}"] = end - start
+        return {"entries": self.size, "skipped": self.skipped, "partitions": partitions, "load_error": self.load_error}
+
+# ============================================================================
+# PROCESS-WIDE INSTANCE
+# ============================================================================
+
+_corpus: Optional[CorpusStore] = None
+_corpus_lock = threading.Lock()
+
+
+def get_corpus() -> CorpusStore:
+    """The process-wide corpus, loaded and indexed on first use"""
+    global _corpus
+    with _corpus_lock:
+        if _corpus is None:
+            _corpus = CorpusStore.load()
+        return _corpus
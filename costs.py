@@ -0,0 +1,68 @@
+"""
+Token and audio pricing for the Discussion Partner app.
+
+Used to put a dollar figure on every logged turn, so an instructor can
+watch what a class costs while it runs instead of waiting for the
+provider's billing page. Prices are list prices in USD and change now and
+then - keep them in step with the provider's pricing page.
+"""
+
+from typing import NamedTuple, Optional
+
+from backends import Usage
+
+# ============================================================================
+# PRICES
+# ============================================================================
+
+class ModelPrice(NamedTuple):
+    """USD per million tokens"""
+    input: float
+    cached_input: float
+    output: float
+
+
+MODEL_PRICES = {
+    "gpt-4o-mini": ModelPrice(0.15, 0.075, 0.60),
+    "gpt-4o": ModelPrice(2.50, 1.25, 10.00),
+    "gpt-4-turbo": ModelPrice(10.00, 10.00, 30.00),
+    "gpt-4": ModelPrice(30.00, 30.00, 60.00),
+    "gpt-3.5-turbo": ModelPrice(0.50, 0.50, 1.50),
+}
+
+TRANSCRIBE_PRICE_PER_MINUTE = {
+    "whisper-1": 0.006,
+}
+
+# ============================================================================
+# COSTS
+# ============================================================================
+
+def model_price(model: str) -> Optional[ModelPrice]:
+    """Price for a model name, including dated snapshots ("gpt-4o-mini-2024-07-18")"""
+    for name in sorted(MODEL_PRICES, key=len, reverse=True):
+        if model == name or model.startswith(name + "-"):
+            return MODEL_PRICES[name]
+    return None
+
+
+def chat_cost(model: str, usage: Optional[Usage]) -> Optional[float]:
+    """USD for one completion (None if the model or its usage is unknown)"""
+    price = model_price(model)
+    if price is None or usage is None:
+        return None
+    uncached = usage.prompt_tokens - usage.cached_tokens
+    return (uncached * price.input + usage.cached_tokens * price.cached_input
+            + usage.completion_tokens * price.output) / 1_000_000
+
+
+def caches_prompts(model: str) -> bool:
+    """Whether the provider discounts (and so caches) repeated prompt prefixes for a model"""
+    price = model_price(model)
+    return price is not None and price.cached_input < price.input
+
+
+def transcription_cost(model: str, seconds: float) -> Optional[float]:
+    """USD for transcribing a clip of this length"""
+    per_minute = TRANSCRIBE_PRICE_PER_MINUTE.get(model)
+    return per_minute * seconds / 60 if per_minute is not None else None
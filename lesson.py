@@ -0,0 +1,210 @@
+"""
+The lesson flow of the Discussion Partner app as a state machine.
+
+Every screen is a state (session_state.current_state) and every button that
+leaves a screen is an event. TRANSITIONS maps (state, event) to the screen it
+leads to and says whether the student starts a fresh conversation there, so
+app.py renders the current screen with one dict lookup and moves between
+screens through one routine. Screens that only differ in their content -
+the corpus dialogues, the role-play chats and the "complete" pages - are
+rows in the tables below; a new scenario is a new row, not a new branch.
+"""
+
+from types import MappingProxyType
+from typing import Dict, Mapping, NamedTuple, Optional, Tuple
+
+# ============================================================================
+# STATES
+# ============================================================================
+
+# The activity each screen belongs to (shown in the sidebar and logged with every event)
+STATE_ACTIVITY: Mapping[str, Optional[str]] = MappingProxyType({
+    "welcome": None,
+    "activity1_intro": "activity1",
+    "show_dialogue1": "activity1",
+    "show_dialogue2": "activity1",
+    "activity1_summary": "activity1",
+    "activity2_intro": "activity2",
+    "debate_chat": "activity2",
+    "debate_complete": "activity2",
+    "activity3_intro": "activity3",
+    "scenario1_chat": "activity3",
+    "scenario1_complete": "activity3",
+    "scenario2_chat": "activity3",
+    "scenario2_complete": "activity3",
+    "reflection": "activity3",
+    "complete": "activity3",
+})
+
+
+def fresh_conversation() -> Dict:
+    """Session state for a conversation that hasn't started yet"""
+    return {
+        "conversation_history": [],
+        "transcribed_text": "",
+        "last_audio_digest": None,
+        "debate_turn": 1,
+        "turn_count": 0,
+        "scaffolding_shown": False,
+    }
+
+# ============================================================================
+# TRANSITIONS
+# ============================================================================
+
+class Transition(NamedTuple):
+    """Where an event leads and what changes on the way"""
+    target: str
+    fresh: bool = False                       # Start a new conversation (see fresh_conversation)
+    log: Optional[str] = None                 # System event written to the session log
+
+
+TRANSITIONS: Mapping[Tuple[str, str], Transition] = MappingProxyType({
+    ("welcome", "start"): Transition("activity1_intro", log="Started Activity 1"),
+
+    ("activity1_intro", "next"): Transition("show_dialogue1"),
+    ("show_dialogue1", "next"): Transition("show_dialogue2"),
+    ("show_dialogue2", "next"): Transition("activity1_summary"),
+    ("activity1_summary", "next"): Transition("activity2_intro", log="Completed Activity 1, Started Activity 2"),
+
+    # The topic (current_debate) comes with the event, from the button that was clicked
+    ("activity2_intro", "debate"): Transition("debate_chat", fresh=True),
+    ("debate_chat", "end"): Transition("debate_complete"),
+    ("debate_chat", "back"): Transition("activity2_intro", fresh=True),
+    ("debate_complete", "next"): Transition("activity3_intro", fresh=True, log="Completed Activity 2, Started Activity 3"),
+    ("debate_complete", "again"): Transition("activity2_intro", fresh=True),
+
+    ("activity3_intro", "scenario1"): Transition("scenario1_chat", fresh=True),
+    ("activity3_intro", "scenario2"): Transition("scenario2_chat", fresh=True),
+    ("scenario1_chat", "end"): Transition("scenario1_complete"),
+    ("scenario1_chat", "back"): Transition("activity3_intro", fresh=True),
+    ("scenario1_complete", "next"): Transition("scenario2_chat", fresh=True),
+    ("scenario1_complete", "again"): Transition("scenario1_chat", fresh=True),
+    ("scenario1_complete", "menu"): Transition("activity3_intro"),
+    ("scenario2_chat", "end"): Transition("scenario2_complete"),
+    ("scenario2_chat", "back"): Transition("activity3_intro", fresh=True),
+    ("scenario2_complete", "next"): Transition("reflection"),
+    ("scenario2_complete", "again"): Transition("scenario2_chat", fresh=True),
+    ("scenario2_complete", "menu"): Transition("activity3_intro"),
+
+    ("reflection", "submit"): Transition("complete"),
+})
+
+# ============================================================================
+# SCREENS
+# ============================================================================
+
+# Activity 1: the two corpus dialogues, in order
+DIALOGUE_SCREENS: Mapping[str, Dict] = MappingProxyType({
+    "show_dialogue1": {
+        "header": "📚 Activity 1: First Conversation",
+        "dialogue": "mobile_phones",
+        "questions": (
+            "Does Tiara agree or disagree with Eden?",
+            "What words does Tiara use to disagree?",
+            "Is Tiara polite or rude?",
+        ),
+        "response_key": "dialogue1_response",
+        "log_label": "Activity 1 - Dialogue 1 response",
+        "button": "Continue to Second Conversation",
+    },
+    "show_dialogue2": {
+        "header": "📚 Activity 1: Second Conversation",
+        "dialogue": "life_expectancy",
+        "questions": (
+            "Do Linda and Semih agree or disagree?",
+            "What words do they use to disagree?",
+            "How is this conversation different from the first one?",
+        ),
+        "response_key": "dialogue2_response",
+        "log_label": "Activity 1 - Dialogue 2 response",
+        "button": "See What You Discovered",
+    },
+})
+
+# Activity 2: the debate topic buttons, grouped by relationship
+DEBATE_MENU: Tuple[Tuple[str, Tuple[Tuple[str, str, str], ...]], ...] = (
+    ("Casual Conversations (with friends/classmates):", (
+        ("social_media", "📱 Social Media\n(Chat with your friend)", "debate_social"),
+        ("homework", "📚 Homework\n(Chat with your classmate)", "debate_homework"),
+    )),
+    ("Professional Conversations (with your boss):", (
+        ("dress_code", "👔 Dress Code Policy\n(Talk with your boss)", "debate_dress"),
+        ("remote_work", "🏢 Remote Work Policy\n(Talk with your boss)", "debate_remote"),
+    )),
+)
+
+# Activity 3: one role-play chat per scenario (the scenario itself is in catalog.py)
+SCENARIO_CHATS: Mapping[str, Dict] = MappingProxyType({
+    "scenario1_chat": {
+        "header": "🎭 Scenario 1: Talking with a friend",
+        "scenario": "friend_phone",
+        "input_key": "scenario1",
+        "key_suffix": "_s1",
+        "scaffolding_event": "scaffolding_turn1_scenario1",
+        "auto_scaffold_event": "auto_scaffolding_triggered_s1",
+        "auto_scaffold_intro": """
+            <div class="scaffolding-box">
+            <h4>💡 Let me show you how others express disagreement in similar situations...</h4>
+            <p style="color: #666; font-size: 0.9rem;">I noticed you've been disagreeing, but certain patterns make disagreements sound more natural.</p>
+            </div>
+            """,
+        "examples_title": "Casual disagreement patterns:",
+    },
+    "scenario2_chat": {
+        "header": "🎭 Scenario 2: Talking with your boss",
+        "scenario": "boss_schedule",
+        "input_key": "scenario2",
+        "key_suffix": "_s2",
+        "scaffolding_event": "scaffolding_turn1_scenario2",
+        "auto_scaffold_event": "auto_scaffolding_triggered_s2",
+        "auto_scaffold_intro": """
+            <div class="scaffolding-box">
+            <h4>💡 Let me show you how others express disagreement professionally...</h4>
+            <p style="color: #666; font-size: 0.9rem;">I see you're disagreeing, but there are patterns that make it sound more professional.</p>
+            </div>
+            """,
+        "examples_title": "Formal disagreement patterns:",
+    },
+})
+
+# The pages after a debate or scenario; each button is (label, event)
+COMPLETE_SCREENS: Mapping[str, Dict] = MappingProxyType({
+    "debate_complete": {
+        "header": "💭 Activity 2: Debate Complete!",
+        "body": """
+        <div class="success-box">
+        <h3>Great debate!</h3>
+
+        <p>You practiced disagreeing in a natural conversation!</p>
+
+        <p>Next, you'll try role-play scenarios with different relationships!</p>
+        </div>
+        """,
+        "buttons": (("Continue to Activity 3", "next"), ("Try Another Debate Topic", "again")),
+    },
+    "scenario1_complete": {
+        "header": "🎭 Scenario 1: Complete!",
+        "body": """
+        <div class="success-box">
+        <h3>Nice conversation with your friend!</h3>
+
+        <p>Would you like to try the boss scenario, or try this one again?</p>
+        </div>
+        """,
+        "buttons": (("Continue to Scenario 2 (Boss)", "next"), ("Try Scenario 1 Again", "again"),
+                    ("Go to Activity 3 Menu", "menu")),
+    },
+    "scenario2_complete": {
+        "header": "🎭 Scenario 2: Complete!",
+        "body": """
+        <div class="success-box">
+        <h3>Professional conversation complete!</h3>
+
+        <p>Would you like to complete the session or try another scenario?</p>
+        </div>
+        """,
+        "buttons": (("Complete Session", "next"), ("Try Scenario 2 Again", "again"),
+                    ("Go to Activity 3 Menu", "menu")),
+    },
+})
@@ -0,0 +1,206 @@
+"""
+Durable session logs for the Discussion Partner app.
+
+Every interaction and autonomy event is appended to a per-session JSON Lines
+file on local disk as it happens, so a crash, closed tab or server restart
+loses at most the last FSYNC_INTERVAL_S seconds. Writes go through one
+background thread per process: callers only put events on a bounded queue,
+and the thread batches them, flushes after every batch and fsyncs
+periodically.
+"""
+
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, IO, Iterator, List, Optional, Tuple
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+LOG_DIR = os.environ.get("DP_LOG_DIR", "session_logs")
+QUEUE_MAX_EVENTS = 10000        # Events buffered in memory before callers are held back
+QUEUE_PUT_TIMEOUT_S = 1.0       # ...for at most this long, after which the event is dropped (and counted)
+BATCH_MAX_EVENTS = 500          # Events written per batch
+FSYNC_INTERVAL_S = 2.0          # Files with new data are fsynced at least this often
+MAX_OPEN_FILES = 64             # Append handles kept open; least recently used are closed
+FLUSH_TIMEOUT_S = 10.0          # flush() gives up waiting after this long
+
+# ============================================================================
+# WRITER
+# ============================================================================
+
+def session_log_path(session_id: str, log_dir: Optional[str] = None) -> str:
+    """Where a session's events are stored"""
+    return os.path.join(log_dir or LOG_DIR, f"{session_id}.jsonl")
+
+
+def _ends_mid_line(path: str) -> bool:
+    """True if a non-empty file doesn't end with a newline"""
+    with open(path, "rb") as f:
+        if f.seek(0, os.SEEK_END) == 0:
+            return False
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) != b"\n"
+
+
+class LogWriter:
+    """Background thread appending events to per-session JSONL files"""
+
+    def __init__(self, log_dir: str = LOG_DIR):
+        self.log_dir = log_dir
+        self.written = 0
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Tuple[str, Dict]]]" = queue.Queue(QUEUE_MAX_EVENTS)
+        self._files: "OrderedDict[str, IO[str]]" = OrderedDict()
+        self._unsynced = set()
+        self._last_sync = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="session-log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, session_id: str, record: Dict) -> bool:
+        """Queue one event; returns False if it had to be dropped because the disk can't keep up"""
+        try:
+            self._queue.put((session_id, record), timeout=QUEUE_PUT_TIMEOUT_S)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def flush(self, timeout: float = FLUSH_TIMEOUT_S) -> bool:
+        """Wait until everything queued so far is on disk; False if that didn't happen within timeout"""
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks and self._thread.is_alive():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(min(remaining, FSYNC_INTERVAL_S))
+            return not self._queue.unfinished_tasks
+
+    def close(self):
+        """Write out what is queued, fsync and stop the thread"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=FSYNC_INTERVAL_S)
+            except queue.Empty:
+                self._sync()
+                continue
+            batch = [item]
+            while len(batch) < BATCH_MAX_EVENTS:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = None in batch
+            events = [entry for entry in batch if entry is not None]
+            try:
+                self._write_batch(events)
+                if stop or time.monotonic() - self._last_sync >= FSYNC_INTERVAL_S:
+                    self._sync()
+            except Exception:
+                # Never let one bad batch stop logging for the whole process
+                self.dropped += len(events)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                self._close_files()
+                return
+
+    def _write_batch(self, batch: List[Tuple[str, Dict]]):
+        lines: Dict[str, List[str]] = {}
+        for session_id, record in batch:
+            try:
+                line = json.dumps(record, ensure_ascii=False, default=str)
+            except (TypeError, ValueError):
+                # e.g. a non-string dict key or a circular reference
+                self.dropped += 1
+                continue
+            lines.setdefault(session_id, []).append(line)
+        for session_id, session_lines in lines.items():
+            try:
+                handle = self._file(session_id)
+                handle.write("\n".join(session_lines) + "\n")
+                handle.flush()
+            except OSError:
+                self.dropped += len(session_lines)
+                continue
+            self._unsynced.add(session_id)
+            self.written += len(session_lines)
+
+    def _file(self, session_id: str) -> IO[str]:
+        if session_id in self._files:
+            self._files.move_to_end(session_id)
+            return self._files[session_id]
+        os.makedirs(self.log_dir, exist_ok=True)
+        path = session_log_path(session_id, self.log_dir)
+        handle = open(path, "a", encoding="utf-8")
+        if _ends_mid_line(path):
+            # A crash cut the last line short - start on a fresh line so only that one is lost
+            handle.write("\n")
+        self._files[session_id] = handle
+        while len(self._files) > MAX_OPEN_FILES:
+            old_id, old = self._files.popitem(last=False)
+            self._fsync(old_id, old)
+            old.close()
+        return handle
+
+    def _fsync(self, session_id: str, handle: IO[str]):
+        if session_id in self._unsynced:
+            try:
+                os.fsync(handle.fileno())
+            except OSError:
+                pass
+            self._unsynced.discard(session_id)
+
+    def _sync(self):
+        for session_id, handle in list(self._files.items()):
+            self._fsync(session_id, handle)
+        self._last_sync = time.monotonic()
+
+    def _close_files(self):
+        for handle in self._files.values():
+            handle.close()
+        self._files.clear()
+
+# ============================================================================
+# PROCESS-WIDE INSTANCE
+# ============================================================================
+
+_writer: Optional[LogWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> LogWriter:
+    """The process-wide writer (started on first use, drained at interpreter exit)"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = LogWriter()
+            atexit.register(_writer.close)
+        return _writer
+
+
+def read_events(session_id: str, log_dir: Optional[str] = None) -> Iterator[Dict]:
+    """Events logged for a session, oldest first (call get_writer().flush() first for the latest)"""
+    try:
+        with open(session_log_path(session_id, log_dir), encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # Blank, or a line cut short by a crash mid-write
+                    continue
+    except FileNotFoundError:
+        return
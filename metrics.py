@@ -0,0 +1,70 @@
+"""
+Process-wide running statistics for the Discussion Partner app.
+
+Per-turn numbers go into each session's log; the tables here aggregate
+them across every session in the process, so the instructor sidebar can
+show how the whole class is being served (e.g. completion tokens and
+latency per generation profile). Each table keeps a count, sum, min and
+max per group and field - constant memory however many turns are recorded.
+"""
+
+import threading
+from typing import Dict, Optional
+
+# ============================================================================
+# STATS TABLES
+# ============================================================================
+
+class StatsTable:
+    """Running count/total/min/max of numeric fields, grouped by a key; thread-safe"""
+
+    def __init__(self):
+        self._groups: Dict[str, Dict[str, list]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, group: str, **values: Optional[float]):
+        """Add one observation of each given field (None values are skipped)"""
+        with self._lock:
+            fields = self._groups.setdefault(group, {})
+            for field, value in values.items():
+                if value is None:
+                    continue
+                value = float(value)
+                row = fields.get(field)
+                if row is None:
+                    fields[field] = [1, value, value, value]
+                else:
+                    row[0] += 1
+                    row[1] += value
+                    row[2] = min(row[2], value)
+                    row[3] = max(row[3], value)
+
+    def snapshot(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """{group: {field: {count, total, mean, min, max}}}"""
+        with self._lock:
+            return {
+                group: {
+                    field: {"count": count, "total": total, "mean": total / count, "min": low, "max": high}
+                    for field, (count, total, low, high) in fields.items()
+                }
+                for group, fields in self._groups.items()
+            }
+
+    def clear(self):
+        with self._lock:
+            self._groups.clear()
+
+# ============================================================================
+# PROCESS-WIDE INSTANCES
+# ============================================================================
+
+_tables: Dict[str, StatsTable] = {}
+_tables_lock = threading.Lock()
+
+
+def get_table(name: str) -> StatsTable:
+    """The process-wide table with this name (created on first use)"""
+    with _tables_lock:
+        if name not in _tables:
+            _tables[name] = StatsTable()
+        return _tables[name]
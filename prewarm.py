@@ -0,0 +1,128 @@
+"""
+Background warm-up for the first turn of a chat.
+
+When a student opens a debate or role-play, the app only shows the canned
+opening line, so their first real message would pay for a cold connection
+and a cold prompt-prefix cache. Instead, opening the chat hands a one-token
+request to a small thread pool here: it sends the prompt the first turn will
+start with (static prefix, topic and opening line) over the pooled client, so
+the connection is open and the provider has cached the prefix by the time
+the student has typed a reply. Models without prompt caching (gpt-4) would
+pay full price for that prefix and gain nothing from it, so for them only
+the connection is warmed, with a one-message request.
+
+Warm-ups never block the page. They are skipped when the model's scheduler
+already has a queue (real turns come first), and each (client, model,
+relationship, topic) is warmed at most once per PREWARM_TTL_S across all
+sessions. Clients are pooled per (API key, base URL), so in a class sharing
+one key this primes the provider's cache of the shared prefix and one
+keep-alive connection once per TTL; the pool's other connections are not
+warmed, and a second student opening the same chat gains only the prefix
+cache. Their cost is recorded in the process-wide usage
+table like any other call.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from backends import Backend, BackendError
+from context_builder import message_tokens
+from costs import caches_prompts, chat_cost
+from metrics import get_table
+from scheduler import get_scheduler
+from tracing import get_tracer
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+PREWARM_ENABLED = os.environ.get("DP_PREWARM", "1") != "0"
+PREWARM_TTL_S = float(os.environ.get("DP_PREWARM_TTL", "240"))   # Providers drop an idle prefix after ~5-10 min
+PREWARM_WORKERS = 2
+PREWARM_SESSION = "prewarm"     # Scheduler queue shared by all warm-ups
+
+_PING = {"role": "user", "content": "."}
+
+# ============================================================================
+# PREWARMER
+# ============================================================================
+
+class Prewarmer:
+    """Runs warm-up requests on a background pool, at most one per key per TTL"""
+
+    def __init__(self, workers: int = PREWARM_WORKERS, ttl: float = PREWARM_TTL_S):
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prewarm")
+        self._warmed: Dict[Tuple[str, str, str, str], float] = {}
+        self._lock = threading.Lock()
+        self.started = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def warm(self, backend: Backend, model: str, relationship: str, topic: str,
+             messages: List[Dict], session_id: str = "") -> Optional[Future]:
+        """Start warming the prompt a chat will open with; returns at once (None if skipped)"""
+        if not caches_prompts(model):
+            # Nothing to cache - just open the connection, once per client and model
+            relationship, topic, messages = "", "", []
+        key = (backend.client_key, model, relationship, topic)
+        now = time.monotonic()
+        with self._lock:
+            if now - self._warmed.get(key, -self.ttl) < self.ttl or get_scheduler(model).estimate_wait(PREWARM_SESSION):
+                self.skipped += 1
+                return None
+            self._warmed[key] = now
+            self.started += 1
+        return self._executor.submit(self._run, backend, model, key, messages + [_PING], session_id)
+
+    def _run(self, backend: Backend, model: str, key: Tuple[str, str, str, str], messages: List[Dict],
+             session_id: str):
+        with get_tracer().span("prewarm", session_id, 0, model=model, prefix=len(messages) > 1) as span:
+            start = time.perf_counter()
+            try:
+                result = get_scheduler(model).call(
+                    PREWARM_SESSION,
+                    lambda: backend.chat(messages, model, temperature=0.0, max_tokens=1),
+                    tokens=message_tokens(messages) + 1,
+                    attempts=1
+                )
+            except BackendError as e:
+                with self._lock:
+                    self.failed += 1
+                    self._warmed.pop(key, None)   # Let the next chat open try again
+                span["error"] = str(e)
+                return None
+            usage = result.usage
+            span["cached_tokens"] = usage.cached_tokens if usage else None
+            get_table("usage").record(
+                model,
+                prompt_tokens=usage.prompt_tokens if usage else None,
+                completion_tokens=usage.completion_tokens if usage else None,
+                cached_tokens=usage.cached_tokens if usage else None,
+                wall_ms=round((time.perf_counter() - start) * 1000),
+                cost_usd=chat_cost(model, usage) if usage else None
+            )
+            return result
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"started": self.started, "skipped": self.skipped, "failed": self.failed}
+
+# ============================================================================
+# PROCESS-WIDE INSTANCE
+# ============================================================================
+
+_prewarmer: Optional[Prewarmer] = None
+_prewarmer_lock = threading.Lock()
+
+
+def get_prewarmer() -> Prewarmer:
+    """The process-wide prewarmer (one pool and one TTL table per server)"""
+    global _prewarmer
+    with _prewarmer_lock:
+        if _prewarmer is None:
+            _prewarmer = Prewarmer()
+        return _prewarmer
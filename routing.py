@@ -0,0 +1,135 @@
+"""
+Per-turn model routing for the Discussion Partner app.
+
+Most turns are one- or two-sentence casual replies to a friend or
+classmate, which a small model produces faster and more cheaply than
+gpt-4. The router picks a tier for each turn from the relationship, the
+length of the conversation and of the student's message. It then checks
+the tier against what it has recently observed: if the chosen model is
+slow or failing, the turn goes to the other tier instead. Latency and
+error rates are tracked per model across all sessions in the process.
+"""
+
+import os
+import threading
+import time
+from typing import Dict, NamedTuple, Optional
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+SMALL_MODEL = os.environ.get("DP_SMALL_MODEL", "gpt-4o-mini")
+LARGE_MODEL = os.environ.get("DP_LARGE_MODEL", "gpt-4")
+
+LARGE_RELATIONSHIPS = ("boss-employee",)   # Formal, diplomatic replies get the larger model
+ESCALATE_AFTER_TURNS = 6        # Long conversations are handed to the larger model...
+ESCALATE_MESSAGE_WORDS = 60     # ...as are long student messages
+
+SLOW_TTFT_MS = float(os.environ.get("DP_ROUTE_SLOW_TTFT_MS", "4000"))   # Typical TTFT above this = slow tier
+MAX_ERROR_RATE = 0.3            # Recent failure rate above this = failing tier
+EWMA_ALPHA = 0.2                # Weight of the newest observation
+MIN_SAMPLES = 3                 # Observations before a tier can be judged
+RETRY_AVOIDED_AFTER_S = 60      # An avoided tier gets traffic again after this long, to see if it recovered
+PRIMARY_ATTEMPTS = 2            # Scheduler attempts on the routed model before falling back
+
+# ============================================================================
+# ROUTER
+# ============================================================================
+
+class RouteDecision(NamedTuple):
+    """Which model a turn goes to, and why"""
+    model: str
+    tier: str                  # "small" or "large"
+    reason: str
+    fallback: Optional[str]    # Model to use if this one fails
+
+
+class ModelHealth:
+    """Moving averages of one model's time to first token and failure rate"""
+
+    def __init__(self):
+        self.ttft_ms: Optional[float] = None
+        self.error_rate = 0.0
+        self.samples = 0
+        self.last_observed = 0.0
+
+    def observe(self, ttft_ms: Optional[float], ok: bool):
+        self.samples += 1
+        self.last_observed = time.monotonic()
+        self.error_rate += EWMA_ALPHA * ((0.0 if ok else 1.0) - self.error_rate)
+        if ok and ttft_ms is not None:
+            self.ttft_ms = ttft_ms if self.ttft_ms is None else self.ttft_ms + EWMA_ALPHA * (ttft_ms - self.ttft_ms)
+
+    def problem(self) -> Optional[str]:
+        """Why this model should be avoided right now, if it should"""
+        if self.samples < MIN_SAMPLES or time.monotonic() - self.last_observed > RETRY_AVOIDED_AFTER_S:
+            return None
+        if self.error_rate > MAX_ERROR_RATE:
+            return f"failing ({self.error_rate:.0%} errors)"
+        if self.ttft_ms is not None and self.ttft_ms > SLOW_TTFT_MS:
+            return f"slow ({self.ttft_ms:.0f} ms to first token)"
+        return None
+
+
+class ModelRouter:
+    """Chooses a model tier per turn and steers away from slow or failing tiers"""
+
+    def __init__(self, small: str = SMALL_MODEL, large: str = LARGE_MODEL):
+        self.models = {"small": small, "large": large}
+        self._health = {small: ModelHealth(), large: ModelHealth()}
+        self._lock = threading.Lock()
+
+    def route(self, relationship: str, history_turns: int, message_words: int) -> RouteDecision:
+        """Pick the model for one student turn"""
+        if relationship in LARGE_RELATIONSHIPS:
+            tier, reason = "large", f"{relationship} register"
+        elif history_turns >= ESCALATE_AFTER_TURNS:
+            tier, reason = "large", f"conversation at {history_turns} turns"
+        elif message_words >= ESCALATE_MESSAGE_WORDS:
+            tier, reason = "large", f"{message_words}-word message"
+        else:
+            tier, reason = "small", "short casual reply"
+
+        other = "small" if tier == "large" else "large"
+        with self._lock:
+            problem = self._health[self.models[tier]].problem()
+            if problem and self._health[self.models[other]].problem() is None:
+                reason = f"{reason}; {self.models[tier]} {problem}"
+                tier, other = other, tier
+        return RouteDecision(self.models[tier], tier, reason, self.models[other])
+
+    def observe(self, model: str, ttft_ms: Optional[float] = None, ok: bool = True):
+        """Record the outcome of one call"""
+        with self._lock:
+            if model in self._health:
+                self._health[model].observe(ttft_ms, ok)
+
+    def stats(self) -> Dict[str, Dict]:
+        """Current health per model, for the instructor sidebar"""
+        with self._lock:
+            return {
+                model: {
+                    "ttft_ms": round(health.ttft_ms) if health.ttft_ms is not None else None,
+                    "error_rate": round(health.error_rate, 3),
+                    "samples": health.samples,
+                    "problem": health.problem(),
+                }
+                for model, health in self._health.items()
+            }
+
+# ============================================================================
+# PROCESS-WIDE INSTANCE
+# ============================================================================
+
+_router: Optional[ModelRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> ModelRouter:
+    """The process-wide router (its health data is shared by every session)"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter()
+        return _router
@@ -0,0 +1,256 @@
+"""
+Process-wide request scheduling for the Discussion Partner app.
+
+Every session in a Streamlit process shares one API key, and therefore one
+set of provider rate limits. When a whole class presses Enter in the same
+minute, firing every request at once only buys a wave of 429s. Instead,
+backend calls go through a RequestScheduler per model, which:
+
+- admits calls within a requests/minute and tokens/minute budget
+  (sliding 60 s window);
+- queues the excess fairly: round robin across sessions, so one student
+  retrying can't starve the rest of the class;
+- retries rate-limit and server errors with exponential backoff and full
+  jitter, holding the whole queue back on a 429;
+- reports an estimated wait, so the UI can show "about 8 s" instead of
+  an error.
+"""
+
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, List, Optional, TypeVar
+
+from backends import BackendError
+
+T = TypeVar("T")
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+# Budgets should sit a little under the organisation's limits for the model
+CHAT_RPM_LIMIT = int(os.environ.get("DP_RPM_LIMIT", "500"))
+CHAT_TPM_LIMIT = int(os.environ.get("DP_TPM_LIMIT", "80000"))
+TRANSCRIBE_RPM_LIMIT = int(os.environ.get("DP_TRANSCRIBE_RPM_LIMIT", "50"))
+WINDOW_SECONDS = 60.0
+
+MAX_QUEUE_WAIT_S = float(os.environ.get("DP_MAX_QUEUE_WAIT", "90"))   # Give up (and tell the student) after this
+MAX_ATTEMPTS = int(os.environ.get("DP_MAX_ATTEMPTS", "4"))            # Tries per call, including the first
+BACKOFF_BASE_S = 0.5
+BACKOFF_CAP_S = 20.0
+WAIT_POLL_S = 1.0               # Queued callers re-check (and refresh their estimate) at least this often
+
+# ============================================================================
+# SCHEDULER
+# ============================================================================
+
+WaitCallback = Callable[[float], None]
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Full-jitter exponential backoff, never shorter than the server's Retry-After"""
+    delay = random.uniform(0, min(BACKOFF_CAP_S, BACKOFF_BASE_S * 2 ** attempt))
+    return max(delay, retry_after or 0.0)
+
+
+class _Ticket:
+    __slots__ = ("session_id", "tokens")
+
+    def __init__(self, session_id: str, tokens: int):
+        self.session_id = session_id
+        self.tokens = tokens
+
+
+class RequestScheduler:
+    """Admits calls to one model within RPM/TPM budgets, queueing fairly across sessions"""
+
+    def __init__(self, rpm: int, tpm: Optional[int] = None, window: float = WINDOW_SECONDS):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.window = window
+        self._cond = threading.Condition()
+        self._admitted: Deque[List] = deque()          # [admitted_at, tokens], oldest first
+        self._queues: "OrderedDict[str, Deque[_Ticket]]" = OrderedDict()   # Rotation order
+        self._paused_until = 0.0
+        self.calls = 0
+        self.queued = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.waited_s = 0.0
+
+    # -- budget ---------------------------------------------------------------
+
+    def _expire(self, now: float):
+        while self._admitted and self._admitted[0][0] <= now - self.window:
+            self._admitted.popleft()
+
+    def _room_in(self, now: float, tokens: int) -> float:
+        """Seconds until a call of this size fits the budget (0 = now)"""
+        self._expire(now)
+        wait = max(0.0, self._paused_until - now)
+        if len(self._admitted) >= self.rpm:
+            wait = max(wait, self._admitted[len(self._admitted) - self.rpm][0] + self.window - now)
+        if self.tpm:
+            excess = sum(t for _, t in self._admitted) + min(tokens, self.tpm) - self.tpm
+            for admitted_at, used in self._admitted:
+                if excess <= 0:
+                    break
+                excess -= used
+                wait = max(wait, admitted_at + self.window - now)
+        return wait
+
+    # -- fair queue -----------------------------------------------------------
+
+    def _is_next(self, ticket: _Ticket) -> bool:
+        """Round robin: the head of the first session in the rotation goes next"""
+        first = next(iter(self._queues.values()), None)
+        return bool(first) and first[0] is ticket
+
+    def _ahead_of(self, ticket: _Ticket) -> List[_Ticket]:
+        """Tickets the round robin will admit before this one"""
+        own = self._queues[ticket.session_id]
+        rounds = own.index(ticket)
+        ahead, before_own = [], True
+        for session_id, queue in self._queues.items():
+            if session_id == ticket.session_id:
+                before_own = False
+                ahead.extend(list(queue)[:rounds])
+            else:
+                ahead.extend(list(queue)[:rounds + 1 if before_own else rounds])
+        return ahead
+
+    def _estimate(self, ticket: _Ticket, now: float) -> float:
+        ahead = self._ahead_of(ticket)
+        estimate = self._room_in(now, ticket.tokens)
+        # Once the budget is saturated, calls drain at rpm (and tpm) per window
+        estimate = max(estimate, len(ahead) * self.window / self.rpm)
+        if self.tpm:
+            estimate = max(estimate, sum(t.tokens for t in ahead) * self.window / self.tpm)
+        return estimate
+
+    def estimate_wait(self, session_id: str = "", tokens: int = 0) -> float:
+        """Seconds a new call would wait right now"""
+        with self._cond:
+            probe = _Ticket(session_id, tokens)
+            self._queues.setdefault(session_id, deque()).append(probe)
+            try:
+                return self._estimate(probe, time.monotonic())
+            finally:
+                self._dequeue(probe)
+
+    def _dequeue(self, ticket: _Ticket, rotate: bool = False):
+        queue = self._queues[ticket.session_id]
+        queue.remove(ticket)
+        if not queue:
+            del self._queues[ticket.session_id]
+        elif rotate:
+            self._queues.move_to_end(ticket.session_id)
+
+    def acquire(self, session_id: str, tokens: int = 0, on_wait: Optional[WaitCallback] = None):
+        """Block until this session's call may go out; raises BackendError after MAX_QUEUE_WAIT_S"""
+        ticket = _Ticket(session_id, tokens)
+        start = time.monotonic()
+        with self._cond:
+            self._queues.setdefault(session_id, deque()).append(ticket)
+        reported = None
+        try:
+            while True:
+                with self._cond:
+                    now = time.monotonic()
+                    wait = WAIT_POLL_S
+                    if self._is_next(ticket):
+                        wait = self._room_in(now, tokens)
+                        if wait <= 0:
+                            self._dequeue(ticket, rotate=True)
+                            self._admitted.append([now, tokens])
+                            self.calls += 1
+                            self.waited_s += now - start
+                            self._cond.notify_all()
+                            return
+                    if now - start >= MAX_QUEUE_WAIT_S:
+                        self._dequeue(ticket)
+                        self._cond.notify_all()
+                        raise BackendError("too many requests queued - gave up waiting for a slot", 429)
+                    if reported is None:
+                        self.queued += 1
+                    estimate = self._estimate(ticket, now)
+                    self._cond.wait(min(WAIT_POLL_S, max(0.01, wait)))
+                # Outside the lock: the callback may render UI
+                if on_wait and (reported is None or abs(estimate - reported) >= 1):
+                    on_wait(estimate)
+                reported = estimate
+        except BaseException:
+            with self._cond:
+                if ticket in self._queues.get(session_id, ()):
+                    self._dequeue(ticket)
+                    self._cond.notify_all()
+            raise
+
+    def pause(self, seconds: float):
+        """Hold every queued call back (after a 429 the limit applies to all sessions alike)"""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def call(self, session_id: str, fn: Callable[[], T], tokens: int = 0,
+             on_wait: Optional[WaitCallback] = None, attempts: int = MAX_ATTEMPTS) -> T:
+        """Run fn once admitted, retrying retryable BackendErrors with backoff"""
+        for attempt in range(attempts):
+            self.acquire(session_id, tokens, on_wait)
+            try:
+                return fn()
+            except BackendError as e:
+                if not e.retryable or attempt == attempts - 1:
+                    raise
+                delay = backoff_delay(attempt, e.retry_after)
+                if e.status_code == 429:
+                    self.rate_limited += 1
+                    self.pause(delay)
+                with self._cond:
+                    self.retries += 1
+                if on_wait:
+                    on_wait(delay)
+                time.sleep(delay)
+        raise AssertionError("unreachable")
+
+    def stats(self) -> Dict:
+        """Counters for the instructor sidebar"""
+        with self._cond:
+            self._expire(time.monotonic())
+            return {
+                "calls": self.calls,
+                "queued": self.queued,
+                "retries": self.retries,
+                "rate_limited": self.rate_limited,
+                "waiting": sum(len(q) for q in self._queues.values()),
+                "mean_wait_s": round(self.waited_s / self.calls, 2) if self.calls else 0.0,
+                "rpm_used": len(self._admitted),
+                "tpm_used": sum(t for _, t in self._admitted),
+            }
+
+# ============================================================================
+# PROCESS-WIDE INSTANCES
+# ============================================================================
+
+_schedulers: Dict[str, RequestScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(model: str) -> RequestScheduler:
+    """The scheduler for a model (provider limits are per model)"""
+    with _schedulers_lock:
+        if model not in _schedulers:
+            if model.startswith("whisper"):
+                _schedulers[model] = RequestScheduler(TRANSCRIBE_RPM_LIMIT)
+            else:
+                _schedulers[model] = RequestScheduler(CHAT_RPM_LIMIT, CHAT_TPM_LIMIT)
+        return _schedulers[model]
+
+
+def all_stats() -> Dict[str, Dict]:
+    """Stats for every scheduler created so far, by model"""
+    with _schedulers_lock:
+        schedulers = dict(_schedulers)
+    return {model: scheduler.stats() for model, scheduler in schedulers.items()}
@@ -0,0 +1,130 @@
+"""
+Session log export for the Discussion Partner app.
+
+Exports are streamed straight from the durable per-session log (see
+log_writer) one event at a time, optionally through gzip, into a temporary
+file, so memory use doesn't grow with the session - no list of every
+event, no pretty-printed copy of it, no in-memory copy of the output.
+JSON Lines is the compact native format; the
+JSON format keeps the structure of the original downloads (student_name,
+session_start, session_end, interactions, autonomy_events) for existing
+analysis scripts.
+"""
+
+import datetime
+import gzip
+import io
+import json
+import shutil
+import tempfile
+from typing import IO, Dict, Iterator, NamedTuple, Optional
+
+from log_writer import get_writer, read_events, session_log_path
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+COPY_CHUNK_BYTES = 64 * 1024
+GZIP_LEVEL = 6
+
+
+class ExportFormat(NamedTuple):
+    """A download format offered to students"""
+    label: str
+    extension: str
+    mime: str
+    compressed: bool
+    jsonl: bool
+
+
+EXPORT_FORMATS = {
+    "jsonl.gz": ExportFormat("JSON Lines (gzip, smallest)", "jsonl.gz", "application/gzip", True, True),
+    "jsonl": ExportFormat("JSON Lines", "jsonl", "application/x-ndjson", False, True),
+    "json": ExportFormat("JSON (single document)", "json", "application/json", False, False),
+}
+DEFAULT_FORMAT = "jsonl.gz"
+
+# ============================================================================
+# WRITERS
+# ============================================================================
+
+def _events(session_id: str, kind: str, log_dir: Optional[str]) -> Iterator[Dict]:
+    """Events of one kind, without the kind tag"""
+    for event in read_events(session_id, log_dir):
+        if event.pop("kind", None) == kind:
+            yield event
+
+
+def _session_start(session_id: str, log_dir: Optional[str]) -> Optional[str]:
+    for event in _events(session_id, "interaction", log_dir):
+        return event["timestamp"]
+    return None
+
+
+def write_jsonl(session_id: str, student_name: Optional[str], out: IO[bytes], log_dir: Optional[str] = None):
+    """The durable log copied through verbatim, plus a closing export record"""
+    try:
+        with open(session_log_path(session_id, log_dir), "rb") as log:
+            shutil.copyfileobj(log, out, COPY_CHUNK_BYTES)
+    except FileNotFoundError:
+        pass
+    trailer = {
+        "kind": "export",
+        "timestamp": datetime.datetime.now().isoformat(),
+        "session_id": session_id,
+        "student_name": student_name,
+    }
+    out.write((json.dumps(trailer, ensure_ascii=False) + "\n").encode("utf-8"))
+
+
+def write_json(session_id: str, student_name: Optional[str], out: IO[bytes], log_dir: Optional[str] = None):
+    """The original single-document layout, written one event at a time"""
+    def put(text: str):
+        out.write(text.encode("utf-8"))
+
+    def put_array(kind: str):
+        put("[")
+        for i, event in enumerate(_events(session_id, kind, log_dir)):
+            put(("," if i else "") + json.dumps(event, ensure_ascii=False, default=str))
+        put("]")
+
+    put(f'{{"session_id": {json.dumps(session_id)}, "student_name": {json.dumps(student_name, ensure_ascii=False)}, '
+        f'"session_start": {json.dumps(_session_start(session_id, log_dir))}, '
+        f'"session_end": {json.dumps(datetime.datetime.now().isoformat())}, "interactions": ')
+    put_array("interaction")
+    put(', "autonomy_events": ')
+    put_array("autonomy")
+    put("}")
+
+
+def write_export(session_id: str, student_name: Optional[str], out: IO[bytes],
+                 fmt: str = DEFAULT_FORMAT, log_dir: Optional[str] = None):
+    """Stream a session's log to a binary file object in the given format"""
+    export = EXPORT_FORMATS[fmt]
+    write = write_jsonl if export.jsonl else write_json
+    if export.compressed:
+        with gzip.GzipFile(fileobj=out, mode="wb", compresslevel=GZIP_LEVEL) as compressed:
+            write(session_id, student_name, compressed, log_dir)
+    else:
+        write(session_id, student_name, out, log_dir)
+
+
+def build_export(session_id: str, student_name: Optional[str], fmt: str = DEFAULT_FORMAT,
+                 log_dir: Optional[str] = None) -> IO[bytes]:
+    """Export a session's log (including anything still queued for disk) into a rewound temporary file"""
+    get_writer().flush()
+    # Unbuffered, because st.download_button takes raw files but not buffered ones; writes are buffered here
+    out = tempfile.TemporaryFile(buffering=0)
+    buffered = io.BufferedWriter(out, COPY_CHUNK_BYTES)
+    write_export(session_id, student_name, buffered, fmt, log_dir)
+    buffered.flush()
+    buffered.detach()
+    out.seek(0)
+    return out
+
+
+def export_file_name(student_name: Optional[str], fmt: str = DEFAULT_FORMAT) -> str:
+    """discussion_partner_log_<name>_<timestamp>.<extension>"""
+    stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"discussion_partner_log_{student_name}_{stamp}.{EXPORT_FORMATS[fmt].extension}"
@@ -0,0 +1,167 @@
+"""
+Target-structure detection for the Discussion Partner app.
+
+Finds yes-but disagreements ("yeah but", "I agree, but", "I can see their
+point. But...") with one regular expression compiled at import time, and
+scores mitigation hedges ("maybe", "perhaps", "I think"). Punctuation and
+whitespace between words are tolerated, so "Yeah,  I agree... but" matches,
+and match positions refer to the original text.
+"""
+
+import re
+from functools import lru_cache
+from typing import List, NamedTuple, Optional
+
+# ============================================================================
+# PATTERN DEFINITIONS
+# ============================================================================
+
+# Anything that can separate two words in speech transcripts or typed chat
+_SEP = r"[\s,;:.!?…\-–—]+"
+
+
+def _phrase(phrase: str) -> str:
+    """Regex for a literal phrase, tolerant of punctuation between words and curly apostrophes"""
+    return re.escape(phrase).replace(r"\ ", _SEP).replace("'", "['’]")
+
+
+def _alternation(phrases: List[str]) -> str:
+    """Longest-first alternation over phrases"""
+    return "(?:" + "|".join(_phrase(p) for p in sorted(phrases, key=len, reverse=True)) + ")"
+
+
+def _first_letters(phrases: List[str]) -> str:
+    """Lookahead on the letters a match can start with.
+
+    Python's regex engine otherwise tries every alternative at every
+    character; the lookahead lets it skip most positions cheaply.
+    """
+    return "(?=[" + "".join(sorted({p[0] for p in phrases})) + "])"
+
+
+# Short acknowledgements: "yeah", "true", "fair enough", "you're right"...
+HEAD_PHRASES = [
+    "yeah", "yea", "yes", "yep", "yup", "true", "sure", "okay", "ok",
+    "fair enough", "fair point", "good point", "that's true", "that's fair", "you're right",
+]
+
+# Acknowledging clauses: "I agree", "I can see", "I totally understand"...
+_CLAUSE_START = r"i(?:" + _SEP + r"(?:totally|completely|really|definitely|do|can|kind of))*" + _SEP
+
+# "I agree" / "I understand" stand on their own, so words may follow before "but"
+# ("I agree with you on that but"). "I know", "I see", "I get"... only acknowledge
+# with an explicit object ("I see your point but") or directly before the contrast
+# ("I know, but") - otherwise "I get mad at homework but" would count.
+OPEN_VERBS = ("agree", "understand")
+OBJECT_VERBS = ("know", "see", "get", "hear", "appreciate")
+OBJECTS = [
+    "that", "that's", "this", "you", "you're", "what you mean", "what you're saying", "where you're coming from",
+    "your point", "their point", "his point", "her point", "the point",
+]
+
+_OPEN_CLAUSE = _CLAUSE_START + _alternation(list(OPEN_VERBS))
+_OBJECT_CLAUSE = _CLAUSE_START + _alternation(list(OBJECT_VERBS)) + _SEP + _alternation(OBJECTS)
+_BARE_CLAUSE = _CLAUSE_START + _alternation(list(OBJECT_VERBS))
+
+# "yeah", "yeah, I agree", or just "I agree"; a bare head ("yeah") needs the contrast right after it
+_HEADS = _alternation(HEAD_PHRASES)
+_GAPPED_ACK = rf"(?:{_HEADS}{_SEP})?(?:{_OPEN_CLAUSE}|{_OBJECT_CLAUSE})"
+_BARE_ACK = rf"(?:{_HEADS}(?:{_SEP}{_BARE_CLAUSE})?|{_BARE_CLAUSE})"
+
+# Words allowed between an acknowledgement that can take them and "but" ("I can see their point *here* but")
+MAX_GAP_WORDS = 4
+_GAP = rf"(?:{_SEP}[\w']+){{0,{MAX_GAP_WORDS}}}?"
+
+CONTRAST_WORDS = ("but", "though", "however")
+
+# Patterns run on lowercased text (see _lower); no IGNORECASE keeps the scan fast
+TARGET_PATTERN = re.compile(
+    _first_letters(HEAD_PHRASES + ["i"])
+    + rf"\b(?:(?P<ack>{_GAPPED_ACK})(?P<gap>{_GAP})|(?P<bare>{_BARE_ACK}))"
+    + rf"{_SEP}(?P<contrast>{_alternation(list(CONTRAST_WORDS))})\b"
+)
+
+# Hedges that soften a disagreement, with their weight in the mitigation score
+HEDGES = {
+    "maybe": 1.0,
+    "perhaps": 1.0,
+    "probably": 1.0,
+    "i think": 1.0,
+    "i feel": 1.0,
+    "i guess": 1.0,
+    "i'm not sure": 1.0,
+    "kind of": 0.5,
+    "sort of": 0.5,
+    "might": 0.5,
+    "could": 0.5,
+    "don't you think": 1.5,
+    "i was wondering": 1.5,
+}
+
+HEDGE_PATTERN = re.compile(_first_letters(list(HEDGES)) + r"\b" + _alternation(list(HEDGES)) + r"\b")
+
+_SEP_RE = re.compile(_SEP)
+
+# ============================================================================
+# MATCHING
+# ============================================================================
+
+class TargetMatch(NamedTuple):
+    """A yes-but construction found in a student's turn"""
+    pattern: str   # Normalised acknowledgement + contrast, e.g. "yeah i agree but"
+    start: int     # Span in the original text
+    end: int
+    text: str      # The matched text as the student wrote/said it
+
+
+class TurnAnalysis(NamedTuple):
+    """Target structure and mitigation found in one student turn"""
+    match: Optional[TargetMatch]
+    hedges: List[str]
+    mitigation_score: float
+
+    @property
+    def has_target(self) -> bool:
+        return self.match is not None
+
+
+@lru_cache(maxsize=1024)
+def _normalise(text: str) -> str:
+    """Lowercase, straighten apostrophes and collapse punctuation/whitespace to single spaces"""
+    return _SEP_RE.sub(" ", text.lower().replace("’", "'")).strip()
+
+
+def _lower(text: str) -> str:
+    """Lowercase text for matching; spans stay valid because lengths must agree"""
+    lower = text.lower()
+    # A few non-ASCII characters change length when lowercased - keep offsets honest
+    return lower if len(lower) == len(text) else "".join(c.lower()[0] for c in text)
+
+
+def find_target_structure(text: str) -> Optional[TargetMatch]:
+    """Return the first yes-but construction in text, or None"""
+    lower = _lower(text)
+    if not any(word in lower for word in CONTRAST_WORDS):
+        return None
+    m = TARGET_PATTERN.search(lower)
+    if m is None:
+        return None
+    pattern = f"{_normalise(m.group('ack') or m.group('bare'))} {m.group('contrast')}"
+    return TargetMatch(pattern, m.start(), m.end(), text[m.start():m.end()])
+
+
+def find_hedges(text: str) -> List[str]:
+    """Normalised hedges in the order they appear (repeats included)"""
+    return [_normalise(h) for h in HEDGE_PATTERN.findall(_lower(text))]
+
+
+def mitigation_score(text: str) -> float:
+    """Weighted count of distinct hedges - 0 means an unmitigated disagreement"""
+    return sum((HEDGES.get(h, 0.0) for h in set(find_hedges(text))), 0.0)
+
+
+def analyze_turn(text: str) -> TurnAnalysis:
+    """Target structure, hedges and mitigation score for one student turn"""
+    hedges = find_hedges(text)
+    score = sum((HEDGES.get(h, 0.0) for h in set(hedges)), 0.0)
+    return TurnAnalysis(find_target_structure(text), hedges, score)
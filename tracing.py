@@ -0,0 +1,201 @@
+"""
+Phase-level latency tracing for the Discussion Partner app.
+
+A student turn passes through several phases - transcription, the target
+structure check, prompt assembly, the API call and the re-render - and
+when a class says "it's slow" we need to know which one. Each phase is
+timed as a span tagged with the session_id and turn_number, and:
+
+- appended to a local trace file in the Chrome Trace Event format (a JSON
+  array of complete "X" events), which opens as a timeline in
+  ui.perfetto.dev or chrome://tracing - one row per session;
+- kept in a short in-memory window per phase, for the p50/p95 figures in
+  the instructor sidebar.
+
+The file is written without a closing bracket, which both viewers accept,
+so it can be appended to for as long as the process runs. Spans are handed
+to a background thread that does the writing, so timing a phase never adds
+file I/O to the turn it measures. Once the file reaches TRACE_MAX_BYTES (or
+has TRACE_MAX_SESSIONS session rows) it is rotated to a ".1" file, so a
+long-running server keeps at most two trace files.
+"""
+
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import IO, Deque, Dict, Iterator, List, Optional, Tuple
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+TRACE_DIR = os.environ.get("DP_TRACE_DIR", "traces")
+TRACE_TO_FILE = os.environ.get("DP_TRACE_FILE", "1") != "0"   # Percentiles are kept either way
+TRACE_MAX_BYTES = int(float(os.environ.get("DP_TRACE_MAX_MB", "50")) * 1024 * 1024)
+TRACE_MAX_SESSIONS = 2000       # Session rows (timeline threads) per file before it is rotated
+PHASE_WINDOW = 1000             # Recent spans per phase used for percentiles
+QUEUE_MAX_SPANS = 10000         # Spans waiting for the writer; beyond this they are dropped (and counted)
+BATCH_MAX_SPANS = 500           # Spans written per batch
+
+# ============================================================================
+# TRACER
+# ============================================================================
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+class Tracer:
+    """Records timed spans to a trace file (from a background thread) and keeps per-phase duration windows"""
+
+    def __init__(self, path: Optional[str] = None, to_file: bool = TRACE_TO_FILE,
+                 max_bytes: int = TRACE_MAX_BYTES, max_sessions: int = TRACE_MAX_SESSIONS):
+        self.path = path or os.path.join(TRACE_DIR, f"trace_{os.getpid()}.json")
+        self.to_file = to_file
+        self.max_bytes = max_bytes
+        self.max_sessions = max_sessions
+        self.dropped = 0
+        self._file: Optional[IO[str]] = None
+        self._durations: Dict[str, Deque[float]] = {}
+        self._session_rows: Dict[str, int] = {}      # Only touched by the writer thread
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[Optional[Tuple[str, int, float, Dict]]]" = queue.Queue(QUEUE_MAX_SPANS)
+        self._thread: Optional[threading.Thread] = None
+        if to_file:
+            self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+            self._thread.start()
+
+    @contextmanager
+    def span(self, name: str, session_id: str, turn_number: int, **args) -> Iterator[Dict]:
+        """Time the body as one span; the yielded dict can take extra args (e.g. the model used)"""
+        args = {"session_id": session_id, "turn_number": turn_number, **args}
+        start_us = time.time_ns() // 1000
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            self.record(name, start_us, (time.perf_counter() - start) * 1e6, args)
+
+    def record(self, name: str, start_us: int, duration_us: float, args: Dict):
+        """Add a span that has already been timed (start in epoch microseconds); never waits on the disk"""
+        with self._lock:
+            self._durations.setdefault(name, deque(maxlen=PHASE_WINDOW)).append(duration_us / 1000)
+        if self._thread is None:
+            return
+        try:
+            self._queue.put_nowait((name, start_us, duration_us, args))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < BATCH_MAX_SPANS:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            spans = [span for span in batch if span is not None]
+            try:
+                self._write(spans)
+            except Exception:
+                # A span that can't be written must not stop tracing for the whole process
+                with self._lock:
+                    self.dropped += len(spans)
+            if None in batch:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                return
+
+    def _events(self, spans: List[Tuple[str, int, float, Dict]]) -> List[Dict]:
+        """Chrome trace events for spans, with a thread_name row the first time a session shows up in the file"""
+        events = []
+        for name, start_us, duration_us, args in spans:
+            session_id = str(args.get("session_id", ""))
+            if session_id not in self._session_rows:
+                self._session_rows[session_id] = len(self._session_rows) + 1
+                events.append({"name": "thread_name", "ph": "M", "pid": os.getpid(),
+                               "tid": self._session_rows[session_id], "args": {"name": f"session {session_id}"}})
+            events.append({
+                "name": name,
+                "cat": "turn",
+                "ph": "X",
+                "ts": start_us,
+                "dur": round(duration_us),
+                "pid": os.getpid(),
+                "tid": self._session_rows[session_id],
+                "args": args,
+            })
+        return events
+
+    def _write(self, spans: List[Tuple[str, int, float, Dict]]):
+        if not spans:
+            return
+        try:
+            if self._file is not None and (self._file.tell() >= self.max_bytes
+                                           or len(self._session_rows) >= self.max_sessions):
+                self._rotate()
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+                if self._file.tell() == 0:
+                    self._file.write("[\n")
+            self._file.write("".join(json.dumps(event, default=str) + ",\n" for event in self._events(spans)))
+            self._file.flush()
+        except OSError:
+            with self._lock:
+                self.dropped += len(spans)
+
+    def _rotate(self):
+        """Move the full trace file aside (replacing the previous one) and start a new one"""
+        self._file.close()
+        self._file = None
+        root, extension = os.path.splitext(self.path)
+        os.replace(self.path, f"{root}.1{extension}")
+        self._session_rows.clear()   # Row names are metadata events, so the new file needs them again
+
+    def durations(self, name: str) -> List[float]:
+        """Recent span durations (ms) for one phase, oldest first"""
+        with self._lock:
+            return list(self._durations.get(name, ()))
+
+    def phase_stats(self) -> Dict[str, Dict]:
+        """Span count and p50/p95 duration (ms) per phase, over the recent window"""
+        with self._lock:
+            windows = {name: list(durations) for name, durations in self._durations.items()}
+        return {
+            name: {"count": len(durations), "p50_ms": percentile(durations, 50), "p95_ms": percentile(durations, 95)}
+            for name, durations in windows.items() if durations
+        }
+
+    def close(self):
+        """Write out the spans still queued and stop the writer thread"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+# ============================================================================
+# PROCESS-WIDE INSTANCE
+# ============================================================================
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """The process-wide tracer (one trace file per server process)"""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer()
+            atexit.register(_tracer.close)
+        return _tracer
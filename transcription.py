@@ -0,0 +1,93 @@
+"""
+Speech-to-text for prepared clips (see audio_processing.prepare_clip).
+
+A short clip goes up as a single request. A long one arrives already cut
+into chunks at pauses: the chunks are transcribed concurrently on a shared
+pool and stitched back together in order, so the wait grows with the chunk
+length rather than the clip length. Every request, chunked or not, goes
+through the scheduler for the transcription model, so a student's chunks
+queue fairly with everyone else's and respect the provider's RPM.
+
+Where a chunk boundary had to be forced (no pause in reach), the chunks
+share a little audio; the words heard twice are dropped from the start of
+the later chunk when stitching.
+"""
+
+import os
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional
+
+from audio_processing import PreparedClip
+from backends import Backend
+from scheduler import get_scheduler
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+TRANSCRIBE_MODEL = "whisper-1"            # Used by the app and batch_transcribe.py too - the one place it is set
+CHUNK_WORKERS = int(os.environ.get("DP_TRANSCRIBE_WORKERS", "16"))   # Chunk requests in flight, all sessions together
+MAX_OVERLAP_WORDS = 4           # An overlap of CHUNK_OVERLAP_MS holds at most a few words
+
+_WORD_RE = re.compile(r"[\w']+")
+
+# ============================================================================
+# STITCHING
+# ============================================================================
+
+def _norm(word: str) -> str:
+    return "".join(_WORD_RE.findall(word.lower()))
+
+
+def stitch_transcripts(parts: List[str], overlapped: List[bool]) -> str:
+    """Join chunk transcripts in order; overlapped[i] says chunk i repeats the end of chunk i-1"""
+    words: List[str] = []
+    for text, overlap in zip(parts, overlapped):
+        new = text.split()
+        if overlap and words:
+            # Longest run of words that ends the text so far and starts this chunk
+            for size in range(min(MAX_OVERLAP_WORDS, len(words), len(new)), 0, -1):
+                if [_norm(w) for w in words[-size:]] == [_norm(w) for w in new[:size]]:
+                    new = new[size:]
+                    break
+        words.extend(new)
+    return " ".join(words)
+
+# ============================================================================
+# TRANSCRIPTION
+# ============================================================================
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ThreadPoolExecutor:
+    """The process-wide pool chunk requests run on"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=CHUNK_WORKERS, thread_name_prefix="transcribe-chunk")
+        return _pool
+
+
+def transcribe_clip(backend: Backend, clip: PreparedClip, session_id: str, filename: str = "recording.wav",
+                    model: str = TRANSCRIBE_MODEL) -> str:
+    """Transcript of a clip with speech: one request, or its chunks in parallel"""
+    scheduler = get_scheduler(model)
+    if not clip.chunks:
+        return scheduler.call(session_id, lambda: backend.transcribe(clip.audio, model, filename))
+
+    futures: List[Future] = [
+        get_pool().submit(scheduler.call, session_id,
+                          lambda chunk=chunk: backend.transcribe(chunk.audio, model, filename))
+        for chunk in clip.chunks
+    ]
+    try:
+        parts = [future.result().strip() for future in futures]
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+    return stitch_transcripts(parts, [chunk.overlap_seconds > 0 for chunk in clip.chunks])